@@ -1,63 +1,34 @@
 import os
-import nest_asyncio
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
 from dotenv import load_dotenv
 import gradio as gr
 
-# 1. LangChain & Vector DB
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain.retrievers.self_query.base import SelfQueryRetriever
-from langchain.chains.query_constructor.base import AttributeInfo
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
-
-# 2. Evaluation & Datasets
-from deepeval.metrics import HallucinationMetric
-from deepeval.test_case import LLMTestCase
-from datasets import Dataset 
-
-# 3. Ragas
-from ragas.metrics import faithfulness, answer_relevancy
-from ragas import evaluate
-
-# Fix for Gradio + Ragas async conflict
-nest_asyncio.apply()
+# 1. Only what the UI and request plumbing need is imported up front. LangChain, Chroma,
+# DeepEval and RAGAS load with the pipeline (get_pipeline), on first use or in the warm-up
+# thread, so a restart serves the UI in a fraction of the time.
+from src.tracing import trace, stage, stage_summary
+from src.streaming import FinalAnswerStream
+# 2. Every OpenAI call (chat, self-query, embeddings, judges) shares one rate-limit-aware scheduler
+from src.scheduler import INTERACTIVE, openai_clients, get_scheduler
+# 3. Retrieved chunks are packed into a token budget before generation and the judges
+from src.context_packing import PACKING_ENABLED, pack_context, record_packing, packing_stats
+# 4. Serving mode: worker pool + request queue, deadlines, RAGAS load shedding, micro-batched retrieval
+from src.serving import (SERVING_ENABLED, ServingController, BatchingEmbeddings, BatchingVectorStore,
+                         Overloaded, DeadlineExceeded)
 
 # --- INITIALIZATION ---
 load_dotenv()
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-embeddings = OpenAIEmbeddings()
-
-# Load the Semantic-Aware Vector Store
-vectorstore = Chroma(
-    persist_directory="data/chroma_db_multi", 
-    embedding_function=embeddings
-)
-
-# --- SELF-QUERY RETRIEVER ---
-metadata_info = [
-    AttributeInfo(name="state", description="The US state", type="string"),
-    AttributeInfo(name="year", description="The policy year", type="integer"),
-]
-
-# --- ADVANCED DIVERSE RETRIEVER ---
-retriever = SelfQueryRetriever.from_llm(
-    llm=llm, 
-    vectorstore=vectorstore, 
-    document_contents="Employee policy documents", 
-    metadata_field_info=metadata_info,
-    search_type="mmr", 
-    search_kwargs={
-        "k": 5,                # Retrieve 5 total chunks for the LLM
-        "fetch_k": 15,         # Fetch 15 candidates before applying MMR
-        "lambda_mult": 0.25    # #FIX#: Push for aggressive diversity
-    }
-)
+# APP_WARMUP=0: build the pipeline on the first request instead of in a background thread at launch
+WARMUP_ENABLED = os.getenv("APP_WARMUP", "1").lower() not in ("0", "false", "no")
+# SERVING_WORKERS audits at once, SERVING_MAX_QUEUE waiting, SERVING_DEADLINE_S each (see src/serving.py)
+serving = ServingController()
 
 # --- ADVANCED AUDITOR PROMPT ---
 # Uses a clear delimiter "### Final Answer:" to separate logic from output
-prompt = ChatPromptTemplate.from_messages([
+AUDITOR_PROMPT = [
     ("system", """You are a strict Enterprise Policy Auditor.
     
     STEP-BY-STEP REASONING:
@@ -70,57 +41,309 @@ prompt = ChatPromptTemplate.from_messages([
     
     Context: {context}"""),
     ("human", "{input}"),
-])
-
-qa_chain = create_retrieval_chain(retriever, create_stuff_documents_chain(llm, prompt))
-
-def secure_policy_search(query):
-    # 1. RAG Invocation
-    result = qa_chain.invoke({"input": query})
-    raw_response = result["answer"]
-    contexts = [d.page_content for d in result["context"]]
-    if not contexts:
-        contexts = ["No relevant policy context found in the database."]
-    # 2. Split Reasoning from Answer (Critical for Faithfulness Score)
-    if "### Final Answer:" in raw_response:
-        reasoning, clean_answer = raw_response.split("### Final Answer:", 1)
-        reasoning = reasoning.strip()
-        clean_answer = clean_answer.strip()
+]
+
+# --- LAZY PIPELINE ---
+# Built once, by the warm-up thread or whichever request needs it first
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def build_pipeline():
+    """LLM, embeddings, judges, vector store, retrievers, prompt chain and answer cache."""
+    from langchain_openai import ChatOpenAI
+    from langchain.retrievers.self_query.base import SelfQueryRetriever
+    from langchain.chains.query_constructor.base import AttributeInfo
+    from langchain_community.query_constructors.chroma import ChromaTranslator
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+    from src.embedding_cache import get_embeddings
+    from src.judge_cache import get_judge_llm, get_deepeval_judge
+    from src.query_constructor import RuleBasedSelfQueryRetriever
+    from src.bm25_index import HybridRetriever, load_bm25, bm25_path, index_version
+    from src.semantic_cache import SemanticAnswerCache, index_fingerprint
+    # Guardrails (DeepEval + Ragas judges, run concurrently on Gradio's event loop)
+    import src.guardrails  # noqa: F401  (imported here so the first audit doesn't pay for it)
+    from src.results_store import set_run_config
+
+    # stream_usage keeps token counts in the traces while the answer is streamed
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, stream_usage=True, **openai_clients(INTERACTIVE))
+    # Query embeddings go through the shared on-disk cache
+    embeddings = get_embeddings(priority=INTERACTIVE)
+    if SERVING_ENABLED:
+        # Query embeddings from concurrent requests go out as one embeddings request
+        embeddings = BatchingEmbeddings(embeddings, wait_if=serving.busy)
+    # Guardrail judges share one persistent response cache (JUDGE_CACHE_BYPASS=1 to skip it)
+    judge_llm = get_judge_llm(priority=INTERACTIVE)
+    deepeval_judge = get_deepeval_judge(priority=INTERACTIVE)
+
+    # Load the Semantic-Aware Vector Store
+    # VECTOR_BACKEND=numpy serves the memory-mapped index from `ingest_multi.py --backend numpy`
+    if os.getenv("VECTOR_BACKEND", "chroma") == "numpy":
+        from src.numpy_store import NumpyVectorStore
+        vector_db_path = "data/numpy_index_multi"
+        vectorstore = NumpyVectorStore.load(vector_db_path, embeddings)
     else:
-        reasoning = "Direct response provided."
-        clean_answer = raw_response.strip()
-    # 3. DeepEval Hallucination Check
-
-    test_case = LLMTestCase(
-        input=query, 
-        actual_output=clean_answer, 
-        context=contexts  # Use 'context' instead of 'retrieval_context'
-    )
-    halluc_metric = HallucinationMetric(threshold=0.5)
-    halluc_metric.measure(test_case)
-
-    # 4. RAGAS Evaluation (Evaluating only the CLEAN answer)
-    data = {
-        "question": [query],
-        "answer": [clean_answer],
-        "contexts": [contexts],
-        "ground_truth": [clean_answer]
+        from src.partitions import open_chroma
+        vector_db_path = "data/chroma_db_multi"
+        # Per-state / per-year collections when ingested with --partition-by (queries are routed)
+        vectorstore = open_chroma(vector_db_path, embeddings)
+    if SERVING_ENABLED:
+        # ...and their vector searches (same k / filter) run as one batched query
+        vectorstore = BatchingVectorStore(vectorstore, wait_if=serving.busy)
+
+    # --- SELF-QUERY RETRIEVER ---
+    metadata_info = [
+        AttributeInfo(name="state", description="The US state", type="string"),
+        AttributeInfo(name="year", description="The policy year", type="integer"),
+    ]
+
+    # --- ADVANCED DIVERSE RETRIEVER ---
+    mmr_search_kwargs = {
+        "k": 5,                # Retrieve 5 total chunks for the LLM
+        "fetch_k": 15,         # Fetch 15 candidates before applying MMR
+        "lambda_mult": 0.25    # #FIX#: Push for aggressive diversity
     }
-    dataset = Dataset.from_dict(data)
-    
+    llm_query_retriever = SelfQueryRetriever.from_llm(
+        llm=llm,
+        vectorstore=vectorstore,
+        document_contents="Employee policy documents",
+        metadata_field_info=metadata_info,
+        search_type="mmr",
+        search_kwargs=mmr_search_kwargs,
+        # Both backends take Chroma-style `where` filters
+        structured_query_translator=ChromaTranslator()
+    )
+
+    # --- HYBRID LEXICAL + DENSE SEARCH ---
+    # Keyword-style queries ("50 Mbps", "$500", "Section 2") are answered from the BM25 index
+    # ingest_multi.py builds next to the vector index: no query embedding, no vector search.
+    # Keyed on the sidecar's version: a re-ingest is picked up on the next query
+    bm25_version = index_version(bm25_path(vector_db_path))
+    bm25_index = load_bm25(vector_db_path)
+    hybrid_retriever = HybridRetriever(
+        bm25=bm25_index,
+        bm25_path=bm25_path(vector_db_path),
+        bm25_version=bm25_version,
+        vectorstore=vectorstore,
+        search_type="mmr",
+        search_kwargs=mmr_search_kwargs
+    ) if bm25_index is not None else None
+
+    # --- RULE-BASED FAST PATH ---
+    # "Tennessee 2024" style queries are turned into a Chroma filter without an LLM round trip;
+    # only ambiguous ones ("last year", "Texas vs California") pay for the self-query LLM.
+    retriever = RuleBasedSelfQueryRetriever(
+        vectorstore=vectorstore,
+        fallback=llm_query_retriever,
+        search_type="mmr",
+        search_kwargs=mmr_search_kwargs,
+        hybrid=hybrid_retriever
+    )
+
+    document_chain = create_stuff_documents_chain(llm, ChatPromptTemplate.from_messages(AUDITOR_PROMPT))
+    # Stamped on every guardrail result in the results store
+    set_run_config(app="secure_policy_search", llm_model=llm.model_name, vector_db=vector_db_path,
+                   search=mmr_search_kwargs, hybrid=hybrid_retriever is not None, context_packing=PACKING_ENABLED,
+                   serving=SERVING_ENABLED)
+
+    # --- SEMANTIC ANSWER CACHE ---
+    # Paraphrased questions with the same state/year reuse an already-audited answer;
+    # everything is dropped once the index is re-ingested.
+    answer_cache = SemanticAnswerCache(embeddings, fingerprint_fn=lambda: index_fingerprint(vector_db_path))
+
+    return SimpleNamespace(
+        llm=llm, embeddings=embeddings, judge_llm=judge_llm, deepeval_judge=deepeval_judge,
+        VECTOR_DB_PATH=vector_db_path, vectorstore=vectorstore, hybrid_retriever=hybrid_retriever,
+        retriever=retriever, document_chain=document_chain, answer_cache=answer_cache,
+    )
+
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            with trace("initialize_app") as t:
+                start = time.perf_counter()
+                _pipeline = build_pipeline()
+                t.set(init_ms=(time.perf_counter() - start) * 1000.0)
+            print(f"🔥 Pipeline ready in {time.perf_counter() - start:.1f}s")
+        return _pipeline
+
+async def aget_pipeline():
+    # The first request may arrive before the warm-up thread is done: wait off the event loop
+    return _pipeline if _pipeline is not None else await asyncio.to_thread(get_pipeline)
+
+def start_warmup():
+    """Build the pipeline in a background thread while the UI starts serving."""
+    thread = threading.Thread(target=get_pipeline, name="pipeline-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def __getattr__(name):
+    # app.retriever, app.vectorstore, ... (benchmarks, notebooks) build the pipeline on first access
+    if name in ("llm", "embeddings", "judge_llm", "deepeval_judge", "VECTOR_DB_PATH", "vectorstore",
+                "hybrid_retriever", "retriever", "document_chain", "answer_cache"):
+        return getattr(get_pipeline(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def secure_policy_search(query, on_token=None, ticket=None):
+    # on_token(reasoning_so_far, answer_so_far) is called as the response streams in
+    # ticket: the serving slot (deadline, queue wait) when called through the request queue
+    # Every request is traced per stage (see the "⏱️ Latency" tab / data/.traces/)
+    p = await aget_pipeline()
+    from src.guardrails import run_guardrails
+
+    with trace("secure_policy_search", query_chars=len(query)) as t:
+        start = time.perf_counter()
+        if ticket is not None:
+            t.set(queue_wait_ms=ticket.queue_wait_ms)
+        # 0. Semantic cache: skips retrieval, generation and both judges on a hit
+        with stage("semantic_cache"):
+            cached = await p.answer_cache.alookup(query)
+        t.set(cache_hit=cached is not None)
+        if cached is not None:
+            t.set(ttft_ms=(time.perf_counter() - start) * 1000.0)
+            return cached
+
+        # 1. Retrieval (query_construction + retrieval stages), then generation over the same docs
+        docs = await p.retriever.ainvoke(query)
+        t.set(context_chunks=len(docs), context_chars=sum(len(d.page_content) for d in docs))
+        # 1b. Context packing: overlapping chunks stitched together, repeated sentences dropped,
+        # the rest fitted into CONTEXT_TOKEN_BUDGET. Generation and both judges see the packed text.
+        packing = None
+        if PACKING_ENABLED:
+            with stage("context_packing"):
+                docs, packing = pack_context(docs)
+            t.set(packed_chunks=packing["chunks_out"], context_tokens=packing["tokens_out"],
+                  context_tokens_saved=packing["tokens_saved"])
+        stream = FinalAnswerStream()
+        with stage("generation"):
+            async for chunk in p.document_chain.astream({"input": query, "context": docs}):
+                if not stream.buffer and chunk:
+                    t.set(ttft_ms=(time.perf_counter() - start) * 1000.0)
+                answer_was_started = stream.answer_started
+                reasoning, answer = stream.feed(chunk)
+                if stream.answer_started and not answer_was_started:
+                    t.set(first_answer_token_ms=(time.perf_counter() - start) * 1000.0)
+                if on_token is not None:
+                    on_token(reasoning, answer)
+        contexts = [d.page_content for d in docs]
+        if not contexts:
+            contexts = ["No relevant policy context found in the database."]
+        # 2. Split Reasoning from Answer (Critical for Faithfulness Score)
+        reasoning, clean_answer = stream.result()
+
+        # 3-5. Local pre-screen; only uncertain answers go on to the DeepEval Hallucination +
+        # RAGAS judges (concurrent) -> Triple-Guardrail verdict
+        # Under load (deep queue, or little time left before the deadline) RAGAS is shed
+        shed = ticket is not None and ticket.shed_ragas()
+        audit = await run_guardrails(query, clean_answer, contexts, p.deepeval_judge, p.judge_llm, p.embeddings,
+                                     skip_ragas=shed, time_left=ticket.remaining() if ticket is not None else None)
+        t.set(guardrail_tier=audit["tier"])
+        if audit["tier"] == "judges_shed":
+            serving.record("ragas_shed")
+        if packing is not None:
+            # The context went out once for generation and, when the judges ran, to DeepEval
+            # (hallucination) and RAGAS (faithfulness) too
+            record_packing(packing, copies=3 if audit["tier"] == "judges" else 1)
+
+        result = (clean_answer, reasoning, audit["security_status"], audit["hallucination"],
+                  audit["faithfulness"], audit["answer_relevancy"], contexts[0])
+        # Only answers that passed the guardrails are reused; flagged ones get re-audited
+        if audit["security_status"] == "🛡️ SECURE":
+            await p.answer_cache.aadd(query, result)
+    return result
+
+PENDING_STATUS = "⏳ AUDIT PENDING"
+BUSY_STATUS = "🚦 BUSY: too many requests queued, try again shortly"
+TIMEOUT_STATUS = "⏱️ DEADLINE EXCEEDED"
+
+def timing_summary(start, first_token_at):
+    ttft = f"{(first_token_at - start) * 1000:.0f} ms" if first_token_at else "–"
+    return f"⏱️ Time to first token: **{ttft}** · Total: **{(time.perf_counter() - start) * 1000:.0f} ms**"
+
+async def secure_policy_search_stream(query):
+    # Streaming UI: reasoning fills token by token, the answer as soon as the delimiter shows up,
+    # and scores + security label land when the judges finish. The pipeline runs in its own task
+    # (so its trace context stays put) and hands partial results over through a queue.
+    start = time.perf_counter()
+    if not SERVING_ENABLED:
+        async for update in _stream_audit(query, start, None):
+            yield update
+        return
+    streamed = False
+    try:
+        # Waits for a free worker; full queue or no worker before the deadline -> turned away
+        async with serving.admit() as ticket:
+            async for update in _stream_audit(query, start, ticket):
+                streamed = True
+                yield update
+    except Overloaded:
+        yield _final_update("", "", BUSY_STATUS, start)
+    except DeadlineExceeded:
+        if not streamed:  # otherwise the timeout was already shown, with the partial answer
+            yield _final_update("", "", TIMEOUT_STATUS, start)
+
+def _final_update(answer, reasoning, status, start, first_token_at=None):
+    return (gr.update(value=answer, label="AI Response"), reasoning, status, None, None, None, gr.update(),
+            timing_summary(start, first_token_at or time.perf_counter()))
+
+async def _stream_audit(query, start, ticket):
+    updates = asyncio.Queue()
+
+    async def produce():
+        try:
+            return await secure_policy_search(
+                query, on_token=lambda *partial: updates.put_nowait(partial), ticket=ticket
+            )
+        finally:
+            updates.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    first_token_at = None
+    answer = reasoning = ""
     try:
-        ragas_result = evaluate(dataset, metrics=[faithfulness, answer_relevancy], llm=llm)
-        r_faithfulness = ragas_result['faithfulness']
-        r_relevancy = ragas_result['answer_relevancy']
-    except Exception as e:
-        print(f"Ragas Error: {e}")
-        r_faithfulness, r_relevancy = 0.0, 0.0
+        while True:
+            try:
+                partial = await asyncio.wait_for(updates.get(), ticket.remaining() if ticket else None)
+            except asyncio.TimeoutError:
+                # Deadline hit mid-request: give up, keeping whatever was streamed so far
+                serving.record("deadline_exceeded")
+                yield _final_update(answer, reasoning, TIMEOUT_STATUS, start, first_token_at)
+                raise DeadlineExceeded("request ran past its deadline") from None
+            if partial is None:
+                break
+            first_token_at = first_token_at or time.perf_counter()
+            reasoning, answer = partial
+            yield (gr.update(value=answer, label="AI Response (provisional: audit running)"), reasoning,
+                   PENDING_STATUS, None, None, None, gr.update(), timing_summary(start, first_token_at))
+        clean_answer, reasoning, status, halluc, faith, relevancy, source = await task
+        yield (gr.update(value=clean_answer, label="AI Response"), reasoning, status, halluc, faith, relevancy,
+               source, timing_summary(start, first_token_at or time.perf_counter()))
+    finally:
+        if not task.done():
+            task.cancel()
 
-    # 5. Triple-Guardrail Security Logic
-    is_secure = (halluc_metric.score < 0.5 and r_faithfulness > 0.7 and r_relevancy > 0.8)
-    security_status = "🛡️ SECURE" if is_secure else "⚠️ AUDIT ALERT"
+def retrieval_stats_report():
+    from src.guardrails import tier_stats
 
-    return clean_answer, reasoning, security_status, halluc_metric.score, r_faithfulness, r_relevancy, contexts[0]
+    p = get_pipeline()
+    report = {**p.retriever.stats, "fast_path_rate": round(p.retriever.fast_path_rate(), 3),
+              "answer_cache": p.answer_cache.stats(), "guardrail_tiers": tier_stats(),
+              "context_packing": packing_stats(), "serving": serving_stats(),
+              "openai_scheduler": get_scheduler().stats()}
+    if p.hybrid_retriever is not None:
+        report["hybrid"] = {**p.hybrid_retriever.stats, "bm25_only_rate": round(p.hybrid_retriever.bm25_only_rate(), 3)}
+    return report
+
+def serving_stats():
+    # Queue depth, throughput and deadline / shedding counts, plus micro-batching efficiency
+    batchers = {}
+    if SERVING_ENABLED and _pipeline is not None:
+        batchers = {"embedding": _pipeline.embeddings.batcher, "search": _pipeline.vectorstore.batcher}
+    return {"enabled": SERVING_ENABLED, **serving.stats(batchers)}
+
+def latency_report():
+    return stage_summary("secure_policy_search", limit=200)
 
 # --- GRADIO UI ---
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
@@ -133,6 +356,7 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
                     query_input = gr.Textbox(label="Policy Question")
                     chat_output = gr.Textbox(label="AI Response", lines=4)
                     btn = gr.Button("Analyze & Audit", variant="primary")
+                    timing_info = gr.Markdown()
                 with gr.Column(scale=1):
                     reasoning_box = gr.Textbox(label="🔍 Auditor Reasoning", lines=8)
                     security_label = gr.Label(label="Security Audit Status")
@@ -145,12 +369,27 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
                 
         with gr.Tab("🛠️ System Audit"):
             audit_log = gr.Textbox(label="Primary Source Text", lines=10)
+            retrieval_stats = gr.JSON(label="Query Construction (rule fast path vs. LLM fallback), Answer Cache, Guardrail Tiers, Context Packing, Serving & OpenAI Scheduler")
+            stats_btn = gr.Button("Refresh Retrieval Stats")
+
+        with gr.Tab("⏱️ Latency"):
+            gr.Markdown("Per-stage p50 / p95 over the last 200 audited requests.")
+            latency_table = gr.Dataframe(label="Stage Latency & Token Usage", interactive=False)
+            latency_btn = gr.Button("Refresh Latency")
 
     btn.click(
-        secure_policy_search, 
+        secure_policy_search_stream, 
         inputs=query_input, 
-        outputs=[chat_output, reasoning_box, security_label, halluc_score, faith_score, relevancy_score, audit_log]
+        outputs=[chat_output, reasoning_box, security_label, halluc_score, faith_score, relevancy_score, audit_log,
+                 timing_info],
+        # Serving mode admits requests itself (worker pool + bounded queue), so Gradio lets them all through
+        concurrency_limit=None if SERVING_ENABLED else 1
     )
+    stats_btn.click(retrieval_stats_report, outputs=retrieval_stats)
+    latency_btn.click(latency_report, outputs=latency_table)
+    demo.load(latency_report, outputs=latency_table)
 
 if __name__ == "__main__":
+    if WARMUP_ENABLED:
+        start_warmup()
     demo.launch()
\ No newline at end of file
@@ -0,0 +1,163 @@
+import time
+import zlib
+import asyncio
+import numpy as np
+from typing import Any, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Simulated network latency in seconds; set through install()
+LATENCY = {"llm": 0.0, "embedding": 0.0}
+
+# Canned judge outputs, keyed by a phrase unique to each prompt's instructions.
+# RAGAS prompts are checked before DeepEval's because their examples also mention verdicts.
+CANNED_RESPONSES = [
+    ("break down each sentence into one or more fully understandable statements",
+     '[{"sentence_index": 0, "simpler_statements": ["Employees need a 50 Mbps connection."]}]'),
+    ("judge the faithfulness of a series of statements",
+     '[{"statement": "Employees need a 50 Mbps connection.", "reason": "Stated in the context.", "verdict": 1}]'),
+    ("Generate a question for the given answer",
+     '{"question": "What internet speed do employees need?", "noncommittal": 0}'),
+    ("verify if the context was useful",
+     '{"reason": "The context states the requirement.", "verdict": 1}'),
+    ("classify if the sentence can be attributed",
+     '[{"statement": "Employees need a 50 Mbps connection.", "attributed": 1, "reason": "Stated in the context."}]'),
+    ("TP (true positive)",
+     '{"TP": [{"statement": "Employees need a 50 Mbps connection.", "reason": "Matches the ground truth."}], '
+     '"FP": [], "FN": []}'),
+    ("structured request",
+     '```json\n{"query": "policy requirement", "filter": "NO_FILTER"}\n```'),
+    ("verdicts", '{"verdicts": [{"verdict": "yes", "reason": "The output agrees with the context."}]}'),
+    ('"reason"', '{"reason": "The output is grounded in the context."}'),
+]
+DEFAULT_ANSWER = (
+    "The question is about remote work requirements. The context lists a 50 Mbps minimum.\n"
+    "### Final Answer: Employees must maintain a minimum internet speed of 50 Mbps."
+)
+
+
+class FakeChatOpenAI(SimpleChatModel):
+    """Deterministic stand-in for ChatOpenAI: canned answers after a simulated delay."""
+
+    model_name: str = "fake-gpt"
+    temperature: float = 0
+
+    def __init__(self, **kwargs):
+        # Accept (and ignore) the ChatOpenAI-only settings the app passes in
+        kwargs["model_name"] = kwargs.pop("model", kwargs.get("model_name", "fake-gpt"))
+        allowed = set(self.__fields__)
+        super().__init__(**{k: v for k, v in kwargs.items() if k in allowed})
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-openai"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name, "temperature": self.temperature}
+
+    @staticmethod
+    def _respond(messages):
+        text = "\n".join(str(m.content) for m in messages).lower()
+        for marker, response in CANNED_RESPONSES:
+            if marker.lower() in text:
+                return response
+        return DEFAULT_ANSWER
+
+    def _call(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        time.sleep(LATENCY["llm"])
+        return self._respond(messages)
+
+    async def _acall(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                     run_manager: Any = None, **kwargs: Any) -> str:
+        await asyncio.sleep(LATENCY["llm"])
+        return self._respond(messages)
+
+    @staticmethod
+    def _usage(messages, content):
+        # Word counts stand in for tokens so usage tracking has something to add up
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        completion_tokens = len(content.split())
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _result(self, messages, content):
+        message = AIMessage(content=content, usage_metadata=self._usage(messages, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages, content):
+        # One word per chunk, then a content-free chunk carrying usage (like stream_usage=True)
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            text = word if i == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, content)))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(LATENCY["llm"])
+        for chunk in self._chunks(messages, self._respond(messages)):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(LATENCY["llm"])
+        for chunk in self._chunks(messages, self._respond(messages)):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._result(messages, self._call(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        # SimpleChatModel would push _call onto a thread; keep concurrent judges on the loop
+        content = await self._acall(messages, stop=stop, run_manager=run_manager, **kwargs)
+        return self._result(messages, content)
+
+
+class FakeOpenAIEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: same text -> same vector, shared words -> similar vectors."""
+
+    def __init__(self, model="fake-embedding", dimensions=1536, **kwargs):
+        self.model = model
+        self.dimensions = dimensions
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in text.lower().split():
+            vector[zlib.crc32(token.encode("utf-8")) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(LATENCY["embedding"])
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        time.sleep(LATENCY["embedding"])
+        return self._vector(text)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(LATENCY["embedding"])
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(LATENCY["embedding"])
+        return self._vector(text)
+
+
+def install(llm_latency_ms=0.0, embedding_latency_ms=0.0):
+    """Swap the OpenAI clients for the fakes. Call before importing app / src modules."""
+    import langchain_openai
+
+    LATENCY["llm"] = llm_latency_ms / 1000.0
+    LATENCY["embedding"] = embedding_latency_ms / 1000.0
+    langchain_openai.ChatOpenAI = FakeChatOpenAI
+    langchain_openai.OpenAIEmbeddings = FakeOpenAIEmbeddings
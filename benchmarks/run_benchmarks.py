@@ -0,0 +1,376 @@
+"""Offline performance benchmarks: no OpenAI key, no network.
+
+    python -m benchmarks.run_benchmarks run --output benchmarks/results/base.json
+    python -m benchmarks.run_benchmarks compare benchmarks/results/base.json benchmarks/results/new.json
+
+ChatOpenAI / OpenAIEmbeddings are replaced by the deterministic fakes in
+benchmarks/fakes.py (with optional simulated latency), and everything runs in
+a scratch workspace so the real indexes and caches under data/ are untouched.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Mix of rule fast-path queries and ones that need the self-query LLM
+QUERIES = [
+    "What is the Tennessee 2024 PTO policy?",
+    "What is the minimum internet speed for remote work in Texas?",
+    "How far in advance must New York travel reimbursement be requested in 2023?",
+    "What happens if an employee in CA fails to comply with the 2022 guidelines?",
+    "Which health benefits apply in 2024?",
+    "What are the eligibility rules for Full Remote status?",
+    "Compare Texas and California remote work rules",
+    "What was the Washington policy last year?",
+]
+
+
+# Fresh-process budgets in seconds (offline fakes, index already built). Every Spaces restart and
+# CI worker pays these; `cold_start_*` results over budget fail the run.
+COLD_START_BUDGETS = {
+    "app": {"import_s": 4.0, "first_request_s": 10.0},
+    "src.rag_system": {"import_s": 1.5, "first_request_s": 4.0},
+    "src.evaluator": {"import_s": 1.5, "first_request_s": 6.0},
+}
+# What "first served request" means for each entry point
+COLD_START_REQUESTS = {
+    "app": "import asyncio; asyncio.run(app.secure_policy_search(QUERY))",
+    "src.rag_system": "src.rag_system.initialize_rag(PDF_PATH)[0].invoke(QUERY)",
+    "src.evaluator": "src.evaluator.run_evaluation(QUERY, 'Employees need a 50 Mbps connection.', "
+                     "['Remote employees need a 50 Mbps connection.'], 'A 50 Mbps connection is required.')",
+}
+COLD_START_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {repo!r})
+if {fakes}:
+    from benchmarks.fakes import install
+    install()
+import {module}
+imported = time.perf_counter() - start
+QUERY, PDF_PATH = {query!r}, {pdf!r}
+if {fakes}:
+    {request}
+print(json.dumps({{"import_s": imported, "first_request_s": time.perf_counter() - start}}))
+"""
+
+
+def percentiles(samples_s):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def prepare_workspace(path=None):
+    # Scratch copy of the data layout: every relative "data/..." path in the repo lands here
+    workspace = path or tempfile.mkdtemp(prefix="rag_bench_")
+    os.makedirs(os.path.join(workspace, "data"), exist_ok=True)
+    policies = os.path.join(workspace, "data", "policies")
+    if not os.path.exists(policies):
+        try:
+            os.symlink(os.path.join(REPO_ROOT, "data", "policies"), policies, target_is_directory=True)
+        except OSError:
+            shutil.copytree(os.path.join(REPO_ROOT, "data", "policies"), policies)
+    os.chdir(workspace)
+    return workspace
+
+
+# --- BENCHMARKS ---
+def bench_ingest(workers, backend):
+    import ingest_multi
+
+    start = time.perf_counter()
+    stats = ingest_multi.ingest_structured(full_rebuild=True, workers=workers, backend=backend)
+    cold_s = time.perf_counter() - start
+
+    # Nothing changed: this is the cost of hashing + diffing the corpus
+    start = time.perf_counter()
+    ingest_multi.ingest_structured(workers=workers, backend=backend)
+    noop_s = time.perf_counter() - start
+
+    n_files = len([f for f in os.listdir(ingest_multi.DATA_PATH) if f.endswith(".pdf")])
+    return {
+        "files": n_files,
+        "chunks": stats["chunks"],
+        "cold_s": round(cold_s, 3),
+        "files_per_s": round(n_files / cold_s, 3),
+        "chunks_per_s": round(stats["chunks"] / cold_s, 3),
+        "noop_rerun_s": round(noop_s, 3),
+    }
+
+
+class _PrecomputedEmbeddings:
+    # Hands back vectors computed up front, so the build timing is pure vector-store cost
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.model = "precomputed"
+
+    def embed_documents(self, texts):
+        return [self.vectors[t] for t in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def bench_vectorstore_build():
+    from langchain_chroma import Chroma
+    from src.embedding_cache import get_embeddings
+    from src.numpy_store import NumpyVectorStore
+    from src.partitions import open_chroma
+    import ingest_multi
+
+    source = open_chroma(ingest_multi.DB_PATH, get_embeddings())
+    data = source.get(include=["documents", "metadatas"])
+    texts, metadatas = data["documents"], data["metadatas"]
+    embeddings = _PrecomputedEmbeddings(dict(zip(texts, get_embeddings().embed_documents(texts))))
+
+    results = {"chunks": len(texts)}
+    start = time.perf_counter()
+    Chroma.from_texts(texts, embeddings, metadatas=metadatas, collection_name="bench_build",
+                      persist_directory=os.path.join("data", "bench_chroma_build"))
+    results["chroma_s"] = round(time.perf_counter() - start, 3)
+    for dtype in ("float32", "int8"):
+        start = time.perf_counter()
+        NumpyVectorStore.from_texts(texts, embeddings, metadatas=metadatas, dtype=dtype,
+                                    persist_directory=os.path.join("data", f"bench_numpy_{dtype}"))
+        results[f"numpy_{dtype}_s"] = round(time.perf_counter() - start, 3)
+    return results
+
+
+def bench_retrieval(app, rounds):
+    for query in QUERIES:  # warm-up: first-call imports, caches, connection setup
+        app.retriever.invoke(query)
+    timings = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            start = time.perf_counter()
+            app.retriever.invoke(query)
+            timings.append(time.perf_counter() - start)
+    return {**percentiles(timings), "fast_path_rate": round(app.retriever.fast_path_rate(), 3)}
+
+
+def bench_end_to_end(app, rounds):
+    async def run():
+        timings = []
+        for _ in range(rounds):
+            for query in QUERIES:
+                start = time.perf_counter()
+                await app.secure_policy_search(query)
+                timings.append(time.perf_counter() - start)
+        return timings
+
+    return percentiles(asyncio.run(run()))
+
+
+def bench_evaluation(app, n_samples):
+    from src.evaluator import run_evaluation
+
+    with open(os.path.join(REPO_ROOT, "data", "eval_dataset.json"), "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+    samples = []
+    for row in (dataset * n_samples)[:n_samples]:
+        contexts = [d.page_content for d in app.retriever.invoke(row["question"])]
+        samples.append((row["question"], "Employees need a 50 Mbps connection.", contexts, row["ground_truth"]))
+
+    timings = []
+    for question, answer, contexts, ground_truth in samples:
+        start = time.perf_counter()
+        run_evaluation(question, answer, contexts, ground_truth)
+        timings.append(time.perf_counter() - start)
+    return {**percentiles(timings), "samples_per_s": round(len(timings) / sum(timings), 3)}
+
+
+def cold_start_run(module, query, fakes=True):
+    script = COLD_START_SCRIPT.format(
+        repo=REPO_ROOT, fakes=fakes, module=module, query=query, request=COLD_START_REQUESTS[module],
+        pdf=os.path.join(REPO_ROOT, "data", "company_policy.pdf")
+    )
+    proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{module} exited with {proc.returncode}: {proc.stderr.strip().splitlines()[-1:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_cold_start(module, repeats=3):
+    # Import time without the fakes (they pull in langchain_openai up front); best of `repeats`
+    import_s = min(cold_start_run(module, QUERIES[0], fakes=False)["import_s"] for _ in range(repeats))
+    # First request, once indexes exist: the restart case. The priming run builds them.
+    cold_start_run(module, QUERIES[0])
+    first_request_s = cold_start_run(module, QUERIES[1])["first_request_s"]
+    budget = COLD_START_BUDGETS[module]
+    return {
+        "import_s": round(import_s, 3),
+        "first_request_s": round(first_request_s, 3),
+        "over_budget": [m for m, value in (("import_s", import_s), ("first_request_s", first_request_s))
+                        if value > budget[m]],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args):
+    # Fakes + scratch paths must be in place before anything imports langchain_openai clients
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.fakes import install
+    install(llm_latency_ms=args.llm_latency_ms, embedding_latency_ms=args.embedding_latency_ms)
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-offline")
+    os.environ["DEEPEVAL_TELEMETRY_OPT_OUT"] = "YES"
+    os.environ["VECTOR_BACKEND"] = args.backend
+    # Every judge call pays the simulated latency; repeated queries would otherwise be free
+    os.environ["JUDGE_CACHE_BYPASS"] = "1"
+    workspace = prepare_workspace(args.workspace)
+    print(f"🧪 Benchmark workspace: {workspace}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "llm_latency_ms": args.llm_latency_ms,
+            "embedding_latency_ms": args.embedding_latency_ms,
+        },
+        "benchmarks": {},
+    }
+
+    def record(name, fn, *fn_args):
+        print(f"\n⏱️  {name} ...")
+        try:
+            report["benchmarks"][name] = fn(*fn_args)
+        except Exception as e:
+            # One broken stage (e.g. a missing optional dependency) should not sink the rest
+            report["benchmarks"][name] = {"error": f"{type(e).__name__}: {e}"}
+        print(f"   {report['benchmarks'][name]}")
+
+    # --- STEP 1: INGESTION + INDEX BUILD ---
+    record("ingest", bench_ingest, args.workers, args.backend)
+    if args.backend == "chroma":
+        record("vectorstore_build", bench_vectorstore_build)
+
+    # --- STEP 2: SERVING PATH (app.py loads the index built above) ---
+    import app
+    record("retrieval", bench_retrieval, app, args.rounds)
+    record("secure_policy_search", bench_end_to_end, app, args.e2e_rounds)
+
+    # --- STEP 3: OFFLINE EVALUATION ---
+    record("run_evaluation", bench_evaluation, app, args.eval_samples)
+
+    # --- STEP 4: COLD START (fresh processes) ---
+    for module in COLD_START_BUDGETS:
+        record(f"cold_start_{module.split('.')[-1]}", bench_cold_start, module)
+
+    os.chdir(REPO_ROOT)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if not args.workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+    print(f"\n✅ Results written to {output}")
+    over = {name: result["over_budget"] for name, result in report["benchmarks"].items() if result.get("over_budget")}
+    for name, metrics in over.items():
+        print(f"❌ {name}: {', '.join(metrics)} over the cold-start budget")
+    return report
+
+
+# --- COMPARE ---
+def metric_direction(name):
+    # +1: higher is better, -1: lower is better, 0: informational only
+    if name.endswith("_per_s") or name == "fast_path_rate":
+        return 1
+    if name.endswith("_ms") or name.endswith("_s"):
+        return -1
+    return 0
+
+
+def compare_results(base, new, threshold=0.10):
+    """Rows of (benchmark, metric, base, new, relative change, is_regression)."""
+    rows = []
+    for bench, base_metrics in base["benchmarks"].items():
+        new_metrics = new["benchmarks"].get(bench, {})
+        for metric, base_value in base_metrics.items():
+            direction = metric_direction(metric)
+            new_value = new_metrics.get(metric)
+            if not direction or not isinstance(base_value, (int, float)) or not isinstance(new_value, (int, float)):
+                continue
+            change = (new_value - base_value) / base_value if base_value else 0.0
+            rows.append((bench, metric, base_value, new_value, change, direction * change < -threshold))
+    return rows
+
+
+def run_compare(args):
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows = compare_results(base, new, threshold=args.threshold)
+    print(f"{'benchmark':<22}{'metric':<16}{'base':>12}{'new':>12}{'change':>10}")
+    for bench, metric, base_value, new_value, change, regressed in rows:
+        flag = "  ❌ REGRESSION" if regressed else ""
+        print(f"{bench:<22}{metric:<16}{base_value:>12.3f}{new_value:>12.3f}{change:>+10.1%}{flag}")
+
+    regressions = [r for r in rows if r[5]]
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the RAG pipeline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run all benchmarks and write a JSON report.")
+    run.add_argument("--output", help="Report path (default: benchmarks/results/bench_<timestamp>.json)")
+    run.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    run.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency per LLM call.")
+    run.add_argument("--embedding-latency-ms", type=float, default=0.0, help="Simulated latency per embedding call.")
+    run.add_argument("--workers", type=int, default=None, help="Ingest parser processes.")
+    run.add_argument("--rounds", type=int, default=5, help="Passes over the query set for retrieval.")
+    run.add_argument("--e2e-rounds", type=int, default=1, help="Passes over the query set end to end.")
+    run.add_argument("--eval-samples", type=int, default=3)
+    run.add_argument("--workspace", help="Keep the scratch workspace at this path instead of a temp dir.")
+
+    compare = sub.add_parser("compare", help="Flag regressions between two reports.")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown.")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        report = run_suite(args)
+        sys.exit(1 if any(r.get("over_budget") for r in report["benchmarks"].values()) else 0)
+    else:
+        sys.exit(run_compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,437 @@
 import os
+import json
+import glob
 import shutil
+import hashlib
+import argparse
+import itertools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader
-from langchain_openai import OpenAIEmbeddings
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_chroma import Chroma
+from chromadb.api.client import SharedSystemClient
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.embedding_cache import get_embeddings
+from src.policy_metadata import metadata_from_filename
+from src.numpy_store import NumpyVectorStore
+from src.bm25_index import BM25Index
+from src.dedup import ChunkDeduplicator, join_sources
+from src.scheduler import INGEST
+from src.partitions import PartitionedVectorStore, PARTITION_SCHEMES, load_layout, partition_key
+from src.index_stats import IndexStats, iter_chunks
 
 # Load Environment Variables
 load_dotenv()
 
 DATA_PATH = "data/policies/"
 DB_PATH = "data/chroma_db_multi"
+# Same chunks in the in-process NumPy format (src/numpy_store.py)
+NUMPY_DB_PATH = "data/numpy_index_multi"
+# Per-file content hashes + chunk ids, so re-runs only touch what changed
+MANIFEST_NAME = "ingest_manifest.json"
+# BM25 postings over the same chunks/ids, kept inside the vector index directory
+BM25_DIR = "bm25"
+# Extracted page text keyed by file hash, so unchanged PDFs are never re-parsed
+PARSE_CACHE_DIR = "data/.parse_cache"
+# Chunks are embedded + upserted in batches of this size instead of all at once
+WRITE_BATCH_SIZE = 256
 
-# --- 1. CLEAN START ---
-if os.path.exists(DB_PATH):
-    shutil.rmtree(DB_PATH) 
-    print("🧹 Old database cleared for fresh semantic indexing.")
 
-def ingest_structured():
-    # Load all PDFs from the directory
-    loader = DirectoryLoader(DATA_PATH, glob="./*.pdf", loader_cls=PyPDFLoader)
-    raw_docs = loader.load()
-    
-    valid_states = ["Tennessee", "Washington", "California", "Texas", "New York"]
-    section_docs = []
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(db_path=DB_PATH):
+    manifest_path = os.path.join(db_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, db_path=DB_PATH):
+    # Write-then-rename so a crash mid-ingest never leaves a torn manifest
+    os.makedirs(db_path, exist_ok=True)
+    manifest_path = os.path.join(db_path, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
 
+def section_split(raw_docs):
     # --- STEP 1: INITIAL SECTIONAL SPLIT ---
     # We first split by the physical word "Section" found in your PDFs
+    section_docs = []
     for doc in raw_docs:
         filename = doc.metadata.get("source", "Unknown")
-        state = next((s for s in valid_states if s in filename), "N/A")
-        year = 2024 if "2024" in filename else (2022 if "2022" in filename else 2023)
+        state, year = metadata_from_filename(filename)
 
         content = doc.page_content
         # Split by "Section" and filter out empty strings
         parts = [p.strip() for p in content.split("Section") if p.strip()]
-        
+
         for part in parts:
             # Re-format to keep the "Section" context for the LLM
             full_text = f"Section {part}" if part[0].isdigit() else part
-            
+
             section_docs.append(Document(
                 page_content=full_text,
-                metadata={"state": state, "year": year, "source": filename}
+                metadata={"state": state, "year": year, "source": filename, "sources": filename}
             ))
+    return section_docs
 
+
+def build_splitter(chunk_size=500, chunk_overlap=50, separators=None):
     # --- STEP 2: SEMANTIC RECURSIVE CHUNKING ---
     # Now we break those large Sections into smaller 500-char pieces.
     # This ensures "PTO" and "Internet" stay in different chunks!
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50,
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         # Priority: Paragraphs -> New Lines -> Policy Sections -> Bullets -> Sentences
-        separators=["\n\n", "\n", "Section ", "●", "•", ". ", " ", ""],
+        separators=separators or ["\n\n", "\n", "Section ", "●", "•", ". ", " ", ""],
         add_start_index=True
     )
 
-    # This creates the final atomic units for the Vector Store
-    semantic_chunks = text_splitter.split_documents(section_docs)
+
+def parse_pdf(path, file_hash):
+    cache_path = os.path.join(PARSE_CACHE_DIR, f"{file_hash}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            pages = json.load(f)
+    else:
+        pages = [
+            {"page": d.metadata.get("page", 0), "text": d.page_content}
+            for d in PyPDFLoader(path).load()
+        ]
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        # Per-process temp name: identical files may be parsed by two workers at once
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, cache_path)
+
+    # The cache is keyed by content, so the source path is re-attached on every load
+    return [Document(page_content=p["text"], metadata={"source": path, "page": p["page"]}) for p in pages]
+
+
+def process_file(source, file_hash, splitter_kwargs=None):
+    # Runs inside a pool worker: parse (or hit the cache), section split, then chunk
+    section_docs = section_split(parse_pdf(source, file_hash))
+    chunks = build_splitter(**(splitter_kwargs or {})).split_documents(section_docs)
+    return source, file_hash, len(section_docs), chunks
+
+
+def iter_processed_files(jobs, workers=None, splitter_kwargs=None):
+    # Yields (source, file_hash, n_sections, chunks) as files finish.
+    # At most 2x workers files are in flight, so memory stays bounded on huge corpora.
+    if workers == 1:
+        for source, file_hash in jobs:
+            yield process_file(source, file_hash, splitter_kwargs)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    jobs = iter(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {
+            pool.submit(process_file, source, file_hash, splitter_kwargs)
+            for source, file_hash in itertools.islice(jobs, workers * 2)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for source, file_hash in itertools.islice(jobs, 1):
+                    pending.add(pool.submit(process_file, source, file_hash, splitter_kwargs))
+                yield future.result()
+
+
+def chunk_ids_for(source, file_hash, chunks):
+    # Keyed on path + content: an unchanged file always maps to the same ids,
+    # while byte-identical copies under different names never collide
+    key = hashlib.sha256(f"{source}:{file_hash}".encode("utf-8")).hexdigest()[:24]
+    return [f"{key}-{i}" for i in range(len(chunks))]
+
+
+def current_partitioning(db_path=DB_PATH):
+    layout = load_layout(db_path)
+    return layout["scheme"] if layout else "none"
+
+
+def open_vectorstore(backend, embeddings, dtype="float32", partition_by="none"):
+    if backend == "numpy":
+        return NumpyVectorStore.load(NUMPY_DB_PATH, embeddings, dtype=dtype)
+    if partition_by != "none":
+        # One collection per partition (src/partitions.py), same persist directory
+        return PartitionedVectorStore.open(DB_PATH, embeddings, partition_by)
+    return Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+
+
+def vector_bytes(vectorstore, backend):
+    # Stored bytes per embedding (Chroma keeps float32)
+    if backend == "numpy":
+        return vectorstore.vector_nbytes
+    sample = vectorstore.get(limit=1, include=["embeddings"])["embeddings"]
+    return len(sample[0]) * 4 if sample is not None and len(sample) else 0
+
+
+def ingest_structured(full_rebuild=False, workers=None, backend="chroma", dtype="float32", dedup=True,
+                      partition_by=None, rebuild_partitions=()):
+    db_path = NUMPY_DB_PATH if backend == "numpy" else DB_PATH
+    if backend == "numpy":
+        if partition_by not in (None, "none") or rebuild_partitions:
+            # The NumPy index already filters in-process with a boolean mask before scoring
+            raise ValueError("Partitioning is only supported for the chroma backend.")
+        partition_by = "none"
+    else:
+        # None keeps whatever layout the index already has
+        partition_by = partition_by or current_partitioning(db_path)
+        if partition_by != current_partitioning(db_path) and os.path.exists(db_path) and not full_rebuild:
+            print(f"🗂️ Partitioning changes from {current_partitioning(db_path)!r} to {partition_by!r}: "
+                  f"rebuilding the index.")
+            full_rebuild = True
+    manifest = {} if full_rebuild else load_manifest(db_path)
+
+    # --- 1. CLEAN START (only when explicitly requested, or when the partitioning changes) ---
+    if full_rebuild and os.path.exists(db_path):
+        # Chroma clients opened earlier in this process would keep the deleted sqlite file open
+        SharedSystemClient.clear_system_cache()
+        shutil.rmtree(db_path)
+        print("🧹 Old database cleared for fresh semantic indexing.")
 
     # --- STEP 3: VECTOR STORE INITIALIZATION ---
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma.from_documents(
-        documents=semantic_chunks, 
-        embedding=embeddings, 
-        persist_directory=DB_PATH
+    # Cached by (model, text hash): templated boilerplate is only embedded once
+    # Background class: ingest batches only fill capacity chat and evaluation leave over
+    embeddings = get_embeddings(priority=INGEST)
+    vectorstore = open_vectorstore(backend, embeddings, dtype, partition_by)
+
+    index_empty = next(iter_chunks(vectorstore, page_size=1, include=[]), None) is None
+    if not manifest and not index_empty:
+        # Index predates the manifest: its chunk ids are unknown, so we cannot diff it
+        print("⚠️ Existing index has no manifest. Falling back to a full rebuild.")
+        vectorstore.delete_collection()
+        vectorstore = open_vectorstore(backend, embeddings, dtype, partition_by)
+        index_empty = True
+
+    # Running per-state/year/section counts for inspect_vector_db.py, kept in step with every write
+    stats = IndexStats() if index_empty else IndexStats.load(db_path)
+    if stats is None:
+        print("📈 Index has no stats sidecar yet. Counting its chunks once.")
+        stats = IndexStats.rebuild(vectorstore)
+        stats.save(db_path)
+
+    # Rebuilding one partition: drop its collection and re-ingest just the files that map to it.
+    # Dedup entries are scoped by (state, year), so no entry is shared with another partition.
+    if rebuild_partitions and partition_by == "none":
+        raise ValueError("--rebuild-partition needs a partitioned index (see --partition-by).")
+    for key in rebuild_partitions:
+        values = vectorstore.partitions.get(key, {}).get("values")
+        if not vectorstore.drop_partition(key):
+            print(f"⚠️ No partition {key!r} to rebuild (have: {sorted(vectorstore.partitions)}).")
+            continue
+        stats.drop(*values)
+        for source, entry in manifest.items():
+            state, year = metadata_from_filename(source)
+            if partition_key({"state": state, "year": year}, partition_by) == key:
+                entry["hash"] = None
+        # Persisted now, so a crash before the re-ingest still leaves those files marked stale
+        save_manifest(manifest, db_path)
+        stats.save(db_path)
+        print(f"🔁 Partition {key!r} dropped; its files will be re-ingested.")
+
+    def checkpoint():
+        # Chroma writes through on every upsert, so the manifest can follow each batch.
+        # The NumPy index only reaches disk on persist(), so its manifest waits for that.
+        if backend == "chroma":
+            save_manifest(manifest, db_path)
+            stats.save(db_path)
+
+    # Load all PDFs from the directory
+    current_files = sorted(
+        os.path.join(DATA_PATH, os.path.basename(p))
+        for p in glob.glob(os.path.join(DATA_PATH, "*.pdf"))
     )
-    
-    print(f"🚀 SUCCESS: Ingested {len(semantic_chunks)} semantic chunks.")
-    print(f"📊 Audit: Created {len(section_docs)} parent sections.")
+
+    jobs, skipped = [], 0
+    for source in current_files:
+        file_hash = file_sha256(source)
+        entry = manifest.get(source)
+        if entry and entry["hash"] == file_hash:
+            skipped += 1
+            continue
+        jobs.append((source, file_hash))
+    removed = [src for src in manifest if src not in current_files]
+
+    # --- STEP 4: DEDUP REGISTRY ---
+    # Several files can share one index entry, so an entry only goes once no file references it
+    refs = Counter(i for entry in manifest.values() for i in entry["chunk_ids"])
+    deduplicator = ChunkDeduplicator() if dedup else None
+    if deduplicator is not None and (jobs or removed):
+        for entry_id, text, metadata in iter_chunks(vectorstore):
+            deduplicator.add_existing(entry_id, text, metadata)
+    # Shared entries whose set of referencing files changed; their `sources` are rewritten at the end
+    pending_deletes, touched = [], set()
+    saved_bytes = 0
+
+    def release(source, ids, keep=()):
+        # Drop `source`'s references; entries nobody references any more are deleted on flush.
+        # `keep`: ids the file's new version still uses, so its own record of them stays valid.
+        for entry_id in ids:
+            refs[entry_id] -= 1
+            if refs[entry_id] <= 0:
+                pending_deletes.append(entry_id)
+                if deduplicator is not None:
+                    deduplicator.remove(entry_id)
+            elif entry_id not in keep:
+                touched.add(entry_id)
+
+    def delete_unreferenced():
+        stale_ids = [i for i in dict.fromkeys(pending_deletes) if refs[i] <= 0]
+        if stale_ids:
+            gone = vectorstore.get(ids=stale_ids, include=["documents", "metadatas"])
+            stats.remove(gone["documents"], gone["metadatas"])
+            vectorstore.delete(ids=stale_ids)
+        pending_deletes.clear()
+
+    # --- STEP 5: DROP CHUNKS OF REMOVED FILES ---
+    for source in removed:
+        release(source, manifest.pop(source)["chunk_ids"])
+    delete_unreferenced()
+    if removed:
+        checkpoint()
+
+    # --- STEP 6: EMBED ONLY NEW OR CHANGED FILES (EACH DISTINCT CHUNK ONCE) ---
+    re_embedded, total_chunks, total_sections = 0, 0, 0
+    batch_docs, batch_ids, batch_files = [], [], []
+
+    def flush_batch():
+        if batch_docs:
+            # Chroma upserts by id, so the live collection is updated in place
+            vectorstore.add_documents(batch_docs, ids=batch_ids)
+            stats.add([d.page_content for d in batch_docs], [d.metadata for d in batch_docs])
+        for source, file_hash, ids in batch_files:
+            manifest[source] = {"hash": file_hash, "chunk_ids": ids}
+        delete_unreferenced()
+        if batch_files:
+            checkpoint()
+        batch_docs.clear()
+        batch_ids.clear()
+        batch_files.clear()
+
+    for source, file_hash, n_sections, semantic_chunks in iter_processed_files(jobs, workers):
+        if deduplicator is None:
+            ids = chunk_ids_for(source, file_hash, semantic_chunks)
+            batch_docs.extend(semantic_chunks)
+            batch_ids.extend(ids)
+        else:
+            ids = []
+            for chunk in semantic_chunks:
+                entry_id, is_new = deduplicator.assign(chunk.page_content, chunk.metadata)
+                if is_new:
+                    batch_docs.append(chunk)
+                    batch_ids.append(entry_id)
+                else:
+                    saved_bytes += len(chunk.page_content.encode("utf-8"))
+                    touched.add(entry_id)
+                ids.append(entry_id)
+            ids = list(dict.fromkeys(ids))
+        refs.update(ids)
+        if source in manifest:
+            release(source, manifest[source]["chunk_ids"], keep=set(ids))
+        batch_files.append((source, file_hash, ids))
+        if len(batch_docs) >= WRITE_BATCH_SIZE:
+            flush_batch()
+
+        re_embedded += 1
+        total_chunks += len(semantic_chunks)
+        total_sections += n_sections
+    flush_batch()
+
+    # Shared entries list every file that uses them in `sources`; `source` stays put unless its
+    # file stopped using the entry, then it moves to one that still does
+    touched = sorted(i for i in touched if refs[i] > 0)
+    if touched:
+        wanted, owners = set(touched), {}
+        for source, entry in manifest.items():
+            for entry_id in entry["chunk_ids"]:
+                if entry_id in wanted:
+                    owners.setdefault(entry_id, []).append(source)
+        for start in range(0, len(touched), WRITE_BATCH_SIZE):
+            data = vectorstore.get(ids=touched[start:start + WRITE_BATCH_SIZE], include=["documents", "metadatas"])
+            docs, ids = [], []
+            for entry_id, text, meta in zip(data["ids"], data["documents"], data["metadatas"]):
+                files = sorted(owners.get(entry_id, ()))
+                if not files:
+                    continue
+                source = meta.get("source") if meta.get("source") in files else files[0]
+                if (meta.get("source"), meta.get("sources")) != (source, join_sources(files)):
+                    docs.append(Document(page_content=text, metadata={**meta, "source": source,
+                                                                      "sources": join_sources(files)}))
+                    ids.append(entry_id)
+            if docs:
+                # Same text, so the embedding comes from the cache
+                vectorstore.add_documents(docs, ids=ids)
+
+    if backend == "numpy":
+        vectorstore.persist()
+        save_manifest(manifest, db_path)
+        stats.save(db_path)
+
+    # --- STEP 7: LEXICAL INDEX ---
+    # Rebuilt from what the vector store now holds, so both indexes share chunk ids. Chunks are
+    # read in pages and streamed to disk: only the postings are ever held in memory.
+    bm25_path = os.path.join(db_path, BM25_DIR)
+    if re_embedded or removed or not os.path.exists(os.path.join(bm25_path, "meta.json")):
+        bm25 = BM25Index.build_to_disk(iter_chunks(vectorstore), bm25_path)
+        print(f"🔤 BM25 index: {len(bm25)} chunks, {len(bm25.vocab)} terms.")
+
+    print(f"🚀 SUCCESS: Ingested {total_chunks} semantic chunks.")
+    print(f"📊 Audit: Created {total_sections} parent sections.")
+    print(f"🧠 Embedding cache: {embeddings.stats()}")
+    print(f"♻️ Incremental: {re_embedded} files re-embedded, {skipped} unchanged files skipped, "
+          f"{len(removed)} removed files purged.")
+    report = {"re_embedded": re_embedded, "skipped": skipped, "removed": len(removed), "chunks": total_chunks}
+    if isinstance(vectorstore, PartitionedVectorStore):
+        report["partitions"] = vectorstore.partition_sizes()
+        print(f"🗂️ Partitions ({partition_by}): {len(report['partitions'])} collections, "
+              f"{min(report['partitions'].values(), default=0)}-{max(report['partitions'].values(), default=0)} "
+              f"chunks each.")
+    if deduplicator is not None and deduplicator.stats["chunks"]:
+        dedup_report = deduplicator.report()
+        merged = dedup_report["embeddings_saved"]
+        dedup_report["index_bytes_saved"] = saved_bytes + merged * vector_bytes(vectorstore, backend)
+        print(f"🧬 Dedup: {dedup_report['new_entries']} distinct chunks written for {dedup_report['chunks']} "
+              f"({dedup_report['exact_duplicates']} exact + {dedup_report['near_duplicates']} near duplicates, "
+              f"ratio {dedup_report['dedup_ratio']:.1%}); {merged} embeddings and "
+              f"~{dedup_report['index_bytes_saved'] / 1024:.0f} KiB of index saved; "
+              f"{dedup_report['cross_scope_copies']} copies kept apart by state/year.")
+        report["dedup"] = dedup_report
+    return report
+
 
 if __name__ == "__main__":
-    ingest_structured()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Index data/policies/ into the multi-policy vector DB.")
+    parser.add_argument("--full", action="store_true", help="Wipe the DB and re-embed every PDF.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="PDF parsing processes (default: CPU count, 1 = no pool).")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma",
+                        help=f"chroma -> {DB_PATH}, numpy -> {NUMPY_DB_PATH}")
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default="float32",
+                        help="Embedding storage precision for the numpy backend.")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Store every chunk copy instead of sharing one entry per distinct chunk.")
+    parser.add_argument("--partition-by", choices=["none", *PARTITION_SCHEMES], default=None,
+                        help="Shard the chroma index into one collection per state or state+year "
+                             "(default: keep the current layout; changing it rebuilds the index).")
+    parser.add_argument("--rebuild-partition", action="append", default=[], metavar="KEY",
+                        help='Drop and re-ingest one partition, e.g. "Texas" or "Texas|2024". Repeatable.')
+    args = parser.parse_args()
+    ingest_structured(full_rebuild=args.full, workers=args.workers, backend=args.backend, dtype=args.dtype,
+                      dedup=not args.no_dedup, partition_by=args.partition_by,
+                      rebuild_partitions=args.rebuild_partition)
@@ -1,39 +1,75 @@
-import os
+import argparse
+from itertools import islice
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-import pandas as pd
+from src.numpy_store import NumpyVectorStore
+from src.partitions import open_chroma
+from src.index_stats import IndexStats, iter_chunks, section_of, PAGE_SIZE
 
 load_dotenv()
 DB_PATH = "data/chroma_db_multi"
+NUMPY_DB_PATH = "data/numpy_index_multi"
 
-def inspect_sections():
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
-    data = vectorstore._collection.get(include=["documents", "metadatas"])
-    
-    def identify_section(text):
-        if "Section 3:" in text: return "Section 3"
-        if "Section 2:" in text: return "Section 2"
-        if "Section 1:" in text: return "Section 1"
-        return "Other"
-
-    df = pd.DataFrame({
-        "State": [m.get("state", "N/A") for m in data["metadatas"]],
-        "Year": [m.get("year", "N/A") for m in data["metadatas"]],
-        "Section": [identify_section(doc) for doc in data["documents"]],
-        "Text Preview": [doc[:150].replace('\n', ' ') + "..." for doc in data["documents"]]
-    })
-    
-    # Sort so you see Section 1, 2, 3 for the SAME document together
-    df = df.sort_values(by=["State", "Year", "Section"])
-    
-    print(f"\n📊 Total Chunks Found: {len(df)}")
-    
-    # Let's specifically look for Tennessee 2024 to verify the challenge
-    tn_2024 = df[(df['State'] == 'Tennessee') & (df['Year'] == 2024)]
-    print("\n🔍 Verification: Tennessee 2024 Sections")
-    print(tn_2024.to_string(index=False))
+def open_index(backend="chroma"):
+    # Inspection never embeds anything, so no embeddings client is created
+    if backend == "numpy":
+        return NumpyVectorStore.load(NUMPY_DB_PATH)
+    return open_chroma(DB_PATH, None)
+
+def load_stats(backend="chroma", rebuild=False):
+    db_path = NUMPY_DB_PATH if backend == "numpy" else DB_PATH
+    stats = None if rebuild else IndexStats.load(db_path)
+    if stats is None:
+        # Index built before the sidecar existed (or --rebuild-stats): one paginated pass
+        print("📈 Counting chunks page by page (no stats sidecar yet)...")
+        stats = IndexStats.rebuild(open_index(backend))
+        stats.save(db_path)
+    return stats
+
+def print_summary(stats, state=None, year=None):
+    # Instant: read from the sidecar ingest_multi.py keeps up to date
+    print(f"\n📊 Total Chunks Found: {stats.total}")
+    for field in ("state", "year"):
+        counts = ", ".join(f"{key[0]}: {n}" for key, n in stats.counts(field).items())
+        print(f"   By {field}: {counts}")
+    if state is not None or year is not None:
+        label = " ".join(str(v) for v in (state, year) if v is not None)
+        print(f"\n🧮 {label} by section:")
+        for (section,), n in stats.counts("section", state=state, year=year).items():
+            print(f"   {section:<10} {n}")
+    print("\n📏 Chunk length histogram (chars):")
+    histogram = stats.histogram(state=state, year=year)
+    widest = max(histogram.values(), default=1)
+    for bucket, n in histogram.items():
+        print(f"   {bucket:>9} {n:>7}  {'█' * max(1, round(30 * n / widest))}")
+
+def inspect_sections(backend="chroma", state="Tennessee", year=2024, page_size=PAGE_SIZE, limit=50):
+    # Streams only the chunks matching the filter, one page at a time (filtered inside the store)
+    conditions = [{field: {"$eq": value}} for field, value in (("state", state), ("year", year)) if value is not None]
+    where = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else None)
+
+    label = " ".join(str(v) for v in (state, year) if v is not None) or "all chunks"
+    print(f"\n🔍 Verification: {label} sections (first {limit})")
+    print(f"{'State':<12}{'Year':<6}{'Section':<11}Text Preview")
+    shown = 0
+    for _, doc, meta in islice(iter_chunks(open_index(backend), where=where, page_size=page_size), limit):
+        preview = doc[:150].replace('\n', ' ') + "..."
+        print(f"{str(meta.get('state', 'N/A')):<12}{str(meta.get('year', 'N/A')):<6}{section_of(doc):<11}{preview}")
+        shown += 1
+    if not shown:
+        print("   (no matching chunks)")
 
 if __name__ == "__main__":
-    inspect_sections()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Inspect the multi-policy vector DB.")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--state", default="Tennessee", help='State to drill into ("" for all)')
+    parser.add_argument("--year", type=int, default=2024, help="Year to drill into (0 for all)")
+    parser.add_argument("--limit", type=int, default=50, help="Chunks to print from the filtered stream")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Chunks fetched per page")
+    parser.add_argument("--summary-only", action="store_true", help="Only print the counts (no chunk scan)")
+    parser.add_argument("--rebuild-stats", action="store_true", help="Recount the stats sidecar from the index")
+    args = parser.parse_args()
+    state, year = args.state or None, args.year or None
+
+    print_summary(load_stats(args.backend, rebuild=args.rebuild_stats), state=state, year=year)
+    if not args.summary_only:
+        inspect_sections(backend=args.backend, state=state, year=year, page_size=args.page_size, limit=args.limit)
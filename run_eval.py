@@ -1,52 +1,245 @@
 import os
-from src.rag_system import initialize_rag
-from src.evaluator import run_evaluation
+import sys
+import glob
+import json
+import math
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from src.rag_system import initialize_rag
+from src.scheduler import EVALUATION, request_priority
+from src.results_store import (set_run_config, flush as flush_results, new_run_id, current_run_id, list_runs,
+                               compare_runs)
+
+DATASET_PATH = "data/eval_dataset.json"
+PDF_PATH = "data/company_policy.pdf"
+RUNS_DIR = "data/eval_runs"
+# Samples generated + scored per RAGAS call; a crash loses at most one batch of work
+BATCH_SIZE = 32
+GENERATION_CONCURRENCY = 8
+
+
+# --- DATASET ---
+def sample_id(sample):
+    # Stable across runs, so a resumed or re-sharded run recognises finished samples
+    if sample.get("id") is not None:
+        return str(sample["id"])
+    key = f"{sample['question']}\x1f{sample.get('ground_truth', '')}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def load_dataset(path):
+    """Rows in the data/eval_dataset.json schema, from a JSON array or a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = json.load(f)
+    samples, seen = [], set()
+    for row in rows:
+        row = dict(row, id=sample_id(row))
+        if row["id"] not in seen:
+            seen.add(row["id"])
+            samples.append(row)
+    return samples
+
+
+def shard_of(sid, n_shards):
+    return int(hashlib.sha1(sid.encode("utf-8")).hexdigest(), 16) % n_shards
+
+
+# --- CHECKPOINTS ---
+def shard_path(run_dir, shard, n_shards):
+    return os.path.join(run_dir, f"shard-{shard:03d}-of-{n_shards:03d}.jsonl")
+
+
+def read_results(run_dir):
+    """Every checkpointed record under `run_dir` (all shard files, any shard count), by sample id."""
+    records = {}
+    for path in sorted(glob.glob(os.path.join(run_dir, "shard-*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crashed worker
+                records[record["id"]] = record
+    return records
+
+
+def append_results(path, records):
+    with open(path, "a+", encoding="utf-8") as f:
+        # Terminate a torn line left by a crash so the next record starts clean
+        if f.tell() > 0:
+            f.seek(f.tell() - 1)
+            if f.read(1) != "\n":
+                f.write("\n")
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
 
 
-print("🚀 STARTING SCRIPT...")
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+# --- WORKER ---
+def generate(samples, rag_chain, retriever, concurrency):
+    """Fill in answer/contexts for samples that don't have them; failures are dropped (and retried on resume)."""
+    todo = [s for s in samples if not (s.get("answer") and s.get("contexts"))]
+    if todo:
+        config = {"max_concurrency": concurrency}
+        questions = [s["question"] for s in todo]
+        answers = rag_chain.batch(questions, config=config, return_exceptions=True)
+        docs = retriever.batch(questions, config=config, return_exceptions=True)
+        for sample, answer, found in zip(todo, answers, docs):
+            if isinstance(answer, Exception) or isinstance(found, Exception):
+                error = answer if isinstance(answer, Exception) else found
+                print(f"⚠️ Generation failed for {sample['id']}: {error!r}")
+                continue
+            sample["answer"] = answer
+            sample["contexts"] = [d.page_content for d in found]
+    return [s for s in samples if s.get("answer") and s.get("contexts")]
+
+
+def run_shard(dataset_path, run_dir, shard, n_shards, pdf_path=PDF_PATH,
+              batch_size=BATCH_SIZE, concurrency=GENERATION_CONCURRENCY, eval_concurrency=None):
+    # Imported here so --merge-only and the parent of a sharded run stay light
+    from src.evaluator import run_batch_evaluation, DEFAULT_MAX_CONCURRENCY
+
+    done = read_results(run_dir)
+    pending = [s for s in load_dataset(dataset_path)
+               if shard_of(s["id"], n_shards) == shard and s["id"] not in done]
+    label = f"[shard {shard + 1}/{n_shards}]"
+    print(f"📋 {label} {len(pending)} samples pending")
+    if not pending:
+        return 0
+
+    rag_chain, retriever = initialize_rag(pdf_path)
+    # Stamped on every row this shard adds to the results store (initialize_rag's settings)
+    set_run_config(script="run_eval", dataset=os.path.basename(dataset_path), pdf=os.path.basename(pdf_path),
+                   llm_model="gpt-4o-mini", chunk_size=1000, chunk_overlap=100, shards=n_shards)
+    out_path = shard_path(run_dir, shard, n_shards)
+    finished = 0
+    for start in range(0, len(pending), batch_size):
+        # Background class: a live chat app sharing the quota is served first
+        with request_priority(EVALUATION):
+            batch = generate(pending[start:start + batch_size], rag_chain, retriever, concurrency)
+        if not batch:
+            continue
+        report = run_batch_evaluation(batch, max_concurrency=eval_concurrency or DEFAULT_MAX_CONCURRENCY)
+        metric_columns = [c for c in report.attrs["aggregate"]]
+        records = []
+        for sample, (_, row) in zip(batch, report.iterrows()):
+            record = {k: sample.get(k) for k in ("id", "question", "ground_truth", "answer", "contexts")}
+            record.update({m: _clean(row[m]) for m in metric_columns})
+            record["shard"] = shard
+            records.append(record)
+        append_results(out_path, records)
+        # Pool workers exit without running atexit hooks, so results are flushed with each checkpoint
+        flush_results()
+        finished += len(records)
+        print(f"✅ {label} {finished}/{len(pending)} samples checkpointed")
+    return finished
+
+
+# --- MERGE ---
+def merge_results(dataset_path, run_dir):
+    """Checkpointed records in dataset order, written to <run_dir>/results.jsonl."""
+    records = read_results(run_dir)
+    ordered = [records[s["id"]] for s in load_dataset(dataset_path) if s["id"] in records]
+    with open(os.path.join(run_dir, "results.jsonl"), "w", encoding="utf-8") as f:
+        for record in ordered:
+            f.write(json.dumps(record) + "\n")
+    return pd.DataFrame(ordered)
+
 
 def main():
-    pdf_path = "data/company_policy.pdf" 
-    
-    # Check if file exists before doing anything
-    if not os.path.exists(pdf_path):
-        print(f"❌ ERROR: File not found at {pdf_path}")
-        return
-
-    print("--- 1. Initializing RAG System ---")
-    try:
-        # If it hangs here, the problem is in PDF loading or ChromaDB
-        rag_chain, retriever = initialize_rag(pdf_path)
-        print("✅ System Initialized Successfully")
-    except Exception as e:
-        print(f"❌ Initialization Failed: {e}")
-        return
-
-    query = "What is the internet speed requirement for remote work?"
-    ground_truth = "The internet speed requirement for remote work is a minimum of 50 Mbps."
-
-    print(f"\n--- 2. Testing Query: {query} ---")
-    try:
-        print("⏳ Talking to OpenAI (Answer Generation)...")
-        answer = rag_chain.invoke(query)
-        print(f"🤖 AI Answer: {answer}")
-
-        print("⏳ Talking to OpenAI (Evaluation)...")
-        # If it hangs here, the problem is in the RAGAS evaluator logic
-        docs = retriever.invoke(query)
-        contexts = [d.page_content for d in docs]
-        
-        report = run_evaluation(query, answer, contexts, ground_truth)
-        print("✅ Evaluation Complete")
-        
-        print("\n📈 FULL QUALITY DASHBOARD:")
-        print(report.to_string())
-        
-    except Exception as e:
-        print(f"❌ Execution Error: {e}")
+    parser = argparse.ArgumentParser(description="Resumable batch RAGAS evaluation over a golden dataset.")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="JSON array or JSONL of {question, ground_truth[, answer, contexts, id]}")
+    parser.add_argument("--pdf", default=PDF_PATH, help="Document the RAG system answers from")
+    parser.add_argument("--run-dir", default=None, help=f"Checkpoint directory (default: {RUNS_DIR}/<dataset name>)")
+    parser.add_argument("--shards", type=int, default=1, help="Split the dataset across this many worker processes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=GENERATION_CONCURRENCY, help="Concurrent generations per worker")
+    parser.add_argument("--eval-concurrency", type=int, default=None, help="Concurrent RAGAS judge jobs per worker")
+    parser.add_argument("--fresh", action="store_true", help="Discard existing checkpoints instead of resuming")
+    parser.add_argument("--merge-only", action="store_true", help="Only merge existing checkpoints")
+    parser.add_argument("--run-id", default=None, help="Results-store run id (default: a new timestamped id)")
+    parser.add_argument("--list-runs", action="store_true", help="List runs in the results store and exit")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "CANDIDATE"),
+                        help="Diff two stored runs per question and exit (non-zero on regressions)")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Drop that counts as a regression")
+    args = parser.parse_args()
+
+    if args.list_runs:
+        print(list_runs().to_string(index=False))
+        return 0
+    if args.compare:
+        diff = compare_runs(*args.compare, threshold=args.threshold)
+        deltas = [c for c in diff.columns if c.endswith("_delta")]
+        print(f"\n🔀 {args.compare[1]} vs {args.compare[0]}: {len(diff)} questions, {int(diff['regressed'].sum())} regressed")
+        if deltas:
+            print(diff[deltas].mean().to_string())
+            print(diff[diff["regressed"]][["question"] + deltas].to_string(index=False))
+        return 1 if diff["regressed"].any() else 0
+
+    if not os.path.exists(args.dataset) or not os.path.exists(args.pdf):
+        print(f"❌ ERROR: File not found at {args.dataset if not os.path.exists(args.dataset) else args.pdf}")
+        return 1
+    run_dir = args.run_dir or os.path.join(RUNS_DIR, os.path.splitext(os.path.basename(args.dataset))[0])
+    os.makedirs(run_dir, exist_ok=True)
+    if args.fresh:
+        for path in glob.glob(os.path.join(run_dir, "shard-*.jsonl")):
+            os.remove(path)
+
+    # Every shard process writes its rows to the results store under this one run id
+    os.environ["EVAL_RUN_ID"] = args.run_id or new_run_id()
+    if not args.merge_only:
+        # --- STEP 1: Build the index once, so workers only ever load it ---
+        print("--- 1. Initializing RAG System ---")
+        initialize_rag(args.pdf)
+
+        # --- STEP 2: Generate + evaluate, checkpointing every batch ---
+        print(f"--- 2. Evaluating {args.dataset} in {args.shards} shard(s) ---")
+        job = dict(dataset_path=args.dataset, run_dir=run_dir, n_shards=args.shards, pdf_path=args.pdf,
+                   batch_size=args.batch_size, concurrency=args.concurrency, eval_concurrency=args.eval_concurrency)
+        if args.shards == 1:
+            run_shard(shard=0, **job)
+        else:
+            # spawn: workers must not inherit the parent's Chroma/HTTP client state
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=args.shards, mp_context=context) as pool:
+                futures = [pool.submit(run_shard, shard=i, **job) for i in range(args.shards)]
+                failed = 0
+                for i, future in enumerate(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"❌ Shard {i + 1}/{args.shards} stopped: {e!r} (re-run to resume)")
+                if failed:
+                    return 1
+
+    # --- STEP 3: Merge shard checkpoints ---
+    report = merge_results(args.dataset, run_dir)
+    total = len(load_dataset(args.dataset))
+    print(f"\n📈 FULL QUALITY DASHBOARD ({len(report)}/{total} samples):")
+    metrics = [c for c in report.columns if c not in ("id", "question", "ground_truth", "answer", "contexts", "shard")]
+    if metrics:
+        print(report[metrics].mean().to_string())
+    print(f"💾 Results: {os.path.join(run_dir, 'results.jsonl')} (results store run id: {current_run_id()})")
+    return 0 if len(report) == total else 1
+
 
 if __name__ == "__main__":
+    print("🚀 STARTING SCRIPT...")
     print("🎯 Calling main()...")
-    main()
-    print("🏁 Script Finished.")
\ No newline at end of file
+    code = main()
+    print("🏁 Script Finished.")
+    sys.exit(code)
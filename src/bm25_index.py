@@ -0,0 +1,364 @@
+import os
+import re
+import json
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import Field
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from src.numpy_store import StringColumn, StringColumnWriter, compare, where_mask
+from src.policy_metadata import VALID_STATES
+from src.tracing import stage
+
+# "$500", "50", "2.5", "mbps", "section" ... (punctuation otherwise splits tokens)
+TOKEN_PATTERN = re.compile(r"\$?\d+(?:[.,]\d+)*|[a-z]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or our "
+    "should the their there this to under we what when where which who why will with you your".split()
+)
+# Tokens that make a query "exact": numbers, dollar amounts and state names
+STATE_TOKENS = frozenset(w for state in VALID_STATES for w in state.lower().split())
+METADATA_COLUMNS = ("state", "source")
+_stats_lock = threading.Lock()
+_reload_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def is_exact_token(token):
+    return token[0].isdigit() or token[0] == "$" or token in STATE_TOKENS
+
+
+class _PostingsBuilder:
+    # Term -> (rows, tfs) lists plus per-row length and filter columns, filled one chunk at a time
+    def __init__(self):
+        self.vocab = {}
+        self.term_docs, self.term_tfs = [], []
+        self.doc_len = []
+        self.columns = {name: [] for name in METADATA_COLUMNS + ("year",)}
+
+    def add(self, text, metadata):
+        row = len(self.doc_len)
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        self.doc_len.append(sum(counts.values()))
+        for token, tf in counts.items():
+            term = self.vocab.setdefault(token, len(self.vocab))
+            if term == len(self.term_docs):
+                self.term_docs.append([])
+                self.term_tfs.append([])
+            self.term_docs[term].append(row)
+            self.term_tfs[term].append(tf)
+        for name in METADATA_COLUMNS:
+            self.columns[name].append(str(metadata.get(name, "")))
+        self.columns["year"].append(int(metadata.get("year", 0) or 0))
+
+    def arrays(self):
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(d) for d in self.term_docs])
+        postings = np.fromiter((r for d in self.term_docs for r in d), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((t for d in self.term_tfs for t in d), dtype=np.float32, count=int(offsets[-1]))
+        columns = {name: np.array(self.columns[name]) for name in METADATA_COLUMNS}
+        columns["year"] = np.array(self.columns["year"], dtype=np.int64)
+        return offsets, postings, tfs, np.array(self.doc_len, dtype=np.float32), columns
+
+
+def _staging(directory):
+    staging = directory.rstrip("/\\") + ".staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    return staging
+
+
+def _swap_in(staging, directory):
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+
+class BM25Index:
+    """Okapi BM25 over the ingested chunks, stored as memory-mapped CSR postings.
+
+    Chunk ids, texts and metadata are kept alongside the postings so hits come
+    back as Documents with the same ids as the vector store, and `state` /
+    `year` / `source` filters are evaluated as boolean masks.
+    """
+
+    def __init__(self, vocab, offsets, postings, tfs, doc_len, ids, texts, metadatas, columns, k1=1.5, b=0.75):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.columns = columns
+        self.k1 = k1
+        self.b = b
+        n_docs = len(doc_len)
+        self.avgdl = float(np.mean(doc_len)) if n_docs else 0.0
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Per-document length normalisation, k1 * (1 - b + b * |d| / avgdl)
+        self.norm = (k1 * (1 - b + b * np.asarray(doc_len) / max(self.avgdl, 1e-9))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, ids, texts, metadatas, k1=1.5, b=0.75):
+        builder = _PostingsBuilder()
+        for text, metadata in zip(texts, metadatas):
+            builder.add(text, metadata)
+        offsets, postings, tfs, doc_len, columns = builder.arrays()
+        return cls(builder.vocab, offsets, postings, tfs, doc_len, list(ids), list(texts), list(metadatas),
+                   columns, k1, b)
+
+    @classmethod
+    def build_to_disk(cls, chunks, directory, k1=1.5, b=0.75):
+        """Index (id, text, metadata) triples streamed from `chunks` straight into `directory`.
+
+        Texts, ids and metadata are written as they arrive, so only the postings
+        are held in memory; the finished index is returned memory-mapped.
+        """
+        staging = _staging(directory)
+        builder = _PostingsBuilder()
+        writers = {name: StringColumnWriter(staging, name) for name in ("ids", "texts", "metadatas")}
+        try:
+            for chunk_id, text, metadata in chunks:
+                builder.add(text, metadata or {})
+                writers["ids"].append(chunk_id)
+                writers["texts"].append(text)
+                writers["metadatas"].append(json.dumps(metadata or {}))
+        finally:
+            for writer in writers.values():
+                writer.close()
+        cls._write_arrays(staging, builder.vocab, k1, b, *builder.arrays())
+        _swap_in(staging, directory)
+        return cls.load(directory)
+
+    # --- LOAD / PERSIST ---
+    @staticmethod
+    def _write_arrays(directory, vocab, k1, b, offsets, postings, tfs, doc_len, columns):
+        # meta.json goes last: load_bm25 / index_version key off it
+        for name, array in (("offsets", offsets), ("postings", postings), ("tfs", tfs), ("doc_len", doc_len)):
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        for name, column in columns.items():
+            np.save(os.path.join(directory, f"col_{name}.npy"), column)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"k1": k1, "b": b, "vocab": sorted(vocab, key=vocab.get)}, f)
+
+    def persist(self, directory):
+        # Same staged swap as the NumPy vector store: readers never see a half-written index
+        staging = _staging(directory)
+        StringColumn.save(staging, "ids", list(self.ids))
+        StringColumn.save(staging, "texts", list(self.texts))
+        StringColumn.save(staging, "metadatas", [json.dumps(m) for m in self.metadatas])
+        self._write_arrays(staging, self.vocab, self.k1, self.b, self.offsets, self.postings, self.tfs,
+                           self.doc_len, self.columns)
+        _swap_in(staging, directory)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                  for name in ("offsets", "postings", "tfs", "doc_len")}
+        columns = {name: np.load(os.path.join(directory, f"col_{name}.npy"), mmap_mode="r")
+                   for name in METADATA_COLUMNS + ("year",)}
+        return cls(
+            {term: i for i, term in enumerate(meta["vocab"])},
+            arrays["offsets"], arrays["postings"], arrays["tfs"], arrays["doc_len"],
+            StringColumn.load(directory, "ids"), StringColumn.load(directory, "texts"),
+            StringColumn.load(directory, "metadatas"), columns, meta["k1"], meta["b"]
+        )
+
+    # --- SEARCH ---
+    def _column_mask(self, key, op, value):
+        if key in self.columns:
+            return compare(self.columns[key], op, value)
+        column = np.array([self._metadata(i).get(key) for i in range(len(self))], dtype=object)
+        return compare(column, op, value)
+
+    def _metadata(self, row):
+        meta = self.metadatas[row]
+        return meta if isinstance(meta, dict) else json.loads(meta)
+
+    def document(self, row):
+        return Document(page_content=self.texts[row], metadata=self._metadata(row), id=self.ids[row])
+
+    def search(self, query, k=15, where=None):
+        """Top-k rows as [(row, score, coverage, exact)], best first.
+
+        `coverage` is the share of the IDF mass of the query's known terms that
+        the row matches. `exact` is True when the row contains every exact token
+        of the query (numbers, "$500", state names); an exact token the corpus
+        never mentions makes it False everywhere.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        known = [t for t in terms if t in self.vocab]
+        if not known or len(self) == 0:
+            return []
+        exact_terms = [t for t in terms if is_exact_token(t)]
+        exact_known = [t for t in exact_terms if t in self.vocab]
+        total_idf = float(sum(self.idf[self.vocab[t]] for t in known))
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = np.zeros(len(self), dtype=np.float32)
+        exact_hits = np.zeros(len(self), dtype=np.int32)
+        for token in known:
+            term = self.vocab[token]
+            rows = np.asarray(self.postings[self.offsets[term]:self.offsets[term + 1]])
+            tf = np.asarray(self.tfs[self.offsets[term]:self.offsets[term + 1]])
+            np.add.at(scores, rows, self.idf[term] * tf * (self.k1 + 1) / (tf + self.norm[rows]))
+            np.add.at(matched, rows, self.idf[term])
+            if token in exact_known:
+                exact_hits[rows] += 1
+
+        mask = where_mask(where, self._column_mask, len(self))
+        if mask is not None:
+            scores[~mask] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        all_exact = bool(exact_terms) and len(exact_known) == len(exact_terms)
+        return [
+            (int(r), float(scores[r]), float(matched[r] / total_idf) if total_idf > 0 else 0.0,
+             all_exact and exact_hits[r] == len(exact_known))
+            for r in candidates
+        ]
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 first; dense retrieval only when the lexical match is not convincing.
+
+    A query is answered from BM25 alone (no embedding call, no vector search)
+    when it contains exact tokens (a number, "$500", a state name), the best
+    lexical hit contains all of them and covers `min_coverage` of the query's
+    known terms, and there are at least `k` distinct hits. Otherwise the BM25
+    and dense (MMR) rankings are fused with reciprocal rank fusion.
+
+    With `bm25_path` set, the index is reloaded whenever a re-ingest replaces
+    it, so lexical hits never point at deleted or stale chunks.
+    """
+
+    bm25: Any
+    bm25_path: Optional[str] = None
+    bm25_version: Any = None
+    vectorstore: VectorStore
+    search_type: str = "mmr"
+    search_kwargs: Dict[str, Any] = Field(default_factory=dict)
+    min_coverage: float = 0.75
+    rrf_k: int = 60
+    stats: Dict[str, int] = Field(default_factory=lambda: {"bm25_only": 0, "fused": 0})
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _record(self, key):
+        with _stats_lock:
+            self.stats[key] += 1
+
+    def bm25_only_rate(self):
+        total = self.stats["bm25_only"] + self.stats["fused"]
+        return self.stats["bm25_only"] / total if total else 0.0
+
+    def _index(self):
+        # One stat() per query; a missing sidecar (mid-swap) keeps the index already loaded
+        if self.bm25_path is not None:
+            version = index_version(self.bm25_path)
+            if version is not None and version != self.bm25_version:
+                with _reload_lock:
+                    if version != self.bm25_version:
+                        self.bm25 = BM25Index.load(self.bm25_path)
+                        self.bm25_version = version
+        return self.bm25
+
+    def _lexical(self, query, where):
+        # Identical chunks (the corpus repeats boilerplate across files) are collapsed
+        k = self.search_kwargs.get("k", 4)
+        fetch_k = max(self.search_kwargs.get("fetch_k", 20), k)
+        index = self._index()  # rows below all refer to this one snapshot
+        hits, seen = [], set()
+        for row, _, coverage, exact in index.search(query, k=fetch_k * 2, where=where):
+            text = index.texts[row]
+            if text not in seen:
+                seen.add(text)
+                hits.append((row, coverage >= self.min_coverage and exact))
+        confident = len(hits) >= k and hits[0][1]
+        return [index.document(row) for row, _ in hits[:fetch_k]], confident
+
+    def _fuse(self, lexical, dense):
+        k = self.search_kwargs.get("k", 4)
+        scores, docs = {}, {}
+        for ranking in (lexical, dense):
+            for rank, doc in enumerate(ranking):
+                key = doc.page_content
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                docs.setdefault(key, doc)
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [docs[key] for key in best]
+
+    def _dense_kwargs(self, where):
+        kwargs = dict(self.search_kwargs)
+        kwargs.pop("filter", None)
+        if where is not None:
+            kwargs["filter"] = where
+        return kwargs
+
+    def search(self, query, where=None):
+        lexical, confident = self._lexical(query, where)
+        if confident:
+            self._record("bm25_only")
+            return lexical[:self.search_kwargs.get("k", 4)]
+        self._record("fused")
+        with stage("dense_retrieval"):
+            dense = self.vectorstore.search(query, self.search_type, **self._dense_kwargs(where))
+        return self._fuse(lexical, dense)
+
+    async def asearch(self, query, where=None):
+        lexical, confident = self._lexical(query, where)
+        if confident:
+            self._record("bm25_only")
+            return lexical[:self.search_kwargs.get("k", 4)]
+        self._record("fused")
+        with stage("dense_retrieval"):
+            dense = await self.vectorstore.asearch(query, self.search_type, **self._dense_kwargs(where))
+        return self._fuse(lexical, dense)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.search(query, self.search_kwargs.get("filter"))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.asearch(query, self.search_kwargs.get("filter"))
+
+
+def bm25_path(persist_directory: str) -> str:
+    return os.path.join(persist_directory, "bm25")
+
+
+def index_version(path: str):
+    # Every build writes a fresh meta.json, so (inode, mtime) changes with each re-ingest
+    try:
+        info = os.stat(os.path.join(path, "meta.json"))
+    except FileNotFoundError:
+        return None
+    return info.st_ino, info.st_mtime_ns
+
+
+def load_bm25(persist_directory: str) -> Optional[BM25Index]:
+    """The BM25 index ingest_multi.py keeps next to a vector index, if it was built."""
+    path = bm25_path(persist_directory)
+    return BM25Index.load(path) if os.path.exists(os.path.join(path, "meta.json")) else None
@@ -0,0 +1,191 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from langchain_core.documents import Document
+from src.dedup import normalize
+
+# Most context tokens a request sends to the generator (and again to each judge)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# CONTEXT_PACKING=0: pass retrieved chunks through untouched
+PACKING_ENABLED = os.getenv("CONTEXT_PACKING", "1").lower() not in ("0", "false", "no")
+TOKENIZER_MODEL = "gpt-4o-mini"
+# Shortest chunk-to-chunk overlap (chars) trusted as real splitter overlap rather than chance
+MIN_OVERLAP_CHARS = 20
+# Sentences shorter than this are headings and bullets: they are never dropped as repeats
+MIN_SENTENCE_WORDS = 4
+# A chunk is only cut to fit when at least this much of the budget is left
+MIN_TRUNCATED_TOKENS = 32
+# create_stuff_documents_chain joins chunks with a blank line
+SEPARATOR = "\n\n"
+# Sentence ends and line breaks, kept as their own pieces so text can be put back together
+SENTENCE_BREAK = re.compile(r"((?<=[.!?])\s+|\n+)")
+
+_totals = {"requests": 0, "chunks_in": 0, "chunks_out": 0, "tokens_in": 0, "tokens_out": 0,
+           "tokens_saved": 0, "prompt_tokens_saved": 0}
+_totals_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception:
+        # tiktoken missing, or its vocabulary can't be downloaded (offline): estimate instead
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1  # same estimate the scheduler uses
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _overlap(left, right):
+    # Longest suffix of `left` that is a prefix of `right` (the splitter's chunk_overlap)
+    for size in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_overlapping(docs):
+    """Stitch chunks of the same source whose spans overlap back into one passage.
+
+    Chunks are ordered by `start_index` within each source; two are merged only
+    when their text really overlaps, since `start_index` counts from the start
+    of a section, not of the file. A merged passage keeps the rank of its best
+    chunk. Returns (passages, chunks merged away).
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        groups.setdefault(doc.metadata.get("source"), []).append((rank, doc))
+
+    passages, merged = [], 0
+    for members in groups.values():
+        members.sort(key=lambda m: (m[1].metadata.get("start_index", -1), m[0]))
+        current = None  # [best rank, text, start, metadata]
+        for rank, doc in members:
+            text, start = doc.page_content, doc.metadata.get("start_index")
+            if current is not None and start is not None and current[2] is not None:
+                if text in current[1]:
+                    current[0], merged = min(current[0], rank), merged + 1
+                    continue
+                size = _overlap(current[1], text)
+                if size and start <= current[2] + len(current[1]):
+                    current[0], current[1], merged = min(current[0], rank), current[1] + text[size:], merged + 1
+                    continue
+            if current is not None:
+                passages.append(current)
+            current = [rank, text, start, dict(doc.metadata)]
+        passages.append(current)
+
+    passages.sort(key=lambda p: p[0])
+    return [Document(page_content=text, metadata=metadata) for _, text, _, metadata in passages], merged
+
+
+def _pieces(text):
+    # Alternating [sentence, break, sentence, break, ...]
+    return SENTENCE_BREAK.split(text)
+
+
+def drop_repeated_sentences(docs):
+    """Remove sentences a higher-ranked passage already said (after `normalize`).
+
+    Returns (docs, sentences dropped). Short pieces (headings, bullets) always stay.
+    """
+    seen, kept_docs, dropped = set(), [], 0
+    for doc in docs:
+        kept = []
+        for i, piece in enumerate(_pieces(doc.page_content)):
+            if i % 2:
+                kept.append(piece)
+                continue
+            key = normalize(piece)
+            if len(key.split()) >= MIN_SENTENCE_WORDS:
+                if key in seen:
+                    dropped += 1
+                    if kept:
+                        kept.pop()  # and the break in front of it
+                    continue
+                seen.add(key)
+            kept.append(piece)
+        text = "".join(kept).strip()
+        if text:
+            kept_docs.append(Document(page_content=text, metadata=doc.metadata))
+    return kept_docs, dropped
+
+
+def _truncate(text, budget):
+    # Whole sentences from the start of `text` that fit in `budget` tokens
+    pieces, kept = _pieces(text), ""
+    for i in range(0, len(pieces), 2):
+        candidate = kept + "".join(pieces[max(i - 1, 0):i + 1]) if kept else pieces[i]
+        if count_tokens(candidate) > budget:
+            break
+        kept = candidate
+    return kept.strip()
+
+
+def fit_budget(docs, budget):
+    """Keep passages in rank order until `budget` tokens are used; cut the first that overflows.
+
+    Returns (docs, tokens used, passages truncated).
+    """
+    packed, used, truncated = [], 0, 0
+    for doc in docs:
+        cost = count_tokens(doc.page_content) + (count_tokens(SEPARATOR) if packed else 0)
+        if used + cost <= budget:
+            packed.append(doc)
+            used += cost
+            continue
+        remaining = budget - used - (count_tokens(SEPARATOR) if packed else 0)
+        if remaining < MIN_TRUNCATED_TOKENS:
+            continue
+        text = _truncate(doc.page_content, remaining)
+        if text:
+            packed.append(Document(page_content=text, metadata={**doc.metadata, "truncated": True}))
+            used = budget - remaining + count_tokens(text)
+            truncated += 1
+    return packed, used, truncated
+
+
+def context_tokens(docs):
+    return count_tokens(SEPARATOR.join(d.page_content for d in docs)) if docs else 0
+
+
+def pack_context(docs, budget=CONTEXT_TOKEN_BUDGET):
+    """Merge overlapping chunks, drop repeated sentences and fit the rest into `budget` tokens.
+
+    Returns (packed docs, stats). Passages stay in retrieval order, so the best
+    match is still first (and is what the UI shows as the primary source).
+    """
+    docs = list(docs)
+    merged_docs, merged = merge_overlapping(docs)
+    deduped, dropped = drop_repeated_sentences(merged_docs)
+    packed, _, truncated = fit_budget(deduped, budget)
+    tokens_in, tokens_out = context_tokens(docs), context_tokens(packed)
+    return packed, {
+        "chunks_in": len(docs), "chunks_out": len(packed), "chunks_merged": merged,
+        "sentences_dropped": dropped, "truncated": truncated,
+        "tokens_in": tokens_in, "tokens_out": tokens_out, "tokens_saved": max(tokens_in - tokens_out, 0),
+    }
+
+
+def record_packing(stats, copies=1):
+    # `copies`: how many prompts carried the context (generation, plus each judge that ran)
+    with _totals_lock:
+        _totals["requests"] += 1
+        for field in ("chunks_in", "chunks_out", "tokens_in", "tokens_out", "tokens_saved"):
+            _totals[field] += stats[field]
+        _totals["prompt_tokens_saved"] += stats["tokens_saved"] * copies
+
+
+def packing_stats():
+    with _totals_lock:
+        totals = dict(_totals)
+    requests = totals["requests"]
+    return {**totals, "avg_tokens_saved": round(totals["tokens_saved"] / requests, 1) if requests else 0.0,
+            "budget": CONTEXT_TOKEN_BUDGET, "enabled": PACKING_ENABLED}
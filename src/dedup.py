@@ -0,0 +1,154 @@
+import os
+import re
+import hashlib
+import numpy as np
+from src.bm25_index import tokenize, is_exact_token
+
+# Shingle Jaccard similarity at which two chunks count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("DEDUP_JACCARD_THRESHOLD", "0.8"))
+NUM_PERM = 128
+BANDS = 32  # 4 rows per band: pairs at Jaccard 0.8 share a bucket with p > 0.9999
+SHINGLE_WORDS = 3
+# Joins the files sharing one entry in its `sources` metadata
+SOURCES_SEPARATOR = "|"
+
+# Words whose presence flips a rule: chunks differing in one of these are never merged
+NEGATIONS = frozenset("not no never nor without except unless cannot".split())
+WORD = re.compile(r"\$?\d+(?:[.,]\d+)*|\w+")
+_MERSENNE = (1 << 61) - 1
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def normalize(text):
+    # Case, whitespace and punctuation differences from PDF extraction don't make a new chunk
+    return " ".join(WORD.findall(text.lower()))
+
+
+def shingles(normalized):
+    words = normalized.split()
+    grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))}
+    return {int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams}
+
+
+def minhash(shingle_hashes):
+    x = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes))
+    # a < 2^31 and x < 2^32, so a * x + b never overflows uint64
+    return ((_PERM_A[:, None] * x[None, :] + _PERM_B[:, None]) % _MERSENNE).min(axis=1)
+
+
+def join_sources(sources):
+    # Every file an entry stands for, as one metadata string (Chroma values must be scalars)
+    return SOURCES_SEPARATOR.join(sorted(set(sources)))
+
+
+def scope_of(metadata):
+    return metadata.get("state"), metadata.get("year")
+
+
+class ChunkDeduplicator:
+    """Maps chunks onto shared index entries.
+
+    Exact copies (after `normalize`) share an entry directly; near copies are
+    found with MinHash/LSH and confirmed by shingle Jaccard >= `threshold`.
+    Entries are scoped by (state, year), so the usual `state`/`year` filters
+    keep matching every document a shared entry stands for. A near copy is
+    never merged when the words that differ are numbers, amounts, state names
+    or negations: "30 days" and "45 days" stay separate entries.
+
+    Limit: text repeated across scopes is stored once per scope (counted as
+    `cross_scope_copies`). On data/policies every chunk names its state and
+    year, so no text spans two scopes: 400 chunks -> 130 entries either way.
+    Which files share an entry is ingest's business: it keeps every one of
+    them in the entry's `sources` metadata (see `join_sources`).
+    """
+
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.rows = NUM_PERM // BANDS
+        self._exact = {}    # (scope, normalized text) -> entry id
+        self._buckets = {}  # (scope, band, band hash) -> {entry id}
+        self._entries = {}  # entry id -> (shingles, content tokens, bucket keys, exact keys)
+        self._scope_of_text = {}  # hash of normalized text -> first scope it was seen in
+        self.stats = {"chunks": 0, "exact_duplicates": 0, "near_duplicates": 0, "new_entries": 0,
+                      "cross_scope_copies": 0}
+
+    @staticmethod
+    def entry_id(scope, normalized):
+        return hashlib.sha256(f"{scope[0]}|{scope[1]}|{normalized}".encode("utf-8")).hexdigest()[:24]
+
+    def __contains__(self, entry_id):
+        return entry_id in self._entries
+
+    def _bucket_keys(self, scope, grams):
+        signature = minhash(grams)
+        return [(scope, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(BANDS)]
+
+    def _register(self, entry_id, scope, normalized, grams, keys):
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self._exact[(scope, normalized)] = entry_id
+        self._entries[entry_id] = (grams, set(tokenize(normalized)), keys, [(scope, normalized)])
+
+    def add_existing(self, entry_id, text, metadata):
+        """Register an entry that is already in the index."""
+        scope, normalized = scope_of(metadata), normalize(text)
+        if entry_id in self._entries or (scope, normalized) in self._exact:
+            return  # an older index may hold the same chunk twice; the first copy is reused
+        grams = shingles(normalized)
+        self._register(entry_id, scope, normalized, grams, self._bucket_keys(scope, grams))
+        self._scope_of_text.setdefault(hash(normalized), scope)
+
+    def _near_duplicate(self, grams, tokens, keys):
+        candidates = set().union(*(self._buckets.get(key, ()) for key in keys))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            other_grams, other_tokens = self._entries[candidate][:2]
+            similarity = len(grams & other_grams) / len(grams | other_grams)
+            if similarity >= best_similarity and not any(
+                    is_exact_token(t) or t in NEGATIONS for t in tokens ^ other_tokens):
+                best, best_similarity = candidate, similarity
+        return best
+
+    def assign(self, text, metadata):
+        """(entry id, is_new) for a chunk; is_new means it must be embedded and written."""
+        self.stats["chunks"] += 1
+        scope, normalized = scope_of(metadata), normalize(text)
+        existing = self._exact.get((scope, normalized))
+        if existing is not None:
+            self.stats["exact_duplicates"] += 1
+            return existing, False
+
+        grams = shingles(normalized)
+        keys = self._bucket_keys(scope, grams)
+        match = self._near_duplicate(grams, set(tokenize(normalized)), keys)
+        if match is not None:
+            self.stats["near_duplicates"] += 1
+            self._exact[(scope, normalized)] = match
+            self._entries[match][3].append((scope, normalized))
+            return match, False
+
+        entry_id = self.entry_id(scope, normalized)
+        self._register(entry_id, scope, normalized, grams, keys)
+        self.stats["new_entries"] += 1
+        # Same text under another (state, year): the savings scoping gives up
+        if self._scope_of_text.setdefault(hash(normalized), scope) != scope:
+            self.stats["cross_scope_copies"] += 1
+        return entry_id, True
+
+    def remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            self._buckets[key].discard(entry_id)
+        for key in entry[3]:
+            if self._exact.get(key) == entry_id:
+                del self._exact[key]
+
+    def report(self):
+        chunks = self.stats["chunks"]
+        merged = self.stats["exact_duplicates"] + self.stats["near_duplicates"]
+        return {**self.stats, "dedup_ratio": round(merged / chunks, 3) if chunks else 0.0,
+                "embeddings_saved": merged}
@@ -0,0 +1,156 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from langchain_core.embeddings import Embeddings
+
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/.embedding_cache.sqlite")
+MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+
+class CachedEmbeddings(Embeddings):
+    """Drop-in Embeddings wrapper backed by a local SQLite store.
+
+    Vectors are keyed by (model, sha256(text)), so templated boilerplate that
+    repeats across policies is embedded once. Misses within a call are sent to
+    the underlying model as a single batch, and the least recently used rows
+    are evicted once the store grows past `max_entries`.
+    """
+
+    def __init__(self, underlying, model=None, path=CACHE_PATH, max_entries=MAX_ENTRIES, batch_queries=False):
+        self.underlying = underlying
+        # batch_queries: the model embeds queries like documents, so missed queries can share one request
+        self.batch_queries = batch_queries
+        self.model = model or getattr(underlying, "model", type(underlying).__name__)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text, kind):
+        # Queries and documents are namespaced apart: some models embed them differently
+        return hashlib.sha256(f"{self.model}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-variable limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items],
+            )
+            # Upper bound (replaced rows count twice); re-synced whenever we evict
+            self._count += len(items)
+            if self._count > self.max_entries:
+                # Evict down to 90% so we do not pay for an eviction on every insert
+                excess = self._count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn.commit()
+
+    def _embed(self, texts, kind):
+        keys = [self._key(t, kind) for t in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Each distinct missing text goes out once, all in one batched request
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            if kind == "query" and not (self.batch_queries and len(missing) > 1):
+                vectors = [self.underlying.embed_query(t) for t in missing.values()]
+            else:
+                vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self._store(fresh)
+            found.update(fresh)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts), "document")
+
+    def embed_query(self, text):
+        return self._embed([text], "query")[0]
+
+    def missing(self, texts, kind="document"):
+        """The distinct texts that would need a model call (not cached yet)."""
+        keys = {self._key(t, kind): t for t in texts}
+        found = self._lookup(list(keys))
+        return [text for key, text in keys.items() if key not in found]
+
+    def embed_queries(self, texts):
+        """Several queries at once (the serving micro-batcher's entry point)."""
+        return self._embed(list(texts), "query")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "model": self.model,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._count,
+        }
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_embeddings(priority=None, **kwargs):
+    """Return the process-wide cached OpenAIEmbeddings for these settings.
+
+    Misses are sent through the shared request scheduler at `priority`.
+    """
+    from langchain_openai import OpenAIEmbeddings
+    from src.scheduler import openai_clients
+
+    key = (priority,) + tuple(sorted(kwargs.items()))
+    with _shared_lock:
+        if key not in _shared:
+            # OpenAI has no separate query encoder: embed_query(q) is embed_documents([q])[0]
+            _shared[key] = CachedEmbeddings(OpenAIEmbeddings(**kwargs, **openai_clients(priority)), batch_queries=True)
+        return _shared[key]
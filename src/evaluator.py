@@ -1,66 +1,105 @@
-from ragas import evaluate
-from ragas.metrics import faithfulness, answer_relevancy, context_recall
-from datasets import Dataset
-import pandas as pd
-
-from ragas import evaluate
-from ragas.metrics import faithfulness, answer_relevancy
-from datasets import Dataset
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-
-from ragas import evaluate
-from ragas.metrics import faithfulness, answer_relevancy
-from datasets import Dataset
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-
-# Updated imports to satisfy the Deprecation Warnings
-from ragas.metrics.collections import faithfulness, answer_relevancy, context_recall, context_precision, answer_correctness
-
-from ragas.metrics import (
-    faithfulness, 
-    answer_relevancy, 
-    context_precision, 
-    context_recall,
-    answer_correctness
-)
-
-from ragas import evaluate
-from ragas.metrics import (
-    faithfulness, 
-    answer_relevancy, 
-    context_precision, 
-    context_recall,
-    answer_correctness
-)
-from datasets import Dataset
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from functools import lru_cache
+from src.embedding_cache import get_embeddings
+import time
+from src.tracing import trace, stage, TraceCallbackHandler, current_stage_ms
+from src.scheduler import EVALUATION
+from src.results_store import record_results, model_name
+
+# ragas, datasets and the judge clients are imported on first use, so importing this
+# module (run_eval.py workers, pytest collection) doesn't pay for them up front.
+
+
+@lru_cache(maxsize=None)
+def eval_metrics():
+    from ragas.metrics import (
+        faithfulness,
+        answer_relevancy,
+        context_precision,
+        context_recall,
+        answer_correctness
+    )
+    return [faithfulness, answer_relevancy, context_precision, context_recall, answer_correctness]
+
+
+def __getattr__(name):
+    # EVAL_METRICS used to be a module constant
+    if name == "EVAL_METRICS":
+        return eval_metrics()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# How many RAGAS metric jobs (sample x metric) may hit OpenAI at once
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+@lru_cache(maxsize=None)
+def get_judges():
+    # Built once per process and shared by every evaluation call.
+    # We use gpt-4o-mini to keep your costs very low during evaluation;
+    # its responses are memoized in the persistent judge cache.
+    # RAGAS scores on its own worker thread, so the priority is fixed on the clients
+    # (background class: interactive chat traffic is admitted first).
+    from src.judge_cache import get_judge_llm
+
+    eval_llm = get_judge_llm(model="gpt-4o-mini", priority=EVALUATION)
+    eval_embeddings = get_embeddings(priority=EVALUATION)
+    return eval_llm, eval_embeddings
+
+
+def run_batch_evaluation(samples, max_concurrency=DEFAULT_MAX_CONCURRENCY, metrics=None):
+    # samples: list of {"question", "answer", "contexts", "ground_truth"} dicts,
+    # e.g. every row of data/eval_dataset.json once answers/contexts are filled in.
+    from ragas import evaluate
+    from ragas.run_config import RunConfig
+    from datasets import Dataset
+
+    metrics = metrics or eval_metrics()
 
-def run_evaluation(question, answer, contexts, ground_truth):
     # RAGAS expects a dictionary of lists
     data = {
-        "question": [question],
-        "answer": [answer],
-        "contexts": [contexts], # This must be a list of strings
-        "ground_truth": [ground_truth]
+        "question": [s["question"] for s in samples],
+        "answer": [s["answer"] for s in samples],
+        "contexts": [list(s["contexts"]) for s in samples], # Each must be a list of strings
+        "ground_truth": [s["ground_truth"] for s in samples]
     }
-
     dataset = Dataset.from_dict(data)
-    
-    # We use gpt-4o-mini to keep your costs very low during evaluation
-    eval_llm = ChatOpenAI(model="gpt-4o-mini")
-    eval_embeddings = OpenAIEmbeddings()
-
-    result = evaluate(
-        dataset,
-        metrics=[
-            faithfulness, 
-            answer_relevancy, 
-            context_precision, 
-            context_recall,
-            answer_correctness
-        ],
-        llm=eval_llm,
-        embeddings=eval_embeddings
+
+    with trace("run_evaluation", samples=len(samples), metrics=[m.name for m in metrics],
+               context_chunks=sum(len(c) for c in data["contexts"]),
+               context_chars=sum(len(t) for c in data["contexts"] for t in c)) as t:
+        eval_llm, eval_embeddings = get_judges()
+        start = time.perf_counter()
+        with stage("ragas_evaluate"):
+            result = evaluate(
+                dataset,
+                metrics=metrics,
+                llm=eval_llm,
+                embeddings=eval_embeddings,
+                run_config=RunConfig(max_workers=max_concurrency),
+                # RAGAS scores on its own worker thread, outside this trace's context
+                callbacks=[TraceCallbackHandler(t, default_stage="ragas_evaluate")]
+            )
+        latency_ms, stage_ms = (time.perf_counter() - start) * 1000.0, current_stage_ms()
+
+    # One row per sample; dataset-level means ride along in df.attrs["aggregate"]
+    df = result.to_pandas()
+    df.attrs["aggregate"] = {m.name: float(df[m.name].mean()) for m in metrics if m.name in df}
+    # Every score also lands in the columnar results store (src/results_store.py) for cross-run queries
+    record_results(
+        "run_evaluation",
+        [{**{k: s.get(k) for k in ("id", "question", "answer", "ground_truth")},
+          **{m.name: row[m.name] for m in metrics if m.name in df}, "config": {"batch_size": len(samples)}}
+         for s, (_, row) in zip(samples, df.iterrows())],
+        latency_ms=latency_ms, stage_ms=stage_ms,
+        judge_model=model_name(eval_llm), embedding_model=model_name(eval_embeddings)
     )
-    
-    return result.to_pandas()
\ No newline at end of file
+    return df
+
+
+def run_evaluation(question, answer, contexts, ground_truth):
+    return run_batch_evaluation([{
+        "question": question,
+        "answer": answer,
+        "contexts": contexts,
+        "ground_truth": ground_truth
+    }])
@@ -0,0 +1,155 @@
+import os
+import time
+import asyncio
+import threading
+from deepeval.metrics import HallucinationMetric
+from deepeval.test_case import LLMTestCase
+from ragas.metrics import Faithfulness, AnswerRelevancy
+from ragas.llms import LangchainLLMWrapper
+from ragas.embeddings import LangchainEmbeddingsWrapper
+from ragas.run_config import RunConfig
+from src.prescreen import prescreen
+from src.tracing import stage, current_stage_ms
+from src.results_store import record_results, model_name
+
+# Per-judge wall-clock budgets (seconds). A judge that overruns fails closed.
+HALLUCINATION_TIMEOUT = float(os.getenv("HALLUCINATION_JUDGE_TIMEOUT", "60"))
+RAGAS_TIMEOUT = float(os.getenv("RAGAS_JUDGE_TIMEOUT", "90"))
+# Tier 1: settle clearly grounded / ungrounded answers and refusals locally (GUARDRAIL_PRESCREEN=0 disables)
+PRESCREEN_ENABLED = os.getenv("GUARDRAIL_PRESCREEN", "1").lower() not in ("0", "false", "no")
+REFUSAL_STATUS = "🛡️ SECURE (refusal)"
+# Under load shedding only DeepEval judges the answer
+SHED_STATUS = "🛡️ SECURE (RAGAS skipped)"
+
+# Which tier settled each audit, since process start
+TIERS = ("prescreen_grounded", "prescreen_ungrounded", "prescreen_refusal", "judges", "judges_shed")
+_tier_counts = dict.fromkeys(TIERS, 0)
+_tier_lock = threading.Lock()
+
+
+async def judge_hallucination(query, answer, contexts, judge, timeout=HALLUCINATION_TIMEOUT):
+    # DeepEval Hallucination Check
+    test_case = LLMTestCase(
+        input=query,
+        actual_output=answer,
+        context=contexts  # Use 'context' instead of 'retrieval_context'
+    )
+    halluc_metric = HallucinationMetric(threshold=0.5, model=judge)
+    try:
+        with stage("hallucination_judge"):
+            await asyncio.wait_for(halluc_metric.a_measure(test_case, _show_indicator=False), timeout)
+        return halluc_metric.score
+    except Exception as e:
+        # Timeouts included: an unjudged answer is treated as fully hallucinated
+        print(f"DeepEval Error: {e!r}")
+        return 1.0
+
+
+async def judge_ragas(query, answer, contexts, llm, embeddings, timeout=RAGAS_TIMEOUT):
+    # RAGAS Evaluation (Evaluating only the CLEAN answer).
+    # Metrics are scored directly on the running loop, so no nested event loop is needed.
+    run_config = RunConfig(timeout=timeout)
+    r_faithfulness_metric = Faithfulness(llm=LangchainLLMWrapper(llm))
+    r_relevancy_metric = AnswerRelevancy(
+        llm=LangchainLLMWrapper(llm),
+        embeddings=LangchainEmbeddingsWrapper(embeddings)
+    )
+    r_faithfulness_metric.init(run_config)
+    r_relevancy_metric.init(run_config)
+
+    row = {"question": query, "answer": answer, "contexts": contexts}
+    try:
+        with stage("ragas_judges"):
+            r_faithfulness, r_relevancy = await asyncio.wait_for(
+                asyncio.gather(r_faithfulness_metric.ascore(row), r_relevancy_metric.ascore(row)),
+                timeout
+            )
+    except Exception as e:
+        print(f"Ragas Error: {e!r}")
+        r_faithfulness, r_relevancy = 0.0, 0.0
+    return r_faithfulness, r_relevancy
+
+
+def security_verdict(halluc_score, r_faithfulness, r_relevancy):
+    # Triple-Guardrail Security Logic
+    is_secure = (halluc_score < 0.5 and r_faithfulness > 0.7 and r_relevancy > 0.8)
+    return "🛡️ SECURE" if is_secure else "⚠️ AUDIT ALERT"
+
+
+def _record_tier(tier):
+    with _tier_lock:
+        _tier_counts[tier] += 1
+
+
+def tier_stats():
+    with _tier_lock:
+        counts = dict(_tier_counts)
+    total = sum(counts.values())
+    prescreened = total - counts["judges"] - counts["judges_shed"]
+    return {**counts, "prescreen_rate": round(prescreened / total, 3) if total else 0.0}
+
+
+def settle_prescreened(decision, signals):
+    # Scores here are the lexical signals, not judge outputs; relevancy is left unjudged
+    if decision == "refusal":
+        return {"hallucination": 0.0, "faithfulness": None, "answer_relevancy": None,
+                "security_status": REFUSAL_STATUS}
+    return {
+        "hallucination": round(1.0 - signals["support"], 3),
+        "faithfulness": signals["support"],
+        "answer_relevancy": None,
+        "security_status": "🛡️ SECURE" if decision == "grounded" else "⚠️ AUDIT ALERT"
+    }
+
+
+async def run_guardrails(query, answer, contexts, judge, llm, embeddings, use_prescreen=PRESCREEN_ENABLED,
+                         skip_ragas=False, time_left=None):
+    # skip_ragas: load shedding (DeepEval only); time_left: seconds until the request's deadline
+    start = time.perf_counter()
+    audit = await _audit(query, answer, contexts, judge, llm, embeddings, use_prescreen, skip_ragas, time_left)
+    # Every verdict is kept in the columnar results store (src/results_store.py); stage_ms carries
+    # the whole request's stages so far (retrieval, generation, judges)
+    record_results(
+        "guardrails",
+        [{"question": query, "answer": answer, **{k: audit.get(k) for k in (
+            "hallucination", "faithfulness", "answer_relevancy", "security_status", "tier")}}],
+        latency_ms=(time.perf_counter() - start) * 1000.0, stage_ms=current_stage_ms(),
+        judge_model=model_name(judge), embedding_model=model_name(embeddings)
+    )
+    return audit
+
+
+async def _audit(query, answer, contexts, judge, llm, embeddings, use_prescreen, skip_ragas, time_left):
+    if use_prescreen:
+        with stage("prescreen"):
+            decision, signals = prescreen(query, answer, contexts)
+        if decision != "uncertain":
+            _record_tier(f"prescreen_{decision}")
+            return {**settle_prescreened(decision, signals), "tier": f"prescreen_{decision}", "prescreen": signals}
+    halluc_timeout = HALLUCINATION_TIMEOUT if time_left is None else min(HALLUCINATION_TIMEOUT, time_left)
+    if skip_ragas:
+        _record_tier("judges_shed")
+        halluc_score = await judge_hallucination(query, answer, contexts, judge, halluc_timeout)
+        return {
+            "hallucination": halluc_score,
+            "faithfulness": None,
+            "answer_relevancy": None,
+            "security_status": SHED_STATUS if halluc_score < 0.5 else "⚠️ AUDIT ALERT",
+            "tier": "judges_shed"
+        }
+    _record_tier("judges")
+
+    # Both judges only depend on the RAG output, so they run side by side:
+    # latency is the slower of the two, not their sum.
+    ragas_timeout = RAGAS_TIMEOUT if time_left is None else min(RAGAS_TIMEOUT, time_left)
+    halluc_score, (r_faithfulness, r_relevancy) = await asyncio.gather(
+        judge_hallucination(query, answer, contexts, judge, halluc_timeout),
+        judge_ragas(query, answer, contexts, llm, embeddings, ragas_timeout)
+    )
+    return {
+        "hallucination": halluc_score,
+        "faithfulness": r_faithfulness,
+        "answer_relevancy": r_relevancy,
+        "security_status": security_verdict(halluc_score, r_faithfulness, r_relevancy),
+        "tier": "judges"
+    }
@@ -0,0 +1,132 @@
+import os
+import re
+import json
+from collections import Counter
+from src.partitions import PartitionedVectorStore
+
+# Sidecar next to the vector index: counts that summary views read instead of scanning chunks
+STATS_NAME = "index_stats.json"
+# Chunk-length histogram bins (characters); the last bin is open-ended
+LENGTH_BINS = (0, 100, 200, 300, 400, 500, 750, 1000, 2000)
+PAGE_SIZE = 1000
+SECTION = re.compile(r"Section (\d+):")
+
+
+def section_of(text):
+    # The highest numbered "Section N:" heading in the chunk, e.g. "Section 3"
+    numbers = [int(n) for n in SECTION.findall(text)]
+    return f"Section {max(numbers)}" if numbers else "Other"
+
+
+def length_bin(n_chars):
+    lower = max(b for b in LENGTH_BINS if b <= n_chars)
+    upper = LENGTH_BINS[LENGTH_BINS.index(lower) + 1] if lower != LENGTH_BINS[-1] else None
+    return f"{lower}-{upper - 1}" if upper else f"{lower}+"
+
+
+def iter_chunks(vectorstore, where=None, page_size=PAGE_SIZE, include=("documents", "metadatas")):
+    """Yield (id, document, metadata) for matching chunks, fetched `page_size` at a time.
+
+    The `where` filter runs in the store, so only matching pages are ever loaded.
+    """
+    stores = vectorstore.stores_for(where) if isinstance(vectorstore, PartitionedVectorStore) else [vectorstore]
+    for store in stores:
+        offset = 0
+        while True:
+            page = store.get(where=where or None, limit=page_size, offset=offset, include=list(include))
+            if not page["ids"]:
+                break
+            documents = page["documents"] or [None] * len(page["ids"])
+            metadatas = page["metadatas"] or [None] * len(page["ids"])
+            yield from zip(page["ids"], documents, metadatas)
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+
+
+class IndexStats:
+    """Running chunk counts per (state, year, section) and length histograms per (state, year).
+
+    Ingest updates it as chunks are written and deleted, so summaries never
+    need a scan. `rebuild()` recounts from the index in pages when the
+    sidecar is missing or suspect.
+    """
+
+    def __init__(self, cells=None, lengths=None):
+        self.cells = Counter(cells or {})      # "state|year|section" -> chunks
+        self.lengths = {k: Counter(v) for k, v in (lengths or {}).items()}  # "state|year" -> {bin: chunks}
+
+    @staticmethod
+    def path(db_path):
+        return os.path.join(db_path, STATS_NAME)
+
+    @classmethod
+    def load(cls, db_path):
+        """The sidecar under `db_path`, or None when there is none."""
+        if not os.path.exists(cls.path(db_path)):
+            return None
+        with open(cls.path(db_path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["cells"], data["lengths"])
+
+    def save(self, db_path):
+        os.makedirs(db_path, exist_ok=True)
+        tmp_path = self.path(db_path) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"cells": {k: v for k, v in self.cells.items() if v > 0},
+                       "lengths": {k: {b: n for b, n in h.items() if n > 0} for k, h in self.lengths.items()}},
+                      f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path(db_path))
+
+    def _update(self, texts, metadatas, sign):
+        for text, metadata in zip(texts, metadatas):
+            scope = f"{metadata.get('state')}|{metadata.get('year')}"
+            self.cells[f"{scope}|{section_of(text)}"] += sign
+            self.lengths.setdefault(scope, Counter())[length_bin(len(text))] += sign
+
+    def add(self, texts, metadatas):
+        self._update(texts, metadatas, 1)
+
+    def remove(self, texts, metadatas):
+        self._update(texts, metadatas, -1)
+
+    def drop(self, state, year=None):
+        """Forget every chunk of `state` (and `year`): a dropped partition, without a scan."""
+        def matches(key):
+            parts = key.split("|")
+            return parts[0] == str(state) and (year is None or parts[1] == str(year))
+
+        for key in [k for k in self.cells if matches(k)]:
+            del self.cells[key]
+        for key in [k for k in self.lengths if matches(k)]:
+            del self.lengths[key]
+
+    @classmethod
+    def rebuild(cls, vectorstore, page_size=PAGE_SIZE):
+        stats = cls()
+        for _, text, metadata in iter_chunks(vectorstore, page_size=page_size):
+            stats.add([text], [metadata])
+        return stats
+
+    @property
+    def total(self):
+        return sum(n for n in self.cells.values() if n > 0)
+
+    def counts(self, *fields, state=None, year=None):
+        """Chunk counts grouped by any of "state", "year", "section", optionally within one state/year."""
+        grouped = Counter()
+        for key, n in self.cells.items():
+            row = dict(zip(("state", "year", "section"), key.split("|")))
+            if n <= 0 or (state is not None and row["state"] != str(state)) or (
+                    year is not None and row["year"] != str(year)):
+                continue
+            grouped[tuple(row[f] for f in fields)] += n
+        return dict(sorted(grouped.items()))
+
+    def histogram(self, state=None, year=None):
+        merged = Counter()
+        for key, hist in self.lengths.items():
+            key_state, key_year = key.split("|")
+            if (state is None or key_state == str(state)) and (year is None or key_year == str(year)):
+                merged.update({b: n for b, n in hist.items() if n > 0})
+        return {b: merged[b] for b in map(length_bin, LENGTH_BINS) if merged[b]}
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import warnings
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core._api import LangChainBetaWarning
+from deepeval.models import DeepEvalBaseLLM
+
+CACHE_PATH = os.getenv("JUDGE_CACHE_PATH", "data/.judge_cache.sqlite")
+TTL_SECONDS = float(os.getenv("JUDGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("JUDGE_CACHE_MAX_ENTRIES", "100000"))
+# Set JUDGE_CACHE_BYPASS=1 to force fresh judge calls (e.g. after a prompt change upstream)
+BYPASS = os.getenv("JUDGE_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+JUDGE_MODEL = "gpt-4o-mini"
+
+
+class JudgeCache(BaseCache):
+    """Persistent LangChain LLM cache for the DeepEval and RAGAS judges.
+
+    Keys hash the serialized model + call parameters (LangChain's llm_string)
+    together with the prompt, so a temperature-0 judge answering the same
+    question/answer/context triple is only paid for once. Rows expire after
+    `ttl_seconds`, and the least recently used rows go once the store holds
+    more than `max_entries`.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES, bypass=BYPASS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        if self.bypass:
+            return None
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", LangChainBetaWarning)
+            return [loads(gen) for gen in json.loads(row[0])]
+
+    def update(self, prompt, llm_string, return_val):
+        if self.bypass:
+            return
+        key = self._key(prompt, llm_string)
+        value = json.dumps([dumps(gen) for gen in return_val])
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                    (max(0, count - int(self.max_entries * 0.9)),),
+                )
+            self._conn.commit()
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class DeepEvalJudge(DeepEvalBaseLLM):
+    """Routes DeepEval metrics through a (cached) LangChain chat model."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        super().__init__(model=llm.model_name)
+
+    def load_model(self):
+        return self.llm
+
+    # No `schema` kwarg on purpose: DeepEval then falls back to parsing the JSON text
+    def generate(self, prompt: str) -> str:
+        return self.llm.invoke(prompt).content
+
+    async def a_generate(self, prompt: str) -> str:
+        return (await self.llm.ainvoke(prompt)).content
+
+    def get_model_name(self):
+        return self.llm.model_name
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_judge_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = JudgeCache()
+        return _cache
+
+
+def get_judge_llm(model=JUDGE_MODEL, temperature=0, use_cache=True, priority=None, **kwargs):
+    """ChatOpenAI for LLM-as-a-judge calls, backed by the shared JudgeCache and request scheduler."""
+    from langchain_openai import ChatOpenAI
+    from src.scheduler import openai_clients
+
+    # cache=False explicitly opts this client out of any LangChain caching
+    cache = get_judge_cache() if use_cache else False
+    return ChatOpenAI(model=model, temperature=temperature, cache=cache, **openai_clients(priority), **kwargs)
+
+
+def get_deepeval_judge(model=JUDGE_MODEL, use_cache=True, priority=None):
+    return DeepEvalJudge(get_judge_llm(model=model, use_cache=use_cache, priority=priority))
@@ -0,0 +1,633 @@
+import os
+import json
+import uuid
+import shutil
+import weakref
+import tempfile
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# Metadata keys stored as dense columns: filters on them are pure boolean-mask ops
+STRING_COLUMNS = ("state", "source")
+INT_COLUMNS = ("year",)
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+# Rows scored per matmul on a full (unfiltered) scan; bounds peak memory on big indexes
+BLOCK_ROWS = 262144
+# Rows a pending-write file is first sized for; it doubles whenever it fills up
+MIN_CAPACITY = 1024
+
+
+class StringColumn:
+    # Variable-length UTF-8 strings as one byte blob + int64 offsets, both memory-mapped
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, directory, name):
+        offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(directory, f"{name}.bin")
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.zeros(0, np.uint8)
+        return cls(blob, offsets)
+
+    @staticmethod
+    def save(directory, name, values):
+        encoded = [v.encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
+
+
+class StringColumnWriter:
+    """Appends strings to a StringColumn file one at a time; only the offsets stay in memory."""
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self._file = open(os.path.join(directory, f"{name}.bin"), "wb")
+        self._offsets = [0]
+
+    def append(self, value):
+        encoded = value.encode("utf-8")
+        self._file.write(encoded)
+        self._offsets.append(self._offsets[-1] + len(encoded))
+
+    def close(self):
+        self._file.close()
+        np.save(os.path.join(self.directory, f"{self.name}.offsets.npy"), np.asarray(self._offsets, dtype=np.int64))
+
+
+class GrowableArray:
+    """A file-backed array that rows are appended to in place.
+
+    When full, the file is extended (never rewritten) and re-mapped with twice
+    the capacity. Appending N rows in batches therefore copies each row once,
+    and no more than one block has to sit in RAM at a time.
+    """
+
+    def __init__(self, path, dtype, row_shape=()):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.n = 0
+        self._buf = None
+        open(path, "wb").close()
+
+    @property
+    def capacity(self):
+        return 0 if self._buf is None else len(self._buf)
+
+    def _reserve(self, rows):
+        if rows <= self.capacity:
+            return
+        capacity = max(rows, 2 * self.capacity, MIN_CAPACITY)
+        row_bytes = self.dtype.itemsize * int(np.prod(self.row_shape, dtype=np.int64))
+        if self._buf is not None:
+            self._buf.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * row_bytes)
+        self._buf = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity,) + self.row_shape)
+
+    def extend(self, rows):
+        # `rows` may itself be memory-mapped (the persisted index): copied a block at a time
+        self._reserve(self.n + len(rows))
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = np.asarray(rows[start:start + BLOCK_ROWS], dtype=self.dtype)
+            self._buf[self.n:self.n + len(block)] = block
+            self.n += len(block)
+
+    def compact(self, keep):
+        # Kept rows slide down in place; row i of the result comes from a row >= i, so no
+        # block overwrites rows a later block still has to read
+        rows = np.flatnonzero(keep)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            self._buf[start:start + len(block)] = self._buf[block]
+        self.n = len(rows)
+
+    def view(self):
+        if self._buf is None:
+            return np.zeros((0,) + self.row_shape, dtype=self.dtype)
+        return self._buf[:self.n]
+
+
+class GrowableStrings:
+    """StringColumn counterpart for pending writes: an append-only blob plus (start, end) per row.
+
+    Deletes only drop spans; the dead bytes are left behind until `persist()`
+    writes the live rows out.
+    """
+
+    def __init__(self, directory, name):
+        self._blob = GrowableArray(os.path.join(directory, f"{name}.bin"), np.uint8)
+        self._spans = GrowableArray(os.path.join(directory, f"{name}.spans"), np.int64, (2,))
+
+    def extend(self, values):
+        encoded = [v.encode("utf-8") for v in values]
+        ends = self._blob.n + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        self._blob.extend(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self._spans.extend(np.stack([ends - [len(b) for b in encoded], ends], axis=1).reshape(-1, 2))
+
+    def extend_from(self, column):
+        # Bytes and offsets of a persisted StringColumn, a block at a time
+        base = self._blob.n
+        self._blob.extend(column.blob)
+        for start in range(0, len(column), BLOCK_ROWS):
+            offsets = np.asarray(column.offsets[start:start + BLOCK_ROWS + 1], dtype=np.int64) + base
+            self._spans.extend(np.stack([offsets[:-1], offsets[1:]], axis=1))
+
+    def compact(self, keep):
+        self._spans.compact(keep)
+
+    def __len__(self):
+        return self._spans.n
+
+    def __getitem__(self, i):
+        start, end = self._spans.view()[i]
+        return bytes(self._blob.view()[start:end]).decode("utf-8")
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
+
+
+def _save_strings(directory, name, column):
+    # Streams any string column (list, StringColumn, GrowableStrings) row by row
+    writer = StringColumnWriter(directory, name)
+    try:
+        for i in range(len(column)):
+            writer.append(column[i])
+    finally:
+        writer.close()
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _quantize(vectors, dtype):
+    # vectors are L2-normalized float32; int8 keeps one float32 scale per row
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+    return vectors.astype(dtype), None
+
+
+FILTER_OPS = {
+    "$eq": lambda c, v: c == v, "$ne": lambda c, v: c != v,
+    "$gt": lambda c, v: c > v, "$gte": lambda c, v: c >= v,
+    "$lt": lambda c, v: c < v, "$lte": lambda c, v: c <= v,
+    "$in": lambda c, v: np.isin(c, list(v)), "$nin": lambda c, v: ~np.isin(c, list(v)),
+}
+
+
+def compare(column, op, value):
+    if op not in FILTER_OPS:
+        raise ValueError(f"Unsupported filter operator {op}")
+    return np.asarray(FILTER_OPS[op](column, value), dtype=bool)
+
+
+def where_mask(where, column_mask, n_rows):
+    """Boolean row mask for a Chroma-style `where` clause (None = all rows).
+
+    `column_mask(key, op, value)` evaluates one leaf condition such as
+    ("year", "$gte", 2023) to a mask over all rows.
+    """
+    if not where:
+        return None
+    mask = np.ones(n_rows, dtype=bool)
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                mask &= where_mask(clause, column_mask, n_rows)
+        elif key == "$or":
+            mask &= np.logical_or.reduce([where_mask(clause, column_mask, n_rows) for clause in condition])
+        elif isinstance(condition, dict):
+            for op, value in condition.items():
+                mask &= column_mask(key, op, value)
+        else:
+            mask &= column_mask(key, "$eq", condition)
+    return mask
+
+
+def mmr_select(query_vectors, candidate_vectors, k, lambda_mult=0.5, valid=None):
+    """Vectorized maximal marginal relevance for a batch of queries.
+
+    query_vectors: (Q, D), candidate_vectors: (Q, F, D), both L2-normalized.
+    `valid` (Q, F) masks padding candidates. Returns a (Q, k) array of
+    candidate positions, -1 where fewer than k valid candidates exist.
+    """
+    n_queries, n_candidates = candidate_vectors.shape[:2]
+    if valid is None:
+        valid = np.ones((n_queries, n_candidates), dtype=bool)
+    relevance = np.einsum("qfd,qd->qf", candidate_vectors, query_vectors)
+    redundancy = np.einsum("qfd,qgd->qfg", candidate_vectors, candidate_vectors)
+
+    rows = np.arange(n_queries)
+    selected = np.full((n_queries, k), -1, dtype=np.int64)
+    available = valid.copy()
+    max_sim = np.full((n_queries, n_candidates), -np.inf, dtype=np.float32)
+    for step in range(min(k, n_candidates)):
+        # First pick is pure relevance; then trade relevance against redundancy
+        score = relevance if step == 0 else lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        score = np.where(available, score, -np.inf)
+        best = score.argmax(axis=1)
+        has_pick = available[rows, best]
+        selected[:, step] = np.where(has_pick, best, -1)
+        available[rows, best] = False
+        max_sim = np.maximum(max_sim, redundancy[rows, best])
+    return selected
+
+
+class NumpyVectorStore(VectorStore):
+    """LangChain vector store over a memory-mapped embedding matrix.
+
+    Embeddings are L2-normalized and stored as float32, float16 or int8
+    (per-row scale); `state`, `year` and `source` live in columnar arrays, so
+    Chroma-style `where` filters become boolean masks before any scoring.
+    Scores are cosine similarities (higher is closer), not Chroma distances.
+
+    Writes go to file-backed arrays in a scratch directory next to the index
+    (see GrowableArray) and only reach the index on `persist()`: ingesting
+    millions of rows in batches never copies or loads the whole matrix per batch.
+    """
+
+    def __init__(self, embedding_function, persist_directory=None, dtype="float32"):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}, got {dtype!r}")
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.dtype = dtype
+        self._reset()
+
+    def _reset(self):
+        self._close_pending()
+        self._vectors = None  # (N, D) in self.dtype
+        self._scales = None   # (N,) float32, int8 only
+        self._codes = {name: np.zeros(0, dtype=np.int32) for name in STRING_COLUMNS}
+        self._vocab = {name: [] for name in STRING_COLUMNS}
+        self._ints = {name: np.zeros(0, dtype=np.int64) for name in INT_COLUMNS}
+        self._ids = []
+        self._texts = []
+        self._metadatas = []  # JSON strings, like the persisted column
+        self._id_index = None
+
+    # --- LOAD / PERSIST ---
+    @classmethod
+    def load(cls, persist_directory, embedding_function=None, dtype="float32"):
+        store = cls(embedding_function, persist_directory=persist_directory, dtype=dtype)
+        if os.path.exists(os.path.join(persist_directory, "meta.json")):
+            store._open(persist_directory)
+        return store  # else empty; the first persist() creates the directory
+
+    def _open(self, directory):
+        # Every column memory-mapped straight from the persisted index
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dtype = meta["dtype"]
+        self._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        if self.dtype == "int8":
+            self._scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r")
+        for name in STRING_COLUMNS:
+            self._codes[name] = np.load(os.path.join(directory, f"{name}.codes.npy"), mmap_mode="r")
+            self._vocab[name] = meta["vocab"][name]
+        for name in INT_COLUMNS:
+            self._ints[name] = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        self._ids = StringColumn.load(directory, "ids")
+        self._texts = StringColumn.load(directory, "texts")
+        self._metadatas = StringColumn.load(directory, "metadatas")
+        self._id_index = None
+
+    def _open_pending(self):
+        """Move the columns into growable scratch files before the first write (copied once)."""
+        if getattr(self, "_pending", None) is not None:
+            return
+        parent = os.path.dirname(os.path.abspath(self.persist_directory)) if self.persist_directory else None
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        label = os.path.basename(self.persist_directory.rstrip("/\\")) if self.persist_directory else "numpy_store"
+        scratch = tempfile.mkdtemp(prefix=f".{label}.pending-", dir=parent)
+        self._scratch_cleanup = weakref.finalize(self, shutil.rmtree, scratch, True)
+        pending = {"dir": scratch}
+        for name in STRING_COLUMNS:
+            pending[f"codes_{name}"] = GrowableArray(os.path.join(scratch, f"{name}.codes"), np.int32)
+            pending[f"codes_{name}"].extend(self._codes[name])
+        for name in INT_COLUMNS:
+            pending[f"ints_{name}"] = GrowableArray(os.path.join(scratch, f"{name}.ints"), np.int64)
+            pending[f"ints_{name}"].extend(self._ints[name])
+        for name in ("ids", "texts", "metadatas"):
+            pending[name] = GrowableStrings(scratch, name)
+            column = getattr(self, f"_{name}")
+            if isinstance(column, StringColumn):
+                pending[name].extend_from(column)
+        self._pending = pending
+        if self._vectors is not None and len(self._vectors):
+            self._pending_vectors(self._vectors.shape[1])
+            pending["vectors"].extend(self._vectors)
+            if self._scales is not None:
+                pending["scales"].extend(self._scales)
+        self._sync()
+
+    def _pending_vectors(self, dim):
+        scratch = self._pending["dir"]
+        self._pending["vectors"] = GrowableArray(os.path.join(scratch, "vectors"), self.dtype, (dim,))
+        if self.dtype == "int8":
+            self._pending["scales"] = GrowableArray(os.path.join(scratch, "scales"), np.float32)
+
+    def _sync(self):
+        # The read path works on plain array views of the scratch files
+        pending = self._pending
+        self._vectors = pending["vectors"].view() if "vectors" in pending else None
+        self._scales = pending["scales"].view() if "scales" in pending else None
+        self._codes = {name: pending[f"codes_{name}"].view() for name in STRING_COLUMNS}
+        self._ints = {name: pending[f"ints_{name}"].view() for name in INT_COLUMNS}
+        self._ids, self._texts, self._metadatas = pending["ids"], pending["texts"], pending["metadatas"]
+
+    def _close_pending(self):
+        if getattr(self, "_pending", None) is not None:
+            self._scratch_cleanup()
+        self._pending = None
+
+    def persist(self, persist_directory=None):
+        directory = persist_directory or self.persist_directory
+        if directory is None:
+            raise ValueError("No persist_directory given.")
+
+        # Build next to the live index, then swap, so readers never see a torn write.
+        # Every column is streamed out of its (memory-mapped) file, never loaded whole.
+        staging = directory.rstrip("/\\") + ".staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        dim = 0 if self._vectors is None else int(self._vectors.shape[1])
+        vectors = self._vectors if self._vectors is not None else np.zeros((0, 0), dtype=self.dtype)
+        np.save(os.path.join(staging, "vectors.npy"), vectors)
+        if self.dtype == "int8":
+            np.save(os.path.join(staging, "scales.npy"),
+                    self._scales if self._scales is not None else np.zeros(0, np.float32))
+        for name in STRING_COLUMNS:
+            np.save(os.path.join(staging, f"{name}.codes.npy"), self._codes[name])
+        for name in INT_COLUMNS:
+            np.save(os.path.join(staging, f"{name}.npy"), self._ints[name])
+        for name in ("ids", "texts", "metadatas"):
+            _save_strings(staging, name, getattr(self, f"_{name}"))
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "dim": dim, "count": len(self._ids), "vocab": self._vocab}, f)
+
+        # Carry over anything else kept in the index directory (e.g. the ingest manifest)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if not os.path.exists(os.path.join(staging, name)):
+                    shutil.move(os.path.join(directory, name), os.path.join(staging, name))
+            retired = directory.rstrip("/\\") + ".retired"
+            shutil.rmtree(retired, ignore_errors=True)
+            os.replace(directory, retired)
+            os.replace(staging, directory)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.replace(staging, directory)
+        # From here on the store reads the index it just wrote; the scratch files go
+        self._close_pending()
+        self._open(directory)
+
+    # --- WRITE PATH ---
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def vector_nbytes(self):
+        """Stored bytes per row: the (quantized) vector plus its int8 scale."""
+        if self._vectors is None or len(self._vectors) == 0:
+            return 0
+        return self._vectors.shape[1] * self._vectors.dtype.itemsize + (4 if self._scales is not None else 0)
+
+    def _code_for(self, name, value, create=False):
+        vocab = self._vocab[name]
+        value = "" if value is None else str(value)
+        try:
+            return vocab.index(value)
+        except ValueError:
+            if not create:
+                return -1
+            vocab.append(value)
+            return len(vocab) - 1
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        if not texts:
+            return []
+        self._open_pending()
+        # Upsert semantics (like Chroma): existing ids are replaced
+        self.delete(ids=[i for i in ids if i in self._get_id_index()])
+
+        pending = self._pending
+        vectors, scales = _quantize(_normalize(embeddings), self.dtype)
+        if "vectors" not in pending:
+            self._pending_vectors(vectors.shape[1])
+        pending["vectors"].extend(vectors)
+        if scales is not None:
+            pending["scales"].extend(scales)
+        for name in STRING_COLUMNS:
+            pending[f"codes_{name}"].extend([self._code_for(name, m.get(name), create=True) for m in metadatas])
+        for name in INT_COLUMNS:
+            pending[f"ints_{name}"].extend([int(m.get(name, -1)) for m in metadatas])
+
+        index = self._get_id_index()
+        start = len(self._ids)
+        pending["ids"].extend(ids)
+        pending["texts"].extend(texts)
+        pending["metadatas"].extend([json.dumps(m) for m in metadatas])
+        self._sync()
+        for offset, doc_id in enumerate(ids):
+            index[doc_id] = start + offset
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def _get_id_index(self):
+        if self._id_index is None:
+            ids = self._ids if isinstance(self._ids, list) else self._ids.tolist()
+            self._id_index = {doc_id: row for row, doc_id in enumerate(ids)}
+        return self._id_index
+
+    def delete(self, ids=None, **kwargs):
+        if ids is None:
+            self._reset()
+            return True
+        index = self._get_id_index()
+        drop = {index[i] for i in ids if i in index}
+        if not drop:
+            return True
+        self._open_pending()
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[list(drop)] = False
+        # Compacted in place in the scratch files
+        for name, column in self._pending.items():
+            if name != "dir":
+                column.compact(keep)
+        self._sync()
+        self._id_index = None
+        return True
+
+    def delete_collection(self):
+        # Like Chroma, dropping the collection also drops it from disk
+        self.delete()
+        if self.persist_directory:
+            shutil.rmtree(self.persist_directory, ignore_errors=True)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory=None, dtype="float32", **kwargs):
+        store = cls(embedding, persist_directory=persist_directory, dtype=dtype)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        if persist_directory:
+            store.persist()
+        return store
+
+    # --- FILTERS ---
+    def _column_mask(self, key, op, value):
+        if key in STRING_COLUMNS:
+            codes = self._codes[key]
+            if op in ("$in", "$nin"):
+                mask = np.isin(codes, [self._code_for(key, v) for v in value])
+                return ~mask if op == "$nin" else mask
+            if op in ("$eq", "$ne"):
+                mask = codes == self._code_for(key, value)
+                return ~mask if op == "$ne" else mask
+            raise ValueError(f"Operator {op} is not supported on string column {key!r}")
+
+        if key in INT_COLUMNS:
+            column = self._ints[key]
+        else:
+            # Non-columnar metadata: evaluated row by row (slow path)
+            column = np.array([self._metadata(i).get(key) for i in range(len(self))], dtype=object)
+        return compare(column, op, value)
+
+    def _mask(self, where):
+        """Boolean row mask for a Chroma-style `where` clause (None = all rows)."""
+        return where_mask(where, self._column_mask, len(self))
+
+    # --- READ PATH ---
+    def _metadata(self, row):
+        meta = self._metadatas[row]
+        return meta if isinstance(meta, dict) else json.loads(meta)
+
+    def _document(self, row):
+        return Document(page_content=self._texts[row], metadata=self._metadata(row), id=self._ids[row])
+
+    def _dense(self, rows):
+        # Dequantized float32 vectors for the given row indices
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= np.asarray(self._scales[rows], dtype=np.float32)[:, None]
+        return block
+
+    def _top_k(self, query_vectors, k, where=None):
+        """Batched exact top-k. Returns (rows, scores), both (Q, k'), best first."""
+        n_queries = len(query_vectors)
+        if len(self) == 0:
+            return np.zeros((n_queries, 0), dtype=np.int64), np.zeros((n_queries, 0), dtype=np.float32)
+
+        mask = self._mask(where)
+        candidates = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        best_rows, best_scores = [], []
+        for start in range(0, len(candidates), BLOCK_ROWS):
+            rows = candidates[start:start + BLOCK_ROWS]
+            scores = query_vectors @ self._dense(rows).T  # (Q, B)
+            take = min(k, len(rows))
+            part = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_rows.append(rows[part])
+            best_scores.append(np.take_along_axis(scores, part, axis=1))
+        if not best_rows:
+            return np.zeros((n_queries, 0), dtype=np.int64), np.zeros((n_queries, 0), dtype=np.float32)
+
+        rows = np.concatenate(best_rows, axis=1)
+        scores = np.concatenate(best_scores, axis=1)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def batch_similarity_search_with_score_by_vector(self, embeddings, k=4, filter=None):
+        rows, scores = self._top_k(_normalize(embeddings), k, filter)
+        return [
+            [(self._document(r), float(s)) for r, s in zip(row_set, score_set)]
+            for row_set, score_set in zip(rows, scores)
+        ]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return self.batch_similarity_search_with_score_by_vector([embedding], k, filter)[0]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def batch_max_marginal_relevance_search_by_vector(
+        self, embeddings, k=4, fetch_k=20, lambda_mult=0.5, filter=None
+    ):
+        query_vectors = _normalize(embeddings)
+        rows, _ = self._top_k(query_vectors, fetch_k, filter)
+        if rows.shape[1] == 0:
+            return [[] for _ in range(len(query_vectors))]
+        candidates = self._dense(rows.reshape(-1)).reshape(rows.shape[0], rows.shape[1], -1)
+        picks = mmr_select(query_vectors, candidates, k, lambda_mult)
+        return [
+            [self._document(row_set[p]) for p in pick_set if p >= 0]
+            for row_set, pick_set in zip(rows, picks)
+        ]
+
+    def max_marginal_relevance_search_by_vector(
+        self, embedding, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs
+    ):
+        return self.batch_max_marginal_relevance_search_by_vector([embedding], k, fetch_k, lambda_mult, filter)[0]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """Chroma-compatible `get`: {"ids", "documents", "metadatas"} for matching rows."""
+        if ids is not None:
+            index = self._get_id_index()
+            rows = np.asarray([index[i] for i in ids if i in index], dtype=np.int64)
+            mask = self._mask(where)
+            if mask is not None:
+                rows = rows[mask[rows]]
+        else:
+            mask = self._mask(where)
+            rows = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        start = offset or 0
+        rows = rows[start:start + limit] if limit is not None else rows[start:]
+        return {
+            "ids": [self._ids[r] for r in rows],
+            "documents": [self._texts[r] for r in rows] if "documents" in include else None,
+            "metadatas": [self._metadata(r) for r in rows] if "metadatas" in include else None,
+        }
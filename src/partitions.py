@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from src.numpy_store import compare, where_mask, mmr_select
+
+# Metadata fields each partition scheme shards on
+PARTITION_SCHEMES = {"state": ("state",), "state_year": ("state", "year")}
+LAYOUT_NAME = "partitions.json"
+# Partitions searched concurrently for one unfiltered (or multi-partition) query
+FANOUT_WORKERS = int(os.getenv("PARTITION_FANOUT_WORKERS", "8"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _fanout_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="partition-search")
+        return _pool
+
+
+def partition_values(metadata, scheme):
+    return [metadata.get(field) for field in PARTITION_SCHEMES[scheme]]
+
+
+def partition_key(metadata, scheme):
+    # {"state": "Texas", "year": 2024} -> "Texas|2024" (state_year) or "Texas" (state)
+    return "|".join(str(v) for v in partition_values(metadata, scheme))
+
+
+def collection_name(key):
+    # Chroma names: 3-63 chars of [a-z0-9_-], starting and ending alphanumeric
+    return ("part_" + re.sub(r"[^a-z0-9]+", "_", key.lower()).strip("_"))[:63].rstrip("_")
+
+
+def load_layout(persist_directory):
+    path = os.path.join(persist_directory, LAYOUT_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def open_chroma(persist_directory, embedding_function):
+    """The index under `persist_directory`: partitioned if ingest wrote a layout, else one collection."""
+    if load_layout(persist_directory) is not None:
+        return PartitionedVectorStore.open(persist_directory, embedding_function)
+    return Chroma(persist_directory=persist_directory, embedding_function=embedding_function)
+
+
+def _distance_key(candidate):
+    return candidate[0]
+
+
+def query_collection(collection, vectors, n_results, where=None):
+    """One Chroma query for several vectors: a (distance, Document, embedding) list per vector."""
+    count = collection.count()
+    if count == 0:
+        return [[] for _ in vectors]
+    result = collection.query(
+        query_embeddings=[list(v) for v in vectors], n_results=min(n_results, count), where=where or None,
+        include=["documents", "metadatas", "distances", "embeddings"]
+    )
+    return [
+        [(distance, Document(page_content=text, metadata=meta or {}, id=doc_id), embedding)
+         for doc_id, text, meta, distance, embedding in zip(ids, texts, metas, distances, embeddings)]
+        for ids, texts, metas, distances, embeddings in zip(
+            result["ids"], result["documents"], result["metadatas"], result["distances"], result["embeddings"]
+        )
+    ]
+
+
+def mmr_candidates(embedding, candidates, k, lambda_mult):
+    """MMR over (distance, Document, embedding) candidates, on normalized vectors."""
+    if not candidates:
+        return []
+    vectors = np.asarray([c[2] for c in candidates], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(embedding, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+    picks = mmr_select(query[None, :], vectors[None, :, :], k, lambda_mult)[0]
+    return [candidates[p][1] for p in picks if p >= 0]
+
+
+class PartitionedVectorStore(VectorStore):
+    """One Chroma collection per state or (state, year), behind a single vector store.
+
+    Writes are routed by each document's metadata. A search only goes to the
+    partitions its `where` filter can match; unfiltered queries fan out to all
+    of them in parallel. Per-partition candidates are merged on distance before
+    MMR, so results match what one big collection would return. Because the
+    routing lives in the store, every retriever built on it routes too.
+    """
+
+    def __init__(self, persist_directory, embedding_function, scheme, partitions=None):
+        if scheme not in PARTITION_SCHEMES:
+            raise ValueError(f"scheme must be one of {sorted(PARTITION_SCHEMES)}, got {scheme!r}")
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.scheme = scheme
+        self.partitions = dict(partitions or {})  # key -> {"collection", "values"}
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, persist_directory, embedding_function, scheme=None):
+        layout = load_layout(persist_directory)
+        if layout is not None and scheme not in (None, layout["scheme"]):
+            raise ValueError(f"{persist_directory} is partitioned by {layout['scheme']!r}, not {scheme!r}")
+        if layout is None:
+            store = cls(persist_directory, embedding_function, scheme)
+            store._save_layout()  # an empty partitioned index is still recognised as one
+            return store
+        return cls(persist_directory, embedding_function, layout["scheme"], layout["partitions"])
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def _save_layout(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        path = os.path.join(self.persist_directory, LAYOUT_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"scheme": self.scheme, "partitions": self.partitions}, f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def _store(self, key):
+        with self._lock:
+            if key not in self._stores:
+                self._stores[key] = Chroma(
+                    collection_name=self.partitions[key]["collection"],
+                    persist_directory=self.persist_directory,
+                    embedding_function=self.embedding_function
+                )
+            return self._stores[key]
+
+    def stores_for(self, where=None):
+        """The per-partition Chroma stores a `where` filter can match."""
+        return [self._store(key) for key in self._route(where)]
+
+    def partition_sizes(self):
+        return {key: self._store(key)._collection.count() for key in sorted(self.partitions)}
+
+    # --- WRITE PATH ---
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        groups = {}
+        for text, metadata, doc_id in zip(texts, metadatas, ids):
+            groups.setdefault(partition_key(metadata, self.scheme), []).append((text, metadata, doc_id))
+        new_keys = [key for key in groups if key not in self.partitions]
+        for key in new_keys:
+            name = collection_name(key)
+            if any(p["collection"] == name for p in self.partitions.values()):
+                # "New York" and "new-york" slug alike
+                name = f"{name[:54]}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+            values = partition_values(groups[key][0][1], self.scheme)
+            self.partitions[key] = {"collection": name, "values": values}
+        if new_keys:
+            self._save_layout()
+
+        for key, rows in groups.items():
+            self._store(key).add_texts([r[0] for r in rows], [r[1] for r in rows], ids=[r[2] for r in rows])
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        # Ids don't say which partition they live in, so each one is asked which it holds
+        for key in self.partitions:
+            present = self._store(key).get(ids=ids, include=[])["ids"] if ids is not None else None
+            if present is None or present:
+                self._store(key).delete(ids=present)
+
+    def drop_partition(self, key):
+        """Delete one partition so it can be rebuilt on its own."""
+        if key not in self.partitions:
+            return False
+        self._store(key).delete_collection()
+        with self._lock:
+            self._stores.pop(key, None)
+        del self.partitions[key]
+        self._save_layout()
+        return True
+
+    def delete_collection(self):
+        for key in list(self.partitions):
+            self.drop_partition(key)
+        layout = os.path.join(self.persist_directory, LAYOUT_NAME)
+        if os.path.exists(layout):
+            os.remove(layout)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """Chroma-compatible `get` across the partitions `where` can match."""
+        merged = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        skip, remaining = offset or 0, limit
+        for key in self._route(where):
+            if remaining is not None and remaining <= 0:
+                break
+            store = self._store(key)
+            if skip:
+                # Partitions wholly before the window are skipped by count, never loaded
+                size = (store._collection.count() if ids is None and where is None
+                        else len(store.get(ids=ids, where=where, include=[])["ids"]))
+                if skip >= size:
+                    skip -= size
+                    continue
+            data = store.get(ids=ids, where=where, limit=remaining, offset=skip or None, include=list(include))
+            skip = 0
+            if remaining is not None:
+                remaining -= len(data["ids"])
+            merged["ids"].extend(data["ids"])
+            for field in ("documents", "metadatas", "embeddings"):
+                if field in include:
+                    merged[field].extend(data[field])
+        return {field: (values if field == "ids" or field in include else None) for field, values in merged.items()}
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory=None, scheme="state", **kwargs):
+        store = cls(persist_directory, embedding, scheme)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    # --- ROUTING + SEARCH ---
+    def _route(self, where):
+        keys = sorted(self.partitions)
+        fields = PARTITION_SCHEMES[self.scheme]
+        columns = {field: np.array([self.partitions[k]["values"][i] for k in keys], dtype=object)
+                   for i, field in enumerate(fields)}
+
+        def column_mask(field, op, value):
+            # Conditions on fields the scheme doesn't shard on can't rule a partition out
+            if field not in columns:
+                return np.ones(len(keys), dtype=bool)
+            return compare(columns[field], op, value)
+
+        mask = where_mask(where, column_mask, len(keys))
+        return keys if mask is None else [k for k, keep in zip(keys, mask) if keep]
+
+    def _query_partition(self, key, vectors, n_results, where):
+        return query_collection(self._store(key)._collection, vectors, n_results, where)
+
+    def _batch_candidates(self, vectors, n_results, where):
+        keys = self._route(where)
+        if len(keys) <= 1:
+            results = [self._query_partition(key, vectors, n_results, where) for key in keys]
+        else:
+            results = list(_fanout_pool().map(
+                lambda key: self._query_partition(key, vectors, n_results, where), keys
+            ))
+        # Same embedding space + metric in every partition, so distances are comparable
+        return [
+            sorted((c for partition in results for c in partition[i]), key=_distance_key)[:n_results]
+            for i in range(len(vectors))
+        ]
+
+    def _candidates(self, vector, n_results, where):
+        return self._batch_candidates([vector], n_results, where)[0]
+
+    def batch_similarity_search_with_score_by_vector(self, embeddings, k=4, filter=None):
+        return [[(doc, distance) for distance, doc, _ in candidates]
+                for candidates in self._batch_candidates(embeddings, k, filter)]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [(doc, distance) for distance, doc, _ in self._candidates(embedding, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Chroma's default space is squared L2
+        return self._euclidean_relevance_score_fn
+
+    def batch_max_marginal_relevance_search_by_vector(self, embeddings, k=4, fetch_k=20, lambda_mult=0.5,
+                                                      filter=None):
+        # Each partition is queried once for the whole batch
+        return [mmr_candidates(embedding, candidates, k, lambda_mult)
+                for embedding, candidates in zip(embeddings, self._batch_candidates(embeddings, fetch_k, filter))]
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5,
+                                                filter=None, **kwargs):
+        return mmr_candidates(embedding, self._candidates(embedding, fetch_k, filter), k, lambda_mult)
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
@@ -0,0 +1,13 @@
+# Shared metadata vocabulary for the multi-policy corpus.
+# ingest_multi.py tags chunks with it, and the query side parses user questions with it,
+# so a filter built from a query always matches what is actually stored in Chroma.
+
+VALID_STATES = ["Tennessee", "Washington", "California", "Texas", "New York"]
+VALID_YEARS = [2022, 2023, 2024]
+
+
+def metadata_from_filename(filename):
+    # Filename encodes metadata: e.g., Policy_Tennessee_2024_0.pdf
+    state = next((s for s in VALID_STATES if s in filename), "N/A")
+    year = 2024 if "2024" in filename else (2022 if "2022" in filename else 2023)
+    return state, year
@@ -0,0 +1,103 @@
+import os
+import re
+from src.bm25_index import tokenize, is_exact_token
+
+# Tier-1 thresholds: an answer must clear all of the "grounded" ones, or fail one of the
+# "ungrounded" ones, to skip the LLM judges; everything in between goes to the judges.
+GROUNDED_CONTAINMENT = float(os.getenv("PRESCREEN_GROUNDED_CONTAINMENT", "0.8"))
+GROUNDED_SUPPORT = float(os.getenv("PRESCREEN_GROUNDED_SUPPORT", "0.9"))
+GROUNDED_QUERY_OVERLAP = float(os.getenv("PRESCREEN_GROUNDED_QUERY_OVERLAP", "0.3"))
+UNGROUNDED_SUPPORT = float(os.getenv("PRESCREEN_UNGROUNDED_SUPPORT", "0.35"))
+# ... or this, when the answer also quotes a number/amount/state the context never mentions
+UNGROUNDED_EXACT_SUPPORT = 0.6
+# Answers shorter than this many content words are left to the judges
+MIN_ANSWER_TOKENS = 3
+# Refusals are short; a long answer that says "does not specify" somewhere is still an answer
+MAX_REFUSAL_WORDS = 40
+
+# Only phrasing about the assistant or its sources: "the policy does not include a cap" is a claim
+REFUSAL_PATTERN = re.compile(
+    r"i can only assist with official policy queries"
+    r"|\bI (?:do not|don't|cannot|can't|am unable to) (?:know|find|answer|determine|provide)\b"
+    r"|\b(?:context|documents?|sources?|excerpts?|provided (?:text|information)) (?:does not|doesn't|do not|don't) "
+    r"(?:\w+ ){0,3}(?:mention|contain|specify|cover|address|include)\w*"
+    r"|\bno (?:relevant )?(?:information|mention|details?) (?:about|on|regarding|for|in)\b"
+    r"|\bnot (?:found|available|mentioned|specified) in the (?:provided )?(?:context|documents?|polic\w+)",
+    re.IGNORECASE,
+)
+# A refusal has to refuse in every clause: "...; employees get 45 days PTO" or "..., so overtime is
+# unlimited" is an answer. Coordinating and relative connectors split too, with or without a comma.
+CLAUSE_BREAK = re.compile(
+    r"[.!?;:\n]+\s*"
+    r"|,?\s+\b(?:but|however|although|though|yet|instead|and|or|so|thus|hence|therefore|which|who|where"
+    r"|meaning|means|because|since|while|whereas|then)\b\s*",
+    re.IGNORECASE,
+)
+# "1. ", "- ", "* " list markers would otherwise count as unsupported numbers
+LIST_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+", re.MULTILINE)
+SENTENCE_BREAK = re.compile(r"[.!?:\n]+\s*")
+
+
+def _ngrams(tokens, n=3):
+    return {tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+
+
+def _entities(text):
+    # Capitalised words that don't start a sentence: "Spokane", "Gemini", "GPT-4"
+    entities = set()
+    for sentence in SENTENCE_BREAK.split(text):
+        for word in sentence.split()[1:]:
+            if word[:1].isupper():
+                entities.update(tokenize(word))
+    return entities
+
+
+def _is_refusal(answer, unsupported):
+    # Short, every clause refuses, and nothing (number, amount, name) the context doesn't back up
+    if len(answer.split()) > MAX_REFUSAL_WORDS or unsupported:
+        return False
+    clauses = [c for c in CLAUSE_BREAK.split(answer) if c and tokenize(c)]
+    return bool(clauses) and all(REFUSAL_PATTERN.search(c) for c in clauses)
+
+
+def grounding_signals(query, answer, contexts):
+    """Lexical evidence that `answer` was taken from `contexts`."""
+    answer_text = LIST_MARKER.sub("", answer)
+    answer_tokens = tokenize(answer_text)
+    context_tokens = [tokenize(c) for c in contexts]
+    context_vocab = {t for tokens in context_tokens for t in tokens}
+    # Per chunk, so a trigram never spans two unrelated chunks
+    context_trigrams = set().union(*(_ngrams(tokens) for tokens in context_tokens)) if contexts else set()
+
+    answer_trigrams = _ngrams(answer_tokens)
+    query_terms = set(tokenize(query))
+    answer_vocab = set(answer_tokens)
+    unsupported_exact = sorted({t for t in answer_tokens if is_exact_token(t) and t not in context_vocab})
+    unsupported_entities = sorted(_entities(answer_text) - context_vocab - query_terms)
+    return {
+        "answer_tokens": len(answer_tokens),
+        "support": round(sum(t in context_vocab for t in answer_tokens) / len(answer_tokens), 3) if answer_tokens else 0.0,
+        "containment": round(len(answer_trigrams & context_trigrams) / len(answer_trigrams), 3) if answer_trigrams else 0.0,
+        "unsupported_exact": unsupported_exact,
+        "unsupported_entities": unsupported_entities,
+        "query_overlap": round(len(query_terms & answer_vocab) / len(query_terms), 3) if query_terms else 0.0,
+        "refusal": _is_refusal(answer, unsupported_exact + unsupported_entities),
+    }
+
+
+def prescreen(query, answer, contexts):
+    """Tier-1 decision: "refusal", "grounded", "ungrounded" or "uncertain" (send to the judges)."""
+    signals = grounding_signals(query, answer, contexts)
+    if signals["refusal"]:
+        return "refusal", signals
+    if signals["answer_tokens"] < MIN_ANSWER_TOKENS:
+        return "uncertain", signals
+    if signals["support"] < UNGROUNDED_SUPPORT or (
+            signals["unsupported_exact"] and signals["support"] < UNGROUNDED_EXACT_SUPPORT):
+        return "ungrounded", signals
+    if (not signals["unsupported_exact"] and not signals["unsupported_entities"]
+            and signals["containment"] >= GROUNDED_CONTAINMENT
+            and signals["support"] >= GROUNDED_SUPPORT
+            and signals["query_overlap"] >= GROUNDED_QUERY_OVERLAP):
+        return "grounded", signals
+    return "uncertain", signals
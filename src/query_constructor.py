@@ -0,0 +1,139 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.pydantic_v1 import Field
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from langchain.retrievers.self_query.base import SelfQueryRetriever
+from src.policy_metadata import VALID_STATES, VALID_YEARS
+from src.tracing import stage
+
+# Full names match case-insensitively; postal codes only in upper case ("CA", not "ca")
+STATE_NAMES = {s: re.compile(rf"\b{re.escape(s)}\b", re.IGNORECASE) for s in VALID_STATES}
+STATE_CODES = {"TN": "Tennessee", "WA": "Washington", "CA": "California", "TX": "Texas", "NY": "New York"}
+STATE_CODE_PATTERN = re.compile(r"\b(" + "|".join(STATE_CODES) + r")\b")
+YEAR_PATTERN = re.compile(r"\b(19\d{2}|20\d{2})\b")
+_stats_lock = threading.Lock()
+
+# Phrases that only an LLM can turn into the right filter ("last year", "latest", ...)
+RELATIVE_TIME = re.compile(
+    r"\b(last|this|next|previous|prior|current|coming) year\b|\b(latest|newest|oldest|most recent|current)\b",
+    re.IGNORECASE
+)
+# Comparisons / negations that change what a mentioned state or year means
+COMPARATIVE = re.compile(
+    r"\b(before|after|since|until|prior to|earlier|later|between|except|excluding|other than|"
+    r"outside|besides|not|versus|vs\.?|compare|compared|difference|differ)\b",
+    re.IGNORECASE
+)
+
+
+def extract_metadata_filter(query):
+    """Rule-based query construction for the `state` / `year` attributes.
+
+    Returns (filter, is_ambiguous). `filter` is a Chroma `where` clause or None
+    when the query names no state/year. When the rules cannot be sure what the
+    user meant, `is_ambiguous` is True and the caller should defer to the LLM.
+    """
+    states = {s for s, pattern in STATE_NAMES.items() if pattern.search(query)}
+    states |= {STATE_CODES[code] for code in STATE_CODE_PATTERN.findall(query)}
+    years = {int(y) for y in YEAR_PATTERN.findall(query)}
+
+    if RELATIVE_TIME.search(query):
+        return None, True
+    if len(states) > 1 or len(years) > 1 or (years - set(VALID_YEARS)):
+        return None, True
+    if (states or years) and COMPARATIVE.search(query):
+        return None, True
+
+    clauses = [{"state": {"$eq": s}} for s in states] + [{"year": {"$eq": y}} for y in years]
+    if not clauses:
+        return None, False
+    if len(clauses) == 1:
+        return clauses[0], False
+    return {"$and": clauses}, False
+
+
+class RuleBasedSelfQueryRetriever(BaseRetriever):
+    """Deterministic metadata fast path in front of a SelfQueryRetriever.
+
+    Unambiguous queries ("Tennessee 2024 PTO rules") go straight to the vector
+    store with a rule-built filter, skipping the query-constructor LLM call.
+    Everything else is handed to `fallback` unchanged. A SelfQueryRetriever
+    fallback is driven in two steps so query construction and the search
+    itself show up as separate trace stages. With a `hybrid` retriever
+    (src/bm25_index.py) set, both paths search through it instead of the
+    vector store directly.
+    """
+
+    vectorstore: VectorStore
+    fallback: BaseRetriever
+    search_type: str = "mmr"
+    search_kwargs: Dict[str, Any] = Field(default_factory=dict)
+    hybrid: Optional[Any] = None
+    stats: Dict[str, int] = Field(default_factory=lambda: {"fast_path": 0, "llm_fallback": 0})
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _record(self, key):
+        with _stats_lock:
+            self.stats[key] += 1
+
+    def fast_path_rate(self):
+        total = self.stats["fast_path"] + self.stats["llm_fallback"]
+        return self.stats["fast_path"] / total if total else 0.0
+
+    def _search_kwargs(self, where):
+        kwargs = dict(self.search_kwargs)
+        if where is not None:
+            kwargs["filter"] = where
+        return kwargs
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        where, ambiguous = extract_metadata_filter(query)
+        config = {"callbacks": run_manager.get_child()}
+        if ambiguous:
+            self._record("llm_fallback")
+            if isinstance(self.fallback, SelfQueryRetriever):
+                with stage("query_construction"):
+                    structured_query = self.fallback.query_constructor.invoke({"query": query}, config=config)
+                with stage("retrieval"):
+                    new_query, search_kwargs = self.fallback._prepare_query(query, structured_query)
+                    if self.hybrid is not None:
+                        return self.hybrid.search(new_query, search_kwargs.get("filter"))
+                    return self.fallback._get_docs_with_query(new_query, search_kwargs)
+            with stage("retrieval"):
+                return self.fallback.invoke(query, config=config)
+        self._record("fast_path")
+        with stage("retrieval"):
+            if self.hybrid is not None:
+                return self.hybrid.search(query, where)
+            return self.vectorstore.search(query, self.search_type, **self._search_kwargs(where))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        where, ambiguous = extract_metadata_filter(query)
+        config = {"callbacks": run_manager.get_child()}
+        if ambiguous:
+            self._record("llm_fallback")
+            if isinstance(self.fallback, SelfQueryRetriever):
+                with stage("query_construction"):
+                    structured_query = await self.fallback.query_constructor.ainvoke({"query": query}, config=config)
+                with stage("retrieval"):
+                    new_query, search_kwargs = self.fallback._prepare_query(query, structured_query)
+                    if self.hybrid is not None:
+                        return await self.hybrid.asearch(new_query, search_kwargs.get("filter"))
+                    return await self.fallback._aget_docs_with_query(new_query, search_kwargs)
+            with stage("retrieval"):
+                return await self.fallback.ainvoke(query, config=config)
+        self._record("fast_path")
+        with stage("retrieval"):
+            if self.hybrid is not None:
+                return await self.hybrid.asearch(query, where)
+            return await self.vectorstore.asearch(query, self.search_type, **self._search_kwargs(where))
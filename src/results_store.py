@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import time
+import uuid
+import atexit
+import hashlib
+import threading
+from datetime import datetime, timezone
+import pandas as pd
+
+# Parquet files partitioned as <root>/date=YYYY-MM-DD/run_id=<run>/part-*.parquet
+RESULTS_DIR = os.getenv("EVAL_RESULTS_DIR", "data/eval_results")
+RESULTS_ENABLED = os.getenv("EVAL_RESULTS_DISABLED", "").lower() not in ("1", "true", "yes")
+# Buffered rows are written once there are this many, or the oldest is this old (and at exit)
+FLUSH_ROWS = int(os.getenv("EVAL_RESULTS_FLUSH_ROWS", "1000"))
+FLUSH_SECONDS = float(os.getenv("EVAL_RESULTS_FLUSH_SECONDS", "30"))
+# Record batches scanned at a time by the query API: memory stays bounded by this, not the history
+SCAN_BATCH_ROWS = 65536
+
+METRICS = ("faithfulness", "answer_relevancy", "answer_correctness", "context_precision", "context_recall",
+           "hallucination")
+TEXT_COLUMNS = ("source", "sample_id", "question", "answer", "ground_truth", "security_status", "tier",
+                "llm_model", "judge_model", "embedding_model", "config")
+PARTITION_COLUMNS = ("date", "run_id")
+
+_run_config = {}
+_buffer = []
+_buffer_since = None
+_buffer_lock = threading.Lock()
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [("ts", pa.timestamp("ms", tz="UTC"))]
+        + [(name, pa.string()) for name in TEXT_COLUMNS]
+        + [(name, pa.float64()) for name in METRICS]
+        # latency_ms: wall time of the call that produced the row (a whole batch for run_evaluation)
+        + [("latency_ms", pa.float64()), ("stage_ms", pa.map_(pa.string(), pa.float64()))]
+    )
+
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor="hive")
+
+
+def new_run_id():
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def current_run_id():
+    # EVAL_RUN_ID pins the id (e.g. shared by every run_eval.py shard); otherwise one per process
+    if "EVAL_RUN_ID" not in os.environ:
+        os.environ["EVAL_RUN_ID"] = new_run_id()
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", os.environ["EVAL_RUN_ID"])
+
+
+def set_run_config(**config):
+    """Settings stamped on every row this process records (chunking, models, dataset, ...)."""
+    _run_config.update(config)
+
+
+def sample_key(question, ground_truth=""):
+    # Same id run_eval.sample_id gives a dataset row without an explicit id
+    return hashlib.sha1(f"{question}\x1f{ground_truth or ''}".encode("utf-8")).hexdigest()[:16]
+
+
+def model_name(client):
+    for attr in ("model_name", "model"):
+        value = getattr(client, attr, None)
+        if isinstance(value, str):
+            return value
+    inner = getattr(client, "llm", None)  # DeepEvalJudge wraps a ChatOpenAI
+    return model_name(inner) if inner is not None else None
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value  # NaN (a failed RAGAS job) -> null
+
+
+def record_results(source, rows, latency_ms=None, stage_ms=None, **models):
+    """Buffer one row per result. `models`: llm_model / judge_model / embedding_model overrides."""
+    if not RESULTS_ENABLED or not rows:
+        return
+    global _buffer_since
+    now = datetime.now(timezone.utc)
+    config = {k: v for k, v in _run_config.items() if k not in ("llm_model", "judge_model", "embedding_model")}
+    stamped = []
+    for row in rows:
+        record = {
+            "ts": now, "date": f"{now:%Y-%m-%d}", "run_id": current_run_id(), "source": source,
+            "sample_id": row.get("id") or sample_key(row.get("question", ""), row.get("ground_truth")),
+            "config": json.dumps({**config, **row.get("config", {})}, sort_keys=True, default=str),
+            "latency_ms": latency_ms, "stage_ms": list((stage_ms or {}).items()),
+        }
+        for name in ("question", "answer", "ground_truth", "security_status", "tier"):
+            record[name] = None if row.get(name) is None else str(row[name])
+        for name in ("llm_model", "judge_model", "embedding_model"):
+            record[name] = models.get(name) or _run_config.get(name)
+        for name in METRICS:
+            record[name] = _number(row.get(name))
+        stamped.append(record)
+    with _buffer_lock:
+        _buffer.extend(stamped)
+        _buffer_since = _buffer_since or time.monotonic()
+        due = len(_buffer) >= FLUSH_ROWS or time.monotonic() - _buffer_since >= FLUSH_SECONDS
+    if due:
+        try:
+            flush()
+        except OSError as e:  # a full / read-only disk must not fail the audit that produced the rows
+            print(f"⚠️ Results store flush failed: {e}")
+
+
+def flush(root=None):
+    """Write buffered rows: one Parquet file per (date, run_id) partition."""
+    global _buffer, _buffer_since
+    with _buffer_lock:
+        rows, _buffer, _buffer_since = _buffer, [], None
+    if not rows:
+        return 0
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    root = root or RESULTS_DIR
+    schema = _schema()
+    partitions = {}
+    for row in rows:
+        partitions.setdefault((row["date"], row["run_id"]), []).append(row)
+    for (date, run_id), part in partitions.items():
+        directory = os.path.join(root, f"date={date}", f"run_id={run_id}")
+        os.makedirs(directory, exist_ok=True)
+        table = pa.Table.from_pylist(part, schema=schema)
+        name = f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet"
+        # Written under a dot-name (skipped by dataset discovery), then renamed: readers never see half a file
+        pq.write_table(table, os.path.join(directory, f".{name}.tmp"))
+        os.replace(os.path.join(directory, f".{name}.tmp"), os.path.join(directory, name))
+    return len(rows)
+
+
+atexit.register(flush)
+
+
+# --- QUERIES ---
+def open_results(root=None):
+    """The whole history as a lazily scanned pyarrow dataset (None when nothing was stored yet)."""
+    import pyarrow.dataset as ds
+
+    root = root or RESULTS_DIR
+    if not os.path.isdir(root):
+        return None
+    return ds.dataset(root, format="parquet", schema=_full_schema(), partitioning=_partitioning())
+
+
+def _full_schema():
+    import pyarrow as pa
+
+    return pa.schema(list(_schema()) + [pa.field(name, pa.string()) for name in PARTITION_COLUMNS])
+
+
+def _expression(where):
+    # {"run_id": "x", "source": ["guardrails", ...]} -> pyarrow filter; date/run_id prune whole partitions
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, value in (where or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            clause = ds.field(column).isin(list(value))
+        else:
+            clause = ds.field(column) == value
+        expression = clause if expression is None else expression & clause
+    return expression
+
+
+def _scan(dataset, columns, where):
+    scanner = dataset.scanner(columns=list(columns), filter=_expression(where), batch_size=SCAN_BATCH_ROWS)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch
+
+
+def _partial_sums(dataset, by, metrics, where):
+    """Sums / counts / min / max per group, combined batch by batch: memory is O(groups)."""
+    import pyarrow as pa
+
+    aggregations = [("ts", "count")] + [(m, op) for m in metrics for op in ("sum", "count", "min", "max")]
+    merge = {"ts_count": "sum", **{f"{m}_{op}": ("sum" if op in ("sum", "count") else op)
+                                   for m in metrics for op in ("sum", "count", "min", "max")}}
+    totals = None
+    for batch in _scan(dataset, list(by) + ["ts"] + list(metrics), where):
+        part = pa.Table.from_batches([batch]).group_by(list(by)).aggregate(aggregations).to_pandas()
+        totals = part if totals is None else pd.concat([totals, part])
+        totals = totals.groupby(list(by), as_index=False, dropna=False).agg(merge)
+    return totals
+
+
+def aggregate(metrics=METRICS, by=("run_id",), where=None, root=None):
+    """Mean / min / max / count of each metric per group, streamed over the stored history."""
+    dataset = open_results(root)
+    totals = None if dataset is None else _partial_sums(dataset, by, metrics, where)
+    if totals is None:
+        return pd.DataFrame(columns=list(by) + ["rows"])
+    report = totals[list(by)].copy()
+    report["rows"] = totals["ts_count"]
+    for m in metrics:
+        count = totals[f"{m}_count"]
+        report[f"{m}_mean"] = (totals[f"{m}_sum"] / count).where(count > 0)
+        report[f"{m}_min"] = totals[f"{m}_min"]
+        report[f"{m}_max"] = totals[f"{m}_max"]
+        report[f"{m}_n"] = count
+    return report.sort_values(list(by)).reset_index(drop=True)
+
+
+def list_runs(root=None):
+    """One row per (run, source): when it ran and how many results it stored."""
+    return aggregate(metrics=(), by=("run_id", "date", "source"), root=root)
+
+
+def compare_runs(base, candidate, metrics=("faithfulness", "answer_relevancy", "answer_correctness"),
+                 source=None, threshold=0.0, root=None):
+    """Per-question diff of two runs (only their partitions are read).
+
+    Returns one row per question found in either run with `<metric>_base`,
+    `<metric>_candidate` and `<metric>_delta` (candidate - base), and a
+    `regressed` flag when any metric dropped by more than `threshold`.
+    """
+    dataset = open_results(root)
+    where = {"run_id": [base, candidate], **({"source": source} if source else {})}
+    totals = None if dataset is None else _partial_sums(dataset, ("run_id", "sample_id", "question"), metrics, where)
+    if totals is None:
+        return pd.DataFrame(columns=["sample_id", "question", "regressed"])
+    for m in metrics:
+        totals[m] = (totals[f"{m}_sum"] / totals[f"{m}_count"]).where(totals[f"{m}_count"] > 0)
+    keys = ["sample_id", "question"]
+    runs = {run: totals[totals["run_id"] == run][keys + list(metrics)] for run in (base, candidate)}
+    diff = runs[base].merge(runs[candidate], on=keys, how="outer", suffixes=("_base", "_candidate"))
+    regressed = pd.Series(False, index=diff.index)
+    for m in metrics:
+        diff[f"{m}_delta"] = diff[f"{m}_candidate"] - diff[f"{m}_base"]
+        regressed |= diff[f"{m}_delta"] < -threshold
+    diff["regressed"] = regressed
+    return diff.sort_values(keys).reset_index(drop=True)
@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import httpx
+
+# Priority classes, most urgent first
+INTERACTIVE, EVALUATION, INGEST = "interactive", "evaluation", "ingest"
+PRIORITIES = (INTERACTIVE, EVALUATION, INGEST)
+# Share of each bucket a class may not dip into, so background work leaves headroom for chat
+# and ingest batches only ever fill what the other two leave over
+RESERVE = {INTERACTIVE: 0.0, EVALUATION: 0.1, INGEST: 0.3}
+
+# Requests / tokens per minute per model. Override with
+# OPENAI_RATE_LIMITS="gpt-4o-mini=500:200000,text-embedding-ada-002=3000:1000000"
+DEFAULT_LIMITS = {
+    "gpt-4o-mini": (500, 200_000),
+    "gpt-4o": (500, 30_000),
+    "text-embedding-ada-002": (3_000, 1_000_000),
+    "text-embedding-3-small": (3_000, 1_000_000),
+    "text-embedding-3-large": (3_000, 1_000_000),
+}
+FALLBACK_LIMIT = (500, 200_000)
+SCHEDULER_ENABLED = os.getenv("OPENAI_SCHEDULER_DISABLED", "").lower() not in ("1", "true", "yes")
+
+# Charged up front for a chat call that doesn't set max_tokens
+COMPLETION_TOKEN_ESTIMATE = 512
+POLL_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 60.0
+# AIMD: each 429 halves the usable rate, each success wins back a little of it
+MIN_RATE_FACTOR = 0.1
+RECOVERY_STEP = 0.05
+
+_priority = ContextVar("openai_priority", default=None)
+
+
+@contextmanager
+def request_priority(name):
+    """Run OpenAI calls made in this block (and the threads/tasks it spawns) at `name` priority."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_limits(spec):
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm), int(tpm))
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now, factor):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+
+class ModelLimiter:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.rate_factor = 1.0
+        self.blocked_until = 0.0
+        self.consecutive_429 = 0
+        self.waiting = dict.fromkeys(PRIORITIES, 0)
+        self.stats = {"granted": 0, "throttled_429": 0, "wait_ms": 0.0,
+                      "by_priority": dict.fromkeys(PRIORITIES, 0)}
+
+
+class RequestScheduler:
+    """Process-wide admission control for OpenAI requests.
+
+    Every model gets a requests-per-minute and a tokens-per-minute token
+    bucket. A request waits while a more urgent class is queued for the same
+    model, or while admitting it would dip into that class's reserve. 429s
+    block the model until the server's retry hint (or an exponential backoff
+    with jitter) and halve its usable rate; successes restore it gradually.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = limits or parse_limits(os.getenv("OPENAI_RATE_LIMITS"))
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, model):
+        if model not in self._models:
+            self._models[model] = ModelLimiter(*self.limits.get(model, FALLBACK_LIMIT))
+        return self._models[model]
+
+    def _try_acquire(self, model, tokens, priority):
+        """0 if the request was admitted, else how long to wait before asking again."""
+        with self._lock:
+            limiter = self._limiter(model)
+            now = time.monotonic()
+            limiter.requests.refill(now, limiter.rate_factor)
+            limiter.tokens.refill(now, limiter.rate_factor)
+            if now < limiter.blocked_until:
+                return limiter.blocked_until - now
+            if any(limiter.waiting[p] for p in PRIORITIES[:PRIORITIES.index(priority)]):
+                return POLL_SECONDS
+
+            reserve = RESERVE[priority]
+            # A request bigger than the bucket would otherwise never be admitted
+            tokens = min(tokens, limiter.tokens.capacity * (1.0 - reserve))
+            need_requests = 1 + reserve * limiter.requests.capacity
+            need_tokens = tokens + reserve * limiter.tokens.capacity
+            if limiter.requests.level >= need_requests and limiter.tokens.level >= need_tokens:
+                limiter.requests.level -= 1
+                limiter.tokens.level -= tokens
+                limiter.stats["granted"] += 1
+                limiter.stats["by_priority"][priority] += 1
+                return 0.0
+            wait = max(
+                (need_requests - limiter.requests.level) / (limiter.requests.rate * limiter.rate_factor),
+                (need_tokens - limiter.tokens.level) / (limiter.tokens.rate * limiter.rate_factor),
+            )
+            return min(max(wait, POLL_SECONDS), 1.0)
+
+    def _set_waiting(self, model, priority, delta, waited=0.0):
+        with self._lock:
+            limiter = self._limiter(model)
+            limiter.waiting[priority] += delta
+            limiter.stats["wait_ms"] += waited * 1000.0
+
+    def acquire(self, model, tokens, priority=INTERACTIVE):
+        wait = self._try_acquire(model, tokens, priority)
+        if not wait:
+            return
+        start = time.monotonic()
+        self._set_waiting(model, priority, 1)
+        try:
+            while wait:
+                time.sleep(wait)
+                wait = self._try_acquire(model, tokens, priority)
+        finally:
+            self._set_waiting(model, priority, -1, time.monotonic() - start)
+
+    async def aacquire(self, model, tokens, priority=INTERACTIVE):
+        wait = self._try_acquire(model, tokens, priority)
+        if not wait:
+            return
+        start = time.monotonic()
+        self._set_waiting(model, priority, 1)
+        try:
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._try_acquire(model, tokens, priority)
+        finally:
+            self._set_waiting(model, priority, -1, time.monotonic() - start)
+
+    def observe(self, model, status_code, headers):
+        """Feed a response back: 429s back the model off, rate-limit headers resync the buckets."""
+        with self._lock:
+            limiter = self._limiter(model)
+            now = time.monotonic()
+            if status_code == 429:
+                limiter.consecutive_429 += 1
+                limiter.stats["throttled_429"] += 1
+                limiter.rate_factor = max(MIN_RATE_FACTOR, limiter.rate_factor * 0.5)
+                delay = _retry_after(headers)
+                if delay is None:
+                    delay = min(MAX_BACKOFF_SECONDS, 2.0 ** (limiter.consecutive_429 - 1)) * (0.5 + random.random())
+                limiter.blocked_until = max(limiter.blocked_until, now + delay)
+                return
+            if status_code < 400:
+                limiter.consecutive_429 = 0
+                limiter.rate_factor = min(1.0, limiter.rate_factor + RECOVERY_STEP)
+            # The server's view of the quota wins when it is tighter than ours (other processes share it)
+            for bucket, header in ((limiter.requests, "x-ratelimit-remaining-requests"),
+                                   (limiter.tokens, "x-ratelimit-remaining-tokens")):
+                try:
+                    remaining = float(headers.get(header))
+                except (TypeError, ValueError):
+                    continue
+                bucket.level = min(bucket.level, remaining)
+
+    def stats(self):
+        with self._lock:
+            return {
+                model: {**limiter.stats, "wait_ms": round(limiter.stats["wait_ms"], 1),
+                        "by_priority": dict(limiter.stats["by_priority"]),
+                        "rate_factor": round(limiter.rate_factor, 3),
+                        "queued": sum(limiter.waiting.values())}
+                for model, limiter in self._models.items()
+            }
+
+
+def _retry_after(headers):
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers.get(header)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def request_cost(request):
+    """(model, estimated tokens) of an OpenAI API request, from its JSON body."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    if "input" in body:
+        # Embeddings: strings, or token id lists (langchain-openai pre-tokenizes long inputs)
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        if inputs and isinstance(inputs[0], int):
+            inputs = [inputs]
+        tokens = sum(len(item) // 4 + 1 if isinstance(item, str) else len(item) for item in inputs)
+    else:
+        chars = sum(len(json.dumps(m.get("content", ""))) for m in body.get("messages", []))
+        tokens = chars // 4 + (body.get("max_tokens") or body.get("max_completion_tokens") or COMPLETION_TOKEN_ESTIMATE)
+    return body.get("model", "unknown"), tokens
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    def __init__(self, scheduler, priority=None, wrapped=None):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.wrapped = wrapped or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        model, tokens = request_cost(request)
+        self.scheduler.acquire(model, tokens, _priority.get() or self.priority or INTERACTIVE)
+        response = self.wrapped.handle_request(request)
+        self.scheduler.observe(model, response.status_code, response.headers)
+        return response
+
+    def close(self):
+        self.wrapped.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    def __init__(self, scheduler, priority=None, wrapped=None):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.wrapped = wrapped or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        model, tokens = request_cost(request)
+        await self.scheduler.aacquire(model, tokens, _priority.get() or self.priority or INTERACTIVE)
+        response = await self.wrapped.handle_async_request(request)
+        self.scheduler.observe(model, response.status_code, response.headers)
+        return response
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
+
+
+def openai_clients(priority=None):
+    """http_client / http_async_client kwargs that route a LangChain OpenAI client through the scheduler.
+
+    `priority` is the client's default class; a surrounding `request_priority()` block overrides it.
+    """
+    if not SCHEDULER_ENABLED:
+        return {}
+    from openai import DefaultHttpxClient, DefaultAsyncHttpxClient
+
+    scheduler = get_scheduler()
+    return {
+        "http_client": DefaultHttpxClient(transport=ScheduledTransport(scheduler, priority)),
+        "http_async_client": DefaultAsyncHttpxClient(transport=AsyncScheduledTransport(scheduler, priority)),
+    }
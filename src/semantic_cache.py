@@ -0,0 +1,167 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from src.query_constructor import extract_metadata_filter
+
+# Cosine similarity a new query needs to reuse a cached answer
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+# How often (seconds) the index fingerprint is re-read to detect a re-ingest
+FINGERPRINT_INTERVAL = float(os.getenv("SEMANTIC_CACHE_FINGERPRINT_INTERVAL", "30"))
+
+
+def index_fingerprint(persist_directory):
+    """Changes whenever the vector index under `persist_directory` is re-ingested."""
+    manifest = os.path.join(persist_directory, "ingest_manifest.json")
+    digest = hashlib.sha256()
+    if os.path.exists(manifest):
+        with open(manifest, "rb") as f:
+            digest.update(f.read())
+    elif os.path.isdir(persist_directory):
+        # No manifest (e.g. a hand-built index): fall back to file sizes and mtimes
+        for root, _, files in sorted(os.walk(persist_directory)):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}|".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _scope_key(where):
+    # {"$and": [{"state": {"$eq": "Texas"}}, {"year": {"$eq": 2024}}]} -> ("Texas", 2024)
+    clauses = where.get("$and", [where]) if where else []
+    values = {field: cond["$eq"] for clause in clauses for field, cond in clause.items()}
+    return values.get("state"), values.get("year")
+
+
+class SemanticAnswerCache:
+    """LRU cache of audited answers, looked up by query-embedding similarity.
+
+    A hit needs cosine similarity >= `threshold` and the same state/year scope
+    (so "Texas 2024 PTO" never answers "Tennessee 2024 PTO"). Queries the
+    rule-based filter finds ambiguous ("last year", "Texas vs California")
+    bypass the cache. All entries are dropped when `fingerprint_fn()` changes,
+    i.e. when the underlying collection was re-ingested.
+    """
+
+    def __init__(self, embeddings, fingerprint_fn=None, threshold=SIMILARITY_THRESHOLD,
+                 max_entries=MAX_ENTRIES, fingerprint_interval=FINGERPRINT_INTERVAL):
+        self.embeddings = embeddings
+        self.fingerprint_fn = fingerprint_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.fingerprint_interval = fingerprint_interval
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # entry id -> scope, least recently used first
+        self._scopes = {}          # scope -> {entry id: (query, vector, payload)}
+        self._next_id = 0
+        self._fingerprint = fingerprint_fn() if fingerprint_fn else None
+        self._fingerprint_checked = time.monotonic()
+
+    @staticmethod
+    def scope(query):
+        """(state, year) scope of a query, or None if it should not be cached."""
+        where, ambiguous = extract_metadata_filter(query)
+        return None if ambiguous else _scope_key(where)
+
+    def _check_fingerprint(self):
+        if self.fingerprint_fn is None or time.monotonic() - self._fingerprint_checked < self.fingerprint_interval:
+            return
+        fingerprint = self.fingerprint_fn()
+        with self._lock:
+            self._fingerprint_checked = time.monotonic()
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                if self._lru:
+                    self.invalidations += 1
+                self._lru.clear()
+                self._scopes.clear()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _lookup_vector(self, scope, vector):
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if not entries:
+                self.misses += 1
+                return None
+            ids = list(entries)
+            similarities = np.stack([entries[i][1] for i in ids]) @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._lru.move_to_end(ids[best])
+            return entries[ids[best]][2]
+
+    def _add_vector(self, scope, query, vector, payload):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._scopes.setdefault(scope, {})[entry_id] = (query, vector, payload)
+            self._lru[entry_id] = scope
+            while len(self._lru) > self.max_entries:
+                old_id, old_scope = self._lru.popitem(last=False)
+                del self._scopes[old_scope][old_id]
+                if not self._scopes[old_scope]:
+                    del self._scopes[old_scope]
+                self.evictions += 1
+
+    def lookup(self, query):
+        scope = self.scope(query)
+        if scope is None:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        self._check_fingerprint()
+        return self._lookup_vector(scope, self._normalize(self.embeddings.embed_query(query)))
+
+    async def alookup(self, query):
+        scope = self.scope(query)
+        if scope is None:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        self._check_fingerprint()
+        return self._lookup_vector(scope, self._normalize(await self.embeddings.aembed_query(query)))
+
+    def add(self, query, payload):
+        scope = self.scope(query)
+        if scope is None:
+            return
+        self._add_vector(scope, query, self._normalize(self.embeddings.embed_query(query)), payload)
+
+    async def aadd(self, query, payload):
+        scope = self.scope(query)
+        if scope is None:
+            return
+        self._add_vector(scope, query, self._normalize(await self.embeddings.aembed_query(query)), payload)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._scopes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._lru),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# APP_SERVING=0: one request at a time, no micro-batching (the pre-serving behaviour)
+SERVING_ENABLED = os.getenv("APP_SERVING", "1").lower() not in ("0", "false", "no")
+# Audits running at once; the rest wait in the queue
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", "4"))
+# Requests waiting beyond this are turned away straight away
+SERVING_MAX_QUEUE = int(os.getenv("SERVING_MAX_QUEUE", "32"))
+# Per-request wall-clock budget (seconds), queueing included
+SERVING_DEADLINE = float(os.getenv("SERVING_DEADLINE_S", "60"))
+# Queue depth at which audits shed the RAGAS tier (DeepEval still runs)
+SHED_QUEUE_DEPTH = int(os.getenv("SERVING_SHED_QUEUE_DEPTH", str(SERVING_WORKERS)))
+# RAGAS is also skipped when less than this is left of a request's deadline
+RAGAS_MIN_SECONDS = float(os.getenv("SERVING_RAGAS_MIN_S", "10"))
+# Query embeddings / vector searches arriving within this window go out as one call
+BATCH_WINDOW = float(os.getenv("SERVING_BATCH_WINDOW_MS", "15")) / 1000.0
+MAX_BATCH = int(os.getenv("SERVING_MAX_BATCH", "32"))
+# Throughput is measured over this trailing window (seconds)
+THROUGHPUT_WINDOW = 60.0
+
+
+class Overloaded(Exception):
+    """The request queue is full."""
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before it could be served."""
+
+
+class MicroBatcher:
+    """Runs calls that arrive within `window` seconds of each other as one batched call.
+
+    The first caller in a group leads: it waits out the window (or until
+    `max_batch` items have joined), calls `fn(group, items)` once for
+    everyone and hands each caller its own result. There is no background
+    thread; callers block in their own (executor) threads. With `wait_if`
+    set, the window is only waited out while it returns True (e.g. while
+    other requests are in flight), so a lone request pays no delay.
+    """
+
+    def __init__(self, fn, window=BATCH_WINDOW, max_batch=MAX_BATCH, wait_if=None):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max_batch
+        self.wait_if = wait_if
+        self._open = {}  # group -> (items, futures, full event)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "batches": 0, "largest_batch": 0}
+
+    def __call__(self, group, item):
+        future = Future()
+        with self._lock:
+            self.stats["calls"] += 1
+            batch = self._open.get(group)
+            leader = batch is None
+            if leader:
+                batch = self._open[group] = ([], [], threading.Event())
+            items, futures, full = batch
+            items.append(item)
+            futures.append(future)
+            if len(items) >= self.max_batch:
+                del self._open[group]
+                full.set()
+        if leader:
+            if self.wait_if is None or self.wait_if():
+                full.wait(self.window)
+            with self._lock:
+                if self._open.get(group) is batch:
+                    del self._open[group]
+                self.stats["batches"] += 1
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(items))
+            try:
+                for waiting, result in zip(futures, self.fn(group, items)):
+                    waiting.set_result(result)
+            except Exception as e:
+                for waiting in futures:
+                    if not waiting.done():
+                        waiting.set_exception(e)
+        return future.result()
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return {**stats, "avg_batch": round(stats["calls"] / stats["batches"], 2) if stats["batches"] else 0.0}
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings whose concurrent `embed_query` calls are sent as one request."""
+
+    def __init__(self, underlying, window=BATCH_WINDOW, max_batch=MAX_BATCH, wait_if=None):
+        self.underlying = underlying
+        self.batcher = MicroBatcher(self._embed_batch, window, max_batch, wait_if)
+
+    def _embed_batch(self, _, texts):
+        if hasattr(self.underlying, "embed_queries"):
+            return self.underlying.embed_queries(texts)
+        return [self.underlying.embed_query(t) for t in texts]
+
+    def embed_documents(self, texts):
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.batcher(None, text)
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embed_query, text)
+
+    def __getattr__(self, name):
+        # model, stats(), ... of the wrapped embeddings
+        if name == "underlying":
+            raise AttributeError(name)
+        return getattr(self.underlying, name)
+
+
+def batch_search(store, kind, vectors, params, where):
+    """Run one search kind for several query vectors, in as few store calls as the store allows."""
+    if kind == "mmr":
+        k, fetch_k, lambda_mult = params
+        if hasattr(store, "batch_max_marginal_relevance_search_by_vector"):
+            return store.batch_max_marginal_relevance_search_by_vector(vectors, k, fetch_k, lambda_mult, where)
+        if hasattr(store, "_collection"):
+            from src.partitions import query_collection, mmr_candidates
+            return [mmr_candidates(v, candidates, k, lambda_mult)
+                    for v, candidates in zip(vectors, query_collection(store._collection, vectors, fetch_k, where))]
+        return [store.max_marginal_relevance_search_by_vector(v, k, fetch_k, lambda_mult, filter=where)
+                for v in vectors]
+    (k,) = params
+    if hasattr(store, "batch_similarity_search_with_score_by_vector"):
+        return store.batch_similarity_search_with_score_by_vector(vectors, k, where)
+    if hasattr(store, "_collection"):
+        from src.partitions import query_collection
+        return [[(doc, distance) for distance, doc, _ in candidates]
+                for candidates in query_collection(store._collection, vectors, k, where)]
+    return [store.similarity_search_with_score_by_vector(v, k, filter=where) for v in vectors]
+
+
+class BatchingVectorStore(VectorStore):
+    """A vector store whose concurrent searches with the same parameters run as one batched query.
+
+    Query embeddings go through the store's (batching) embeddings first. Only
+    searches sharing kind, k, fetch_k, lambda and filter can be batched
+    together; everything else is passed straight to the wrapped store.
+    """
+
+    def __init__(self, store, window=BATCH_WINDOW, max_batch=MAX_BATCH, wait_if=None):
+        self.store = store
+        self.batcher = MicroBatcher(self._search_batch, window, max_batch, wait_if)
+
+    @property
+    def embeddings(self):
+        return self.store.embeddings
+
+    def _search_batch(self, group, vectors):
+        kind, params, where = group
+        return batch_search(self.store, kind, vectors, params, json.loads(where) if where else None)
+
+    def _search(self, kind, vector, params, where):
+        return self.batcher((kind, params, json.dumps(where, sort_keys=True) if where else None), vector)
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        return self.store.add_texts(texts, metadatas, **kwargs)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("wrap an existing store instead")
+
+    def _select_relevance_score_fn(self):
+        return self.store._select_relevance_score_fn()
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return self._search("similarity", embedding, (k,), filter)
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5,
+                                                filter=None, **kwargs):
+        return self._search("mmr", embedding, (k, fetch_k, lambda_mult), filter)
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self.embeddings.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    def __getattr__(self, name):
+        # get(), partition_sizes(), ... of the wrapped store
+        if name == "store":
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+
+class Ticket:
+    """One admitted request: when it must be done by and how long it queued."""
+
+    def __init__(self, controller, deadline, queue_wait_ms):
+        self.controller = controller
+        self.deadline = deadline
+        self.queue_wait_ms = queue_wait_ms
+
+    def remaining(self):
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def shed_ragas(self):
+        # Overloaded, or too little time left for the RAGAS judges to finish
+        return self.controller.overloaded() or self.remaining() < RAGAS_MIN_SECONDS
+
+
+class ServingController:
+    """Worker pool + bounded request queue for the chat handler.
+
+    At most `workers` audits run at once and at most `max_queue` wait. A
+    request that can't get a worker before its deadline, or arrives to a full
+    queue, is turned away instead of piling up.
+    """
+
+    def __init__(self, workers=SERVING_WORKERS, max_queue=SERVING_MAX_QUEUE, deadline=SERVING_DEADLINE,
+                 shed_depth=SHED_QUEUE_DEPTH):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.shed_depth = shed_depth
+        self.queued = 0
+        self.in_flight = 0
+        self.counts = {"admitted": 0, "completed": 0, "rejected": 0, "deadline_exceeded": 0, "ragas_shed": 0}
+        self.max_queue_depth = 0
+        self._waits = deque(maxlen=500)
+        self._finished = deque()
+        self._slots = None
+
+    def overloaded(self):
+        return self.queued >= self.shed_depth
+
+    def busy(self):
+        # Another audit is running, so a batching window may catch its calls too
+        return self.in_flight > 1
+
+    @asynccontextmanager
+    async def admit(self, deadline=None):
+        """Wait for a worker; yields a Ticket. Raises Overloaded or DeadlineExceeded."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)  # created on the serving event loop
+        arrived = time.monotonic()
+        ticket_deadline = arrived + (self.deadline if deadline is None else deadline)
+        if not self._slots.locked():
+            await self._slots.acquire()  # a worker is free: no queueing
+        else:
+            if self.queued >= self.max_queue:
+                self.counts["rejected"] += 1
+                raise Overloaded(f"{self.queued} requests already waiting")
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=ticket_deadline - arrived)
+            except asyncio.TimeoutError:
+                self.counts["deadline_exceeded"] += 1
+                raise DeadlineExceeded("no worker freed up before the deadline") from None
+            finally:
+                self.queued -= 1
+        waited_ms = (time.monotonic() - arrived) * 1000.0
+        self._waits.append(waited_ms)
+        self.counts["admitted"] += 1
+        self.in_flight += 1
+        try:
+            yield Ticket(self, ticket_deadline, waited_ms)
+            self.counts["completed"] += 1
+            self._finished.append(time.monotonic())
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def record(self, outcome):
+        # "deadline_exceeded" (timed out while being served) or "ragas_shed"
+        self.counts[outcome] += 1
+
+    def stats(self, batchers=None):
+        now = time.monotonic()
+        while self._finished and now - self._finished[0] > THROUGHPUT_WINDOW:
+            self._finished.popleft()
+        waits = sorted(self._waits)
+        return {
+            "workers": self.workers, "in_flight": self.in_flight, "queue_depth": self.queued,
+            "max_queue_depth": self.max_queue_depth, **self.counts,
+            "throughput_per_min": round(len(self._finished) * 60.0 / THROUGHPUT_WINDOW, 1),
+            "queue_wait_p50_ms": round(waits[len(waits) // 2], 1) if waits else 0.0,
+            "queue_wait_p95_ms": round(waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+            **{f"{name}_batching": batcher.report() for name, batcher in (batchers or {}).items()},
+        }
@@ -0,0 +1,39 @@
+FINAL_ANSWER_DELIMITER = "### Final Answer:"
+
+
+def split_final_answer(raw_response):
+    # Split Reasoning from Answer (Critical for Faithfulness Score)
+    if FINAL_ANSWER_DELIMITER in raw_response:
+        reasoning, clean_answer = raw_response.split(FINAL_ANSWER_DELIMITER, 1)
+        return reasoning.strip(), clean_answer.strip()
+    return "Direct response provided.", raw_response.strip()
+
+
+class FinalAnswerStream:
+    """Incrementally splits a streamed chain-of-thought response on the delimiter.
+
+    `feed(chunk)` returns (reasoning_so_far, answer_so_far). Until the delimiter
+    has been seen the answer is "", and a trailing partial delimiter ("### Fin")
+    is held back so it never flashes up in the reasoning box.
+    """
+
+    def __init__(self, delimiter=FINAL_ANSWER_DELIMITER):
+        self.delimiter = delimiter
+        self.buffer = ""
+
+    @property
+    def answer_started(self):
+        return self.delimiter in self.buffer
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.answer_started:
+            reasoning, answer = self.buffer.split(self.delimiter, 1)
+            return reasoning.strip(), answer.lstrip()
+        for size in range(min(len(self.delimiter) - 1, len(self.buffer)), 0, -1):
+            if self.delimiter.startswith(self.buffer[-size:]):
+                return self.buffer[:-size].strip(), ""
+        return self.buffer.strip(), ""
+
+    def result(self):
+        return split_final_answer(self.buffer)
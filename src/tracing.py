@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "data/.traces/traces.jsonl")
+# Roll the log at this size, keeping TRACE_LOG_BACKUPS older files (traces.jsonl.1, .2, ...)
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "3"))
+TRACING_ENABLED = os.getenv("TRACING_DISABLED", "").lower() not in ("1", "true", "yes")
+
+STAGE_COUNTERS = ("wall_ms", "llm_calls", "prompt_tokens", "completion_tokens")
+
+_current_trace = ContextVar("rag_trace", default=None)
+_current_stage = ContextVar("rag_trace_stage", default=None)
+# Any LangChain run started while a trace is active picks up its handler automatically
+_trace_handler = ContextVar("rag_trace_handler", default=None)
+register_configure_hook(_trace_handler, inheritable=True)
+
+_log_lock = threading.Lock()
+
+
+class Trace:
+    """Per-request record: wall time, LLM calls and tokens for each named stage."""
+
+    def __init__(self, name, **fields):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.fields = dict(fields)
+        self.stages = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add(self, stage, **counters):
+        # Concurrent stages (e.g. the two guardrail judges) report from different tasks/threads
+        with self._lock:
+            stats = self.stages.setdefault(stage, dict.fromkeys(STAGE_COUNTERS, 0))
+            for key, value in counters.items():
+                stats[key] += value
+
+    def to_record(self, total_ms, error=None):
+        with self._lock:
+            stages = {name: dict(stats) for name, stats in self.stages.items()}
+        totals = {key: sum(s[key] for s in stages.values()) for key in STAGE_COUNTERS[1:]}
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "ts": round(self.started, 3),
+            "total_ms": round(total_ms, 3),
+            "status": "error" if error else "ok",
+            "fields": self.fields,
+            "stages": stages,
+            "totals": totals,
+        }
+        if error:
+            record["error"] = error
+        return record
+
+
+def _token_usage(response):
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    # Providers that only report per-message usage (and cached generations, which report none)
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            meta = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += meta.get("input_tokens", 0)
+            completion += meta.get("output_tokens", 0)
+    return prompt, completion
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Counts LLM calls and tokens into the stage that is active when each call finishes."""
+
+    run_inline = True
+
+    def __init__(self, trace, default_stage="unattributed"):
+        self.trace = trace
+        self.default_stage = default_stage
+
+    def _stage(self):
+        return _current_stage.get() or self.default_stage
+
+    def on_llm_end(self, response, **kwargs):
+        prompt, completion = _token_usage(response)
+        self.trace.add(self._stage(), llm_calls=1, prompt_tokens=prompt, completion_tokens=completion)
+
+    def on_llm_error(self, error, **kwargs):
+        self.trace.add(self._stage(), llm_calls=1)
+
+
+@contextmanager
+def trace(name, **fields):
+    """Trace one request; on exit the record is appended to the rolling JSONL log."""
+    t = Trace(name, **fields)
+    if not TRACING_ENABLED:
+        yield t
+        return
+    trace_token = _current_trace.set(t)
+    handler_token = _trace_handler.set(TraceCallbackHandler(t))
+    start = time.perf_counter()
+    error = None
+    try:
+        yield t
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _trace_handler.reset(handler_token)
+        _current_trace.reset(trace_token)
+        write_trace(t.to_record((time.perf_counter() - start) * 1000.0, error))
+
+
+def current_stage_ms():
+    """{stage: wall ms} recorded so far by the active trace ({} outside of one)."""
+    t = _current_trace.get()
+    if t is None:
+        return {}
+    with t._lock:
+        return {name: round(stats["wall_ms"], 3) for name, stats in t.stages.items()}
+
+
+@contextmanager
+def stage(name):
+    """Time a block as `name` within the active trace (a no-op outside of one)."""
+    t = _current_trace.get()
+    if t is not None:
+        t.add(name)  # listed in start order, whichever of two concurrent stages finishes first
+    token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        if t is not None:
+            t.add(name, wall_ms=(time.perf_counter() - start) * 1000.0)
+
+
+def _rollover(path):
+    for i in range(TRACE_LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if TRACE_LOG_BACKUPS > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+def write_trace(record, path=None):
+    path = path or TRACE_LOG_PATH
+    line = json.dumps(record, default=str) + "\n"
+    with _log_lock:
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) + len(line) > TRACE_LOG_MAX_BYTES:
+                _rollover(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            # Tracing must never take a request down with it
+            print(f"⚠️ Trace log write failed: {e!r}")
+
+
+def load_traces(name=None, limit=200, path=None):
+    """The most recent `limit` trace records (optionally only those called `name`)."""
+    path = path or TRACE_LOG_PATH
+    if not os.path.exists(path):
+        return []
+    with _log_lock, open(path, "r", encoding="utf-8") as f:
+        lines = list(f)
+    records = deque(maxlen=limit)
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # torn last line from a crashed writer
+        if name is None or record.get("name") == name:
+            records.append(record)
+    return list(records)
+
+
+def stage_summary(name="secure_policy_search", limit=200, path=None):
+    """p50/p95 wall time plus mean LLM calls/tokens per stage over recent traces."""
+    records = load_traces(name, limit, path)
+    columns = ["stage", "requests", "p50_ms", "p95_ms", "avg_llm_calls", "avg_prompt_tokens", "avg_completion_tokens"]
+    if not records:
+        return pd.DataFrame(columns=columns)
+
+    per_stage = {}
+    for record in records:
+        for stage_name, stats in record["stages"].items():
+            per_stage.setdefault(stage_name, []).append(stats)
+    # Point-in-time latencies recorded as fields (e.g. ttft_ms) sit next to the stages
+    no_llm = dict.fromkeys(STAGE_COUNTERS[1:], 0)
+    for record in records:
+        for field, value in record["fields"].items():
+            if field.endswith("_ms") and isinstance(value, (int, float)):
+                per_stage.setdefault(field, []).append({"wall_ms": value, **no_llm})
+    per_stage["total"] = [{"wall_ms": r["total_ms"], **r["totals"]} for r in records]
+
+    rows = []
+    for stage_name, stats in per_stage.items():
+        wall = np.array([s["wall_ms"] for s in stats])
+        rows.append([
+            stage_name, len(stats),
+            round(float(np.percentile(wall, 50)), 1), round(float(np.percentile(wall, 95)), 1),
+            round(float(np.mean([s["llm_calls"] for s in stats])), 2),
+            round(float(np.mean([s["prompt_tokens"] for s in stats])), 1),
+            round(float(np.mean([s["completion_tokens"] for s in stats])), 1),
+        ])
+    return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,217 @@
+import os
+import glob
+import time
+import shutil
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from ingest_multi import file_sha256, iter_processed_files, chunk_ids_for
+from run_eval import DATASET_PATH, PDF_PATH, load_dataset
+from src.embedding_cache import get_embeddings
+from src.numpy_store import NumpyVectorStore
+from src.bm25_index import tokenize
+from src.query_constructor import extract_metadata_filter
+from src.context_packing import count_tokens
+from src.scheduler import EVALUATION
+
+load_dotenv()
+
+# One candidate index per config lives under here, next to results.csv
+SWEEP_DIR = "data/sweeps"
+# Separator lists the grid can pick from ("default" is ingest_multi.build_splitter's)
+SEPARATOR_PRESETS = {
+    "default": None,
+    "paragraph": ["\n\n", "\n", " ", ""],
+    "sentence": [". ", "\n", " ", ""],
+}
+# Same retrieval the chat app runs (app.py: mmr_search_kwargs)
+SEARCH_KWARGS = {"k": 5, "fetch_k": 15, "lambda_mult": 0.25}
+# A chunk "answers" a question when it holds this share of the ground truth's terms
+HIT_COVERAGE = 0.6
+# USD per 1M embedding tokens, for the cost column (text-embedding-ada-002 list price)
+EMBEDDING_PRICE_PER_1M = float(os.getenv("EMBEDDING_PRICE_PER_1M_TOKENS", "0.10"))
+
+
+# --- INPUTS ---
+def resolve_inputs(docs, dataset=None):
+    """PDF paths under `docs` (a directory or one PDF) and the golden dataset to score them with.
+
+    data/eval_dataset.json only asks about data/company_policy.pdf, so any
+    other corpus needs its own golden set: scores against the wrong one mean nothing.
+    """
+    paths = sorted(glob.glob(os.path.join(docs, "*.pdf"))) if os.path.isdir(docs) else [docs]
+    if dataset is None:
+        if os.path.normpath(docs) != os.path.normpath(PDF_PATH):
+            raise ValueError(f"--dataset is required with --docs {docs}: {DATASET_PATH} is written for {PDF_PATH}")
+        dataset = DATASET_PATH
+    return paths, dataset
+
+
+# --- GRID ---
+def build_grid(chunk_sizes, chunk_overlaps, separators=("default",)):
+    """Every (size, overlap, separators) combination where the overlap is smaller than the chunk."""
+    return [
+        {"chunk_size": size, "chunk_overlap": overlap, "separators": sep}
+        for size, overlap, sep in itertools.product(chunk_sizes, chunk_overlaps, separators)
+        if overlap < size
+    ]
+
+
+def config_id(config):
+    return f"size{config['chunk_size']}_overlap{config['chunk_overlap']}_{config['separators']}"
+
+
+def split_corpus(jobs, config, workers=None):
+    # Same parse cache + section split + recursive splitter as ingest_multi.py, with this config's settings
+    splitter_kwargs = {"chunk_size": config["chunk_size"], "chunk_overlap": config["chunk_overlap"],
+                       "separators": SEPARATOR_PRESETS[config["separators"]]}
+    chunks, ids = [], []
+    for source, file_hash, _, file_chunks in iter_processed_files(jobs, workers, splitter_kwargs):
+        chunks.extend(file_chunks)
+        ids.extend(chunk_ids_for(source, file_hash, file_chunks))
+    return chunks, ids
+
+
+# --- BUILD ---
+def build_index(config, chunks, ids, embeddings, out_dir, dtype="float32"):
+    """Embed (cache misses only) and persist one candidate index. Returns (store, build stats)."""
+    start = time.perf_counter()
+    texts = [c.page_content for c in chunks]
+    # Chunk texts any earlier config (or an earlier ingest) produced are already in the cache
+    new_texts = embeddings.missing(texts)
+    distinct = list(dict.fromkeys(texts))
+    vectors = dict(zip(distinct, embeddings.embed_documents(distinct)))
+
+    store = NumpyVectorStore(embeddings, dtype=dtype)
+    store.add_embeddings(texts, [vectors[t] for t in texts], [c.metadata for c in chunks], ids)
+    path = os.path.join(out_dir, config_id(config))
+    store.persist(path)
+    embed_tokens = sum(count_tokens(t) for t in new_texts)
+    return store, {
+        "chunks": len(texts),
+        "distinct_chunks": len(distinct),
+        "new_embeddings": len(new_texts),
+        "reused_embeddings": len(distinct) - len(new_texts),
+        "embed_tokens": embed_tokens,
+        "embed_cost_usd": round(embed_tokens * EMBEDDING_PRICE_PER_1M / 1e6, 6),
+        "index_mb": round(sum(os.path.getsize(p) for p in glob.glob(os.path.join(path, "*"))) / 2 ** 20, 3),
+        "build_s": round(time.perf_counter() - start, 3),
+    }
+
+
+# --- EVALUATE ---
+def score_retrieval(contexts, ground_truth):
+    """(term recall over all contexts, reciprocal rank of the first chunk covering HIT_COVERAGE)."""
+    terms = set(tokenize(ground_truth))
+    if not terms:
+        return 0.0, 0.0
+    found, reciprocal_rank = set(), 0.0
+    for rank, text in enumerate(contexts, start=1):
+        covered = terms & set(tokenize(text))
+        found |= covered
+        if not reciprocal_rank and len(covered) >= HIT_COVERAGE * len(terms):
+            reciprocal_rank = 1.0 / rank
+    return len(found) / len(terms), reciprocal_rank
+
+
+def evaluate_config(store, samples, query_vectors):
+    """Retrieval quality + query latency of one index over the golden dataset.
+
+    Filters come from the rule-based fast path only; ambiguous questions are
+    searched unfiltered (no self-query LLM in a sweep).
+    """
+    recalls, ranks, latencies, context_tokens = [], [], [], []
+    for sample, vector in zip(samples, query_vectors):
+        where, ambiguous = extract_metadata_filter(sample["question"])
+        start = time.perf_counter()
+        docs = store.max_marginal_relevance_search_by_vector(
+            vector, filter=None if ambiguous else where, **SEARCH_KWARGS
+        )
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        contexts = [d.page_content for d in docs]
+        recall, reciprocal_rank = score_retrieval(contexts, sample["ground_truth"])
+        recalls.append(recall)
+        ranks.append(reciprocal_rank)
+        context_tokens.append(sum(count_tokens(c) for c in contexts))
+    return {
+        "context_recall": round(float(np.mean(recalls)), 4) if recalls else 0.0,
+        "hit_rate": round(float(np.mean([r > 0 for r in ranks])), 4) if ranks else 0.0,
+        "mrr": round(float(np.mean(ranks)), 4) if ranks else 0.0,
+        "context_tokens": round(float(np.mean(context_tokens)), 1) if context_tokens else 0.0,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies else 0.0,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3) if latencies else 0.0,
+    }
+
+
+def sweep(configs, jobs, samples, embeddings, out_dir=SWEEP_DIR, workers=None, eval_workers=None, dtype="float32"):
+    """Build every candidate index, then score them all against the golden dataset in parallel."""
+    os.makedirs(out_dir, exist_ok=True)
+    # --- STEP 1: QUERY EMBEDDINGS (once, shared by every config) ---
+    query_vectors = embeddings.embed_queries([s["question"] for s in samples])
+
+    # --- STEP 2: CANDIDATE INDEXES ---
+    # Built one after another, so each config reuses every chunk embedding the previous ones paid for
+    builds = []
+    for config in configs:
+        chunks, ids = split_corpus(jobs, config, workers)
+        store, stats = build_index(config, chunks, ids, embeddings, out_dir, dtype)
+        print(f"🧱 {config_id(config)}: {stats['chunks']} chunks, {stats['new_embeddings']} new embeddings "
+              f"({stats['reused_embeddings']} reused), {stats['index_mb']} MB")
+        builds.append((config, store, stats))
+
+    # --- STEP 3: GOLDEN DATASET AGAINST EVERY CONFIG ---
+    with ThreadPoolExecutor(max_workers=eval_workers or len(builds) or 1) as pool:
+        quality = list(pool.map(lambda build: evaluate_config(build[1], samples, query_vectors), builds))
+
+    rows = [{"config": config_id(config), **config, **stats, **scores}
+            for (config, _, stats), scores in zip(builds, quality)]
+    report = pd.DataFrame(rows)
+    if not report.empty:
+        report = report.sort_values(["hit_rate", "context_recall", "index_mb"], ascending=[False, False, True])
+    report.to_csv(os.path.join(out_dir, "results.csv"), index=False)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep chunking settings: build each index, score retrieval.")
+    parser.add_argument("--docs", default=PDF_PATH, help="Policy PDF, or a directory of them, to chunk")
+    parser.add_argument("--dataset", default=None,
+                        help=f"Golden dataset (JSON array or JSONL) for --docs (default: {DATASET_PATH}, "
+                             f"which is only valid for {PDF_PATH})")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[300, 500, 800])
+    parser.add_argument("--chunk-overlaps", type=int, nargs="+", default=[0, 50, 100])
+    parser.add_argument("--separators", nargs="+", choices=sorted(SEPARATOR_PRESETS), default=["default"])
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used to parse/split PDFs")
+    parser.add_argument("--eval-workers", type=int, default=None, help="Configs scored at once (default: all)")
+    parser.add_argument("--out-dir", default=SWEEP_DIR)
+    parser.add_argument("--fresh", action="store_true", help="Delete indexes from earlier sweeps first")
+    args = parser.parse_args()
+
+    try:
+        paths, dataset = resolve_inputs(args.docs, args.dataset)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.fresh:
+        shutil.rmtree(args.out_dir, ignore_errors=True)
+    jobs = [(path, file_sha256(path)) for path in paths]
+    configs = build_grid(args.chunk_sizes, args.chunk_overlaps, args.separators)
+    samples = load_dataset(dataset)
+    print(f"🧪 Sweeping {len(configs)} chunking configs over {len(paths)} PDFs and {len(samples)} questions")
+
+    # Background class: a live chat app sharing the quota is served first
+    embeddings = get_embeddings(priority=EVALUATION)
+    report = sweep(configs, jobs, samples, embeddings, args.out_dir, args.workers, args.eval_workers, args.dtype)
+    columns = ["config", "chunks", "index_mb", "new_embeddings", "embed_cost_usd",
+               "context_recall", "hit_rate", "mrr", "context_tokens", "p50_ms", "p95_ms"]
+    print("\n📊 Retrieval quality vs. index size, embedding cost and latency:")
+    print(report[columns].to_string(index=False))
+    print(f"\n🧠 Embedding cache: {embeddings.stats()}")
+    print(f"💾 Table written to {os.path.join(args.out_dir, 'results.csv')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,17 @@ from deepeval import assert_test
 from deepeval.metrics import HallucinationMetric, AnswerRelevancyMetric
 from deepeval.test_case import LLMTestCase
 from src.rag_system import initialize_rag
+from src.judge_cache import get_deepeval_judge
 
 # Disable telemetry and local dashboard for Hugging Face compatibility
 os.environ["DEEPEVAL_TELEMETRY"] = "False"
 
 # 1. Initialize RAG
 # Ensure the path matches your 'data' folder structure
-rag_chain, retriever = initialize_rag("data/company_policy.pdf")
+# Built on first use, not at import, so collecting (or deselecting) these tests stays cheap
+@pytest.fixture(scope="module")
+def rag():
+    return initialize_rag("data/company_policy.pdf")
 
 # 2. Adversarial Test Suite
 test_data = [
@@ -29,7 +33,8 @@ test_data = [
 ]
 
 @pytest.mark.parametrize("case", test_data)
-def test_rag_security(case):
+def test_rag_security(case, rag):
+    rag_chain, retriever = rag
     # Execute RAG
     actual_output = rag_chain.invoke(case["input"])
     docs = retriever.invoke(case["input"])
@@ -37,8 +42,10 @@ def test_rag_security(case):
 
     # Initialize Metrics with strict thresholds
     # Threshold 0.5: If hallucination > 0.5, the test fails.
-    hallucination_metric = HallucinationMetric(threshold=0.5)
-    relevancy_metric = AnswerRelevancyMetric(threshold=0.5)
+    # Both judges read through the persistent judge cache, so unchanged cases cost nothing on re-runs
+    judge = get_deepeval_judge()
+    hallucination_metric = HallucinationMetric(threshold=0.5, model=judge)
+    relevancy_metric = AnswerRelevancyMetric(threshold=0.5, model=judge)
 
     test_case = LLMTestCase(
         input=case["input"],
@@ -0,0 +1,12 @@
+import pytest
+from src import results_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_results_store(tmp_path, monkeypatch):
+    # Guardrail / evaluation calls under test buffer rows; keep them out of data/eval_results
+    monkeypatch.setattr(results_store, "RESULTS_DIR", str(tmp_path / "eval_results"))
+    results_store._buffer.clear()
+    yield
+    results_store._buffer.clear()
+    results_store._run_config.clear()
@@ -0,0 +1,25 @@
+from benchmarks.fakes import FakeOpenAIEmbeddings
+from benchmarks.run_benchmarks import compare_results
+
+
+def report(**benchmarks):
+    return {"meta": {}, "benchmarks": benchmarks}
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    base = report(retrieval={"n": 40, "p95_ms": 10.0, "p50_ms": 5.0}, ingest={"files_per_s": 50.0})
+    new = report(retrieval={"n": 80, "p95_ms": 12.0, "p50_ms": 4.0}, ingest={"files_per_s": 40.0})
+
+    regressions = {(b, m) for b, m, _, _, _, regressed in compare_results(base, new, 0.10) if regressed}
+    assert regressions == {("retrieval", "p95_ms"), ("ingest", "files_per_s")}
+
+
+def test_compare_skips_errored_benchmarks():
+    base = report(run_evaluation={"samples_per_s": 2.0})
+    new = report(run_evaluation={"error": "ModuleNotFoundError: ragas"})
+    assert compare_results(base, new) == []
+
+
+def test_fake_embeddings_are_deterministic():
+    emb = FakeOpenAIEmbeddings(dimensions=64)
+    assert emb.embed_query("Texas PTO policy") == emb.embed_documents(["Texas PTO policy"])[0]
@@ -0,0 +1,71 @@
+import pytest
+from src.bm25_index import BM25Index, HybridRetriever, index_version
+from src.numpy_store import NumpyVectorStore
+from tests.test_numpy_store import KeywordEmbeddings
+
+CHUNKS = [
+    ("Texas remote workers must maintain a 50Mbps internet connection.", {"state": "Texas", "year": 2024}),
+    ("Texas PTO requests need 30 days notice.", {"state": "Texas", "year": 2024}),
+    ("Texas travel reimbursement is capped at $500.", {"state": "Texas", "year": 2023}),
+    ("Tennessee remote workers must maintain a 50Mbps internet connection.", {"state": "Tennessee", "year": 2024}),
+    ("Failure to comply may result in a review of employment status.", {"state": "Tennessee", "year": 2022}),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    texts, metadatas = zip(*CHUNKS)
+    BM25Index.build([f"id-{i}" for i in range(len(CHUNKS))], texts, metadatas).persist(str(tmp_path / "bm25"))
+    return BM25Index.load(str(tmp_path / "bm25"))
+
+
+def test_exact_tokens_and_filters(index):
+    hits = index.search("50 Mbps internet", k=5, where={"state": {"$eq": "Texas"}})
+    row, _, coverage, exact = hits[0]
+    assert index.ids[row] == "id-0" and coverage == 1.0 and exact
+    assert [index.ids[r] for r, *_ in index.search("$500 travel", k=5)][0] == "id-2"
+    # "$750" is not in the corpus, so no hit can be an exact match
+    assert not any(exact for *_, exact in index.search("$750 travel", k=5))
+    assert index.search("50 Mbps", k=5, where={"year": {"$lt": 2023}}) == []
+
+
+class NoDenseSearch(NumpyVectorStore):
+    def search(self, *args, **kwargs):
+        raise AssertionError("confident keyword queries must not hit the vector store")
+
+
+def hybrid(index, vectorstore_cls=NumpyVectorStore):
+    texts, metadatas = zip(*CHUNKS)
+    store = vectorstore_cls.from_texts(list(texts), KeywordEmbeddings(), metadatas=list(metadatas))
+    return HybridRetriever(bm25=index, vectorstore=store, search_type="similarity", search_kwargs={"k": 2, "fetch_k": 4})
+
+
+def test_confident_keyword_query_skips_dense_search(index):
+    retriever = hybrid(index, NoDenseSearch)
+    docs = retriever.invoke("50 Mbps internet")
+    assert docs[0].id in ("id-0", "id-3") and len(docs) == 2
+    assert retriever.stats == {"bm25_only": 1, "fused": 0}
+
+
+def test_vague_query_is_fused_with_dense_results(index):
+    retriever = hybrid(index)
+    docs = retriever.search("what are the compliance rules", where={"state": "Tennessee"})
+    assert retriever.stats == {"bm25_only": 0, "fused": 1}
+    assert docs[0].page_content.startswith("Failure to comply")
+    assert all(d.metadata["state"] == "Tennessee" for d in docs)
+
+
+def test_streamed_rebuild_is_picked_up_by_a_running_retriever(tmp_path):
+    path = str(tmp_path / "bm25")
+    texts, metadatas = zip(*CHUNKS)
+    first = BM25Index.build_to_disk(((f"id-{i}", t, m) for i, (t, m) in enumerate(CHUNKS)), path)
+    in_memory = BM25Index.build([f"id-{i}" for i in range(len(CHUNKS))], texts, metadatas)
+    assert first.search("50 Mbps internet", k=5) == in_memory.search("50 Mbps internet", k=5)
+
+    retriever = hybrid(first)
+    retriever.bm25_path, retriever.bm25_version = path, index_version(path)
+    assert any(d.id == "id-2" for d in retriever._lexical("$500 travel", None)[0])
+    # A re-ingest drops the travel chunk: its BM25 hit must not outlive it
+    BM25Index.build_to_disk(((f"id-{i}", t, m) for i, (t, m) in enumerate(CHUNKS) if i != 2), path)
+    assert not any(d.id == "id-2" for d in retriever._lexical("$500 travel", None)[0])
+    assert len(retriever.bm25) == len(CHUNKS) - 1
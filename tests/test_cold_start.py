@@ -0,0 +1,22 @@
+import sys
+import json
+import subprocess
+import pytest
+
+HEAVY = ["gradio", "ragas", "deepeval", "datasets", "langchain_openai", "langchain_chroma", "chromadb", "pypdf"]
+
+
+def heavy_modules_after(statement):
+    script = f"import sys, json; {statement}; print(json.dumps(sorted(m for m in {HEAVY!r} if m in sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["src.rag_system", "src.evaluator"])
+def test_library_modules_import_nothing_heavy(module):
+    assert heavy_modules_after(f"import {module}") == []
+
+
+def test_app_import_defers_the_pipeline():
+    # Only the UI toolkit loads at import; the pipeline (and everything behind it) is built on first use
+    assert heavy_modules_after("import app; assert app._pipeline is None") == ["gradio"]
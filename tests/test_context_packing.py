@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+from src.context_packing import pack_context, merge_overlapping, count_tokens
+
+SECTION = ("Section 2: Internet. Employees receive a monthly internet stipend of $50. "
+           "The connection must support at least 50 Mbps. Receipts are submitted by the 5th of each month.")
+
+
+def chunk(text, start, source="tx.pdf", state="Texas"):
+    return Document(page_content=text, metadata={"source": source, "state": state, "year": 2024,
+                                                 "start_index": start})
+
+
+def test_overlapping_chunks_are_stitched_back_together():
+    # Splitter-style chunks with a 30-char overlap, retrieved out of order
+    first, second = SECTION[:100], SECTION[70:]
+    docs = [chunk(second, 70), chunk("Section 1: PTO accrues at 1.5 days per month.", 0, source="oh.pdf"),
+            chunk(first, 0)]
+    packed, merged = merge_overlapping(docs)
+    assert merged == 1
+    # The stitched passage takes the rank of its best chunk
+    assert [d.page_content for d in packed] == [SECTION, docs[1].page_content]
+
+    # Same source, overlapping start_index, but unrelated text (another section): kept apart
+    other = chunk("Section 3: Travel must be approved by a manager in advance of booking.", 40)
+    assert merge_overlapping([chunk(first, 0), other])[1] == 0
+
+
+def test_repeated_sentences_are_dropped_but_state_specific_ones_kept():
+    shared = "All remote employees must complete the annual security training."
+    docs = [chunk(f"{shared} Texas employees get a $50 stipend.", 0),
+            chunk(f"{shared} Ohio employees get a $40 stipend.", 0, source="oh.pdf", state="Ohio")]
+    packed, stats = pack_context(docs, budget=1000)
+    assert stats["sentences_dropped"] == 1
+    assert packed[0].page_content == docs[0].page_content
+    assert packed[1].page_content == "Ohio employees get a $40 stipend."
+    assert stats["tokens_saved"] == stats["tokens_in"] - stats["tokens_out"] > 0
+
+
+def test_context_fits_the_token_budget_in_rank_order():
+    docs = [chunk(SECTION, 0, source=f"{i}.pdf") for i in range(3)]
+    docs = [Document(page_content=d.page_content.replace("$50", f"${50 + i}").replace("50 Mbps", f"{50 + i} Mbps")
+                     .replace("5th", f"{5 + i}th"), metadata=d.metadata) for i, d in enumerate(docs)]
+    budget = count_tokens(docs[0].page_content) + 40
+    packed, stats = pack_context(docs, budget=budget)
+    assert stats["tokens_out"] <= budget
+    assert packed[0].page_content == docs[0].page_content
+    # The overflowing passage is cut at a sentence end; the third no longer fits at all
+    assert stats["truncated"] == 1 and len(packed) == 2
+    assert packed[1].metadata["truncated"] and docs[1].page_content.startswith(packed[1].page_content)
+    assert packed[1].page_content.endswith(".")
+    assert pack_context([], budget=budget)[1]["tokens_saved"] == 0
@@ -0,0 +1,73 @@
+import ingest_multi
+from benchmarks.fakes import FakeOpenAIEmbeddings
+from langchain_core.documents import Document
+from src.dedup import ChunkDeduplicator
+from src.embedding_cache import CachedEmbeddings
+
+TEXAS = {"state": "Texas", "year": 2024, "source": "data/policies/Policy_Texas_2024_1.pdf"}
+CHUNK = ("Section 2: Guidelines Under the 2024 regulations, Remote Work must be requested 30 days in advance. "
+         "For Texas specific mandates, employees must maintain a 50Mbps internet connection for all "
+         "Remote Work activities and must keep company equipment secure at all times.")
+
+
+def test_exact_and_near_copies_share_one_entry():
+    dedup = ChunkDeduplicator()
+    entry_id, is_new = dedup.assign(CHUNK, TEXAS)
+    assert is_new
+    # Re-extracted copy (case/whitespace) and a one-word edit both map onto it
+    assert dedup.assign("  " + CHUNK.upper(), TEXAS) == (entry_id, False)
+    assert dedup.assign(CHUNK.replace("secure", "safe"), TEXAS) == (entry_id, False)
+    report = dedup.report()
+    assert report["new_entries"] == 1 and report["exact_duplicates"] == 1 and report["near_duplicates"] == 1
+    assert report["dedup_ratio"] == round(2 / 3, 3)
+
+
+def test_copies_differing_in_facts_or_scope_stay_separate():
+    dedup = ChunkDeduplicator()
+    entry_id, _ = dedup.assign(CHUNK, TEXAS)
+    for text, metadata in [
+        (CHUNK.replace("30 days", "45 days"), TEXAS),
+        (CHUNK.replace("must keep", "must not keep"), TEXAS),
+        (CHUNK, {**TEXAS, "year": 2023}),  # same words, but a 2023 filter must still find it
+    ]:
+        other_id, is_new = dedup.assign(text, metadata)
+        assert is_new and other_id != entry_id
+    assert dedup.report()["cross_scope_copies"] == 1
+
+
+def test_removed_entries_are_recreated_on_next_use():
+    dedup = ChunkDeduplicator()
+    dedup.add_existing("legacy-0", CHUNK, TEXAS)
+    assert dedup.assign(CHUNK, TEXAS) == ("legacy-0", False)
+    dedup.remove("legacy-0")
+    entry_id, is_new = dedup.assign(CHUNK, TEXAS)
+    assert is_new and entry_id != "legacy-0"
+
+
+def test_shared_entry_lists_every_source(tmp_path, monkeypatch):
+    data = tmp_path / "policies"
+    data.mkdir()
+    pages = {"Policy_Texas_2024_1.pdf": CHUNK, "Policy_Texas_2024_2.pdf": CHUNK}
+    for name in pages:
+        (data / name).write_bytes(name.encode("utf-8"))
+    monkeypatch.setattr(ingest_multi, "DATA_PATH", str(data))
+    monkeypatch.setattr(ingest_multi, "NUMPY_DB_PATH", str(tmp_path / "index"))
+    monkeypatch.setattr(ingest_multi, "parse_pdf", lambda path, file_hash: [
+        Document(page_content=pages[path.rsplit("/", 1)[-1]], metadata={"source": path, "page": 0})])
+    embeddings = CachedEmbeddings(FakeOpenAIEmbeddings(dimensions=32), path=str(tmp_path / "emb.sqlite"))
+    monkeypatch.setattr(ingest_multi, "get_embeddings", lambda **kwargs: embeddings)
+
+    def entries():
+        store = ingest_multi.open_vectorstore("numpy", embeddings)
+        return store.get(include=["metadatas"])["metadatas"]
+
+    first, second = (str(data / name) for name in pages)
+    ingest_multi.ingest_structured(workers=1, backend="numpy")
+    [meta] = entries()
+    assert meta["source"] == first and meta["sources"] == f"{first}|{second}"
+
+    # The first file goes away: the entry stays, now citing only the file still using it
+    (data / "Policy_Texas_2024_1.pdf").unlink()
+    ingest_multi.ingest_structured(workers=1, backend="numpy")
+    [meta] = entries()
+    assert meta["source"] == second and meta["sources"] == second
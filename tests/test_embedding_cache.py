@@ -0,0 +1,46 @@
+from langchain_core.embeddings import Embeddings
+from src.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_repeated_text_is_embedded_once(tmp_path):
+    underlying = CountingEmbeddings()
+    cache = CachedEmbeddings(underlying, path=str(tmp_path / "emb.sqlite"))
+
+    first = cache.embed_documents(["boilerplate", "boilerplate", "unique"])
+    second = cache.embed_documents(["boilerplate", "unique"])
+
+    # Misses are de-duplicated and sent as one batch; the second call is all hits
+    assert underlying.batches == [["boilerplate", "unique"]]
+    assert first == [[11.0, 1.0], [11.0, 1.0], [6.0, 1.0]]
+    assert second == [[11.0, 1.0], [6.0, 1.0]]
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    CachedEmbeddings(CountingEmbeddings(), path=path).embed_query("What is the PTO policy?")
+
+    underlying = CountingEmbeddings()
+    CachedEmbeddings(underlying, path=path).embed_query("What is the PTO policy?")
+    assert underlying.batches == []
+
+
+def test_lru_eviction_bounds_size(tmp_path):
+    cache = CachedEmbeddings(CountingEmbeddings(), path=str(tmp_path / "emb.sqlite"), max_entries=10)
+    cache.embed_documents([f"chunk {i}" for i in range(25)])
+    assert cache.stats()["entries"] <= 10
@@ -0,0 +1,51 @@
+from src.index_stats import IndexStats, iter_chunks, section_of, length_bin
+from src.numpy_store import NumpyVectorStore
+from src.partitions import PartitionedVectorStore
+from tests.test_numpy_store import KeywordEmbeddings
+
+CHUNKS = [
+    ("Section 1: Texas internet must be 50 Mbps", {"state": "Texas", "year": 2024}),
+    ("Section 2: Texas PTO requests need 30 days" + " more" * 40, {"state": "Texas", "year": 2024}),
+    ("Section 3: Texas travel compliance review", {"state": "Texas", "year": 2023}),
+    ("Tennessee health benefits overview", {"state": "Tennessee", "year": 2024}),
+]
+
+
+def test_sections_and_length_bins():
+    assert section_of("Section 1: ... see Section 3: Penalties") == "Section 3"
+    assert section_of("Eligibility rules") == "Other"
+    assert [length_bin(n) for n in (0, 99, 100, 499, 1999, 5000)] == ["0-99", "0-99", "100-199", "400-499", "1000-1999", "2000+"]
+
+
+def test_incremental_updates_match_a_full_recount(tmp_path):
+    texts, metadatas = zip(*CHUNKS)
+    stats = IndexStats()
+    stats.add(texts, metadatas)
+    stats.remove([texts[2]], [metadatas[2]])
+    stats.save(str(tmp_path))
+    stats = IndexStats.load(str(tmp_path))
+
+    assert stats.total == 3
+    assert stats.counts("state") == {("Tennessee",): 1, ("Texas",): 2}
+    assert stats.counts("section", state="Texas", year=2024) == {("Section 1",): 1, ("Section 2",): 1}
+    assert stats.histogram(state="Texas") == {"0-99": 1, "200-299": 1}
+
+    store = NumpyVectorStore.from_texts([texts[i] for i in (0, 1, 3)], KeywordEmbeddings(),
+                                        metadatas=[metadatas[i] for i in (0, 1, 3)])
+    recount = IndexStats.rebuild(store, page_size=2)
+    assert (recount.counts("state", "year", "section"), recount.histogram()) == \
+        (stats.counts("state", "year", "section"), stats.histogram())
+
+    stats.drop("Texas", 2024)
+    assert stats.counts("state", "year") == {("Tennessee", "2024"): 1}
+
+
+def test_iter_chunks_pages_with_store_side_filters(tmp_path):
+    texts, metadatas = zip(*CHUNKS)
+    parts = PartitionedVectorStore.from_texts(list(texts), KeywordEmbeddings(), metadatas=list(metadatas),
+                                              ids=[f"id-{i}" for i in range(len(CHUNKS))],
+                                              persist_directory=str(tmp_path), scheme="state_year")
+    assert sorted(i for i, _, _ in iter_chunks(parts, page_size=1)) == ["id-0", "id-1", "id-2", "id-3"]
+    texas = list(iter_chunks(parts, where={"state": {"$eq": "Texas"}}, page_size=2))
+    assert sorted(i for i, _, _ in texas) == ["id-0", "id-1", "id-2"]
+    assert all(meta["state"] == "Texas" for _, _, meta in texas)
@@ -0,0 +1,40 @@
+import time
+from langchain_core.language_models import FakeListChatModel
+from src.judge_cache import JudgeCache
+
+
+def judge(cache, responses):
+    return FakeListChatModel(responses=responses, cache=cache)
+
+
+def test_identical_judge_prompt_is_served_from_cache(tmp_path):
+    cache = JudgeCache(path=str(tmp_path / "judge.sqlite"))
+    client = judge(cache, ["yes", "no"])
+    # Uncached, the fake would move on to its second scripted reply
+    assert client.invoke("Is the answer grounded?").content == "yes"
+    assert client.invoke("Is the answer grounded?").content == "yes"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_cache_persists_across_processes(tmp_path):
+    path = str(tmp_path / "judge.sqlite")
+    judge(JudgeCache(path=path), ["yes", "no"]).invoke("Is the answer grounded?")
+
+    restarted = JudgeCache(path=path)
+    assert judge(restarted, ["yes", "no"]).invoke("Is the answer grounded?").content == "yes"
+    assert restarted.stats()["hits"] == 1
+
+
+def test_expired_entries_are_not_served(tmp_path):
+    cache = JudgeCache(path=str(tmp_path / "judge.sqlite"), ttl_seconds=0.01)
+    client = judge(cache, ["old", "new"])
+    client.invoke("prompt")
+    time.sleep(0.05)
+    assert client.invoke("prompt").content == "new"
+
+
+def test_bypass_flag_skips_cache(tmp_path):
+    cache = JudgeCache(path=str(tmp_path / "judge.sqlite"), bypass=True)
+    client = judge(cache, ["first", "second"])
+    client.invoke("prompt")
+    assert client.invoke("prompt").content == "second"
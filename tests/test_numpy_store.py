@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from src.numpy_store import NumpyVectorStore, GrowableArray, mmr_select
+
+
+class KeywordEmbeddings(Embeddings):
+    # Tiny, fully predictable embedding: one dimension per keyword
+    vocab = ["internet", "pto", "travel", "health", "compliance"]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(text.lower().count(w)) + 0.01 for w in self.vocab]
+
+
+DOCS = [
+    ("Texas internet must be 50 Mbps", {"state": "Texas", "year": 2024, "source": "tx.pdf"}),
+    ("Texas PTO requests need 30 days", {"state": "Texas", "year": 2023, "source": "tx.pdf"}),
+    ("Tennessee internet must be 50 Mbps", {"state": "Tennessee", "year": 2024, "source": "tn.pdf"}),
+    ("Tennessee travel compliance review", {"state": "Tennessee", "year": 2022, "source": "tn.pdf"}),
+]
+
+
+@pytest.fixture(params=["float32", "float16", "int8"])
+def store(request, tmp_path):
+    texts, metadatas = zip(*DOCS)
+    NumpyVectorStore.from_texts(
+        list(texts), KeywordEmbeddings(), metadatas=list(metadatas),
+        ids=[f"id-{i}" for i in range(len(DOCS))],
+        persist_directory=str(tmp_path / "index"), dtype=request.param
+    )
+    # Always query a reloaded, memory-mapped copy
+    return NumpyVectorStore.load(str(tmp_path / "index"), KeywordEmbeddings())
+
+
+def test_metadata_prefilter(store):
+    docs = store.similarity_search("internet speed", k=4, filter={
+        "$and": [{"state": {"$eq": "Tennessee"}}, {"year": {"$gte": 2023}}]
+    })
+    assert [d.page_content for d in docs] == ["Tennessee internet must be 50 Mbps"]
+
+
+def test_top_hit_and_unknown_filter_value(store):
+    assert store.similarity_search("pto", k=1)[0].metadata["state"] == "Texas"
+    assert store.similarity_search("pto", k=3, filter={"state": "Ohio"}) == []
+
+
+def test_upsert_and_delete_round_trip(store, tmp_path):
+    store.add_texts(["Texas health benefits"], metadatas=[{"state": "Texas", "year": 2024}], ids=["id-1"])
+    store.delete(ids=["id-0"])
+    store.persist(str(tmp_path / "index2"))
+
+    reloaded = NumpyVectorStore.load(str(tmp_path / "index2"), KeywordEmbeddings())
+    assert len(reloaded) == 3
+    assert reloaded.get(ids=["id-1"])["documents"] == ["Texas health benefits"]
+    assert reloaded.get(where={"state": "Texas"})["ids"] == ["id-1"]
+
+
+def test_batched_writes_append_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.numpy_store.MIN_CAPACITY", 4)
+    column = GrowableArray(str(tmp_path / "col"), np.int64)
+    capacities = set()
+    for start in range(0, 100, 10):
+        column.extend(np.arange(start, start + 10))
+        capacities.add(column.capacity)
+    # Capacity doubles, so 10 batches re-map the file only a handful of times
+    assert sorted(capacities) == [10, 20, 40, 80, 160]
+    column.compact(np.arange(100) % 3 == 0)
+    assert column.view().tolist() == list(range(0, 100, 3))
+
+    path = str(tmp_path / "index")
+    store = NumpyVectorStore(KeywordEmbeddings(), persist_directory=path)
+    for i, (text, metadata) in enumerate(DOCS * 3):
+        store.add_texts([text], metadatas=[metadata], ids=[f"id-{i}"])
+    store.delete(ids=["id-0", "id-5"])
+    store.persist()
+    # Scratch files are gone once persisted; the store now reads the memory-mapped index
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["col", "index"]
+    reloaded = NumpyVectorStore.load(path, KeywordEmbeddings())
+    assert len(reloaded) == len(store) == 10
+    assert reloaded.get(ids=["id-4", "id-6"])["documents"] == [DOCS[0][0], DOCS[2][0]]
+    assert reloaded.similarity_search("pto", k=1, filter={"year": 2023})[0].page_content == DOCS[1][0]
+
+
+def test_mmr_matches_langchain_reference():
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=16)
+    candidates = rng.normal(size=(15, 16))
+    query /= np.linalg.norm(query)
+    candidates /= np.linalg.norm(candidates, axis=1, keepdims=True)
+
+    ours = mmr_select(query[None, :], candidates[None, :, :], k=5, lambda_mult=0.25)[0]
+    reference = maximal_marginal_relevance(query, list(candidates), lambda_mult=0.25, k=5)
+    assert list(ours) == reference
@@ -0,0 +1,77 @@
+import pytest
+from langchain_chroma import Chroma
+from src.partitions import PartitionedVectorStore, open_chroma
+from tests.test_numpy_store import KeywordEmbeddings, DOCS
+
+MORE_DOCS = DOCS + [
+    ("Texas internet stipend covers 50 Mbps", {"state": "Texas", "year": 2024, "source": "tx2.pdf"}),
+    ("Ohio health compliance rules", {"state": "Ohio", "year": 2024, "source": "oh.pdf"}),
+]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    texts, metadatas = zip(*MORE_DOCS)
+    ids = [f"id-{i}" for i in range(len(MORE_DOCS))]
+    PartitionedVectorStore.from_texts(list(texts), KeywordEmbeddings(), metadatas=list(metadatas), ids=ids,
+                                      persist_directory=str(tmp_path / "parts"), scheme="state_year")
+    single = Chroma.from_texts(list(texts), KeywordEmbeddings(), metadatas=list(metadatas), ids=ids,
+                               persist_directory=str(tmp_path / "single"))
+    # Always query a reopened copy, like app.py does
+    return open_chroma(str(tmp_path / "parts"), KeywordEmbeddings()), single
+
+
+def test_filters_only_touch_matching_partitions(stores):
+    parts, _ = stores
+    assert isinstance(parts, PartitionedVectorStore)
+    assert len(parts.partitions) == 5
+    assert parts._route({"$and": [{"state": {"$eq": "Texas"}}, {"year": {"$eq": 2024}}]}) == ["Texas|2024"]
+    assert parts._route({"state": {"$in": ["Ohio", "Tennessee"]}}) == ["Ohio|2024", "Tennessee|2022", "Tennessee|2024"]
+    # Fields the layout doesn't shard on can't rule a partition out
+    assert len(parts._route({"source": {"$eq": "tx.pdf"}})) == 5
+
+    docs = parts.similarity_search("internet", k=4, filter={"state": {"$eq": "Texas"}})
+    assert {d.metadata["state"] for d in docs} == {"Texas"}
+    assert {d.id for d in parts.similarity_search("internet", k=4, filter={"source": {"$eq": "tx.pdf"}})} == {"id-0", "id-1"}
+
+
+def test_fan_out_matches_single_collection(stores):
+    parts, single = stores
+    for query in ("internet speed", "travel compliance", "health"):
+        # Same top-k distances; which of several equal-distance chunks makes the cut may differ
+        expected = [round(s, 4) for _, s in single.similarity_search_with_score(query, k=4)]
+        assert [round(s, 4) for _, s in parts.similarity_search_with_score(query, k=4)] == expected
+        assert ({d.page_content for d in parts.similarity_search(query, k=6)}
+                == {d.page_content for d in single.similarity_search(query, k=6)})
+        # Candidates from all partitions are merged before MMR picks diverse ones
+        docs = parts.max_marginal_relevance_search(query, k=3, fetch_k=6, lambda_mult=0.25)
+        assert len({d.page_content for d in docs}) == 3
+        assert docs[0].page_content in {d.page_content for d, s in single.similarity_search_with_score(query, k=6)
+                                        if round(s, 4) == expected[0]}
+
+
+def test_partition_rebuilds_on_its_own(stores, tmp_path):
+    parts, _ = stores
+    assert parts.drop_partition("Texas|2024")
+    assert sorted(parts.partition_sizes()) == ["Ohio|2024", "Tennessee|2022", "Tennessee|2024", "Texas|2023"]
+    assert parts.get(where={"state": {"$eq": "Texas"}})["ids"] == ["id-1"]
+
+    parts.add_texts([MORE_DOCS[0][0]], [MORE_DOCS[0][1]], ids=["id-0"])
+    reopened = open_chroma(str(tmp_path / "parts"), KeywordEmbeddings())
+    assert reopened.partition_sizes()["Texas|2024"] == 1
+    assert sorted(reopened.get(include=[])["ids"]) == ["id-0", "id-1", "id-2", "id-3", "id-5"]
+
+
+def test_get_pages_across_partitions(stores):
+    parts, _ = stores
+    everything = parts.get(include=[])["ids"]
+    assert len(everything) == 6
+    for offset in range(7):
+        for limit in (1, 2, 3, None):
+            end = offset + limit if limit is not None else None
+            assert parts.get(limit=limit, offset=offset, include=[])["ids"] == everything[offset:end]
+    # Texas|2023 holds one chunk, so this window starts in it and ends inside Texas|2024
+    texas = {"state": {"$eq": "Texas"}}
+    window = parts.get(where=texas, limit=2, offset=0, include=["documents"])
+    assert window["ids"][0] == "id-1" and len(window["documents"]) == 2
+    assert parts.get(where=texas, limit=5, offset=1, include=[])["ids"] == parts.get(where=texas, include=[])["ids"][1:]
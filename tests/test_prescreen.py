@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from src.prescreen import prescreen
+from src.guardrails import run_guardrails, tier_stats
+
+CONTEXTS = [
+    "Texas Official Remote Work - 2024\nSection 2: Guidelines\n"
+    "Under the 2024 regulations, Remote Work must be requested 30 days in advance.\n"
+    "For Texas specific mandates, employees must maintain a 50Mbps internet connection\n"
+    "for all Remote Work activities."
+]
+QUERY = "What internet speed do Texas remote workers need?"
+
+
+@pytest.mark.parametrize("answer, decision", [
+    ("Employees must maintain a 50Mbps internet connection for all Remote Work activities.", "grounded"),
+    # List markers are not treated as numbers the context never mentions
+    ("1. Remote Work must be requested 30 days in advance.\n2. Employees must maintain a 50Mbps internet connection.", "grounded"),
+    ("Texas remote workers need at least 100 Mbps and a company laptop from Spokane.", "ungrounded"),
+    ("I can only assist with official policy queries.", "refusal"),
+    ("The provided context does not specify an internet speed for Texas.", "refusal"),
+    # Refusal phrasing around a claim is an answer: made-up numbers are caught, the rest is judged
+    ("There is no policy cap; employees get 45 days PTO.", "ungrounded"),
+    ("The context does not mention a stipend, but Texas remote workers need a 50Mbps connection.", "uncertain"),
+    ("Remote Work policy does not include any stipend for internet connection activities.", "uncertain"),
+    ("The documents do not specify a cap, so employees can work unlimited overtime hours.", "ungrounded"),
+    ("The context does not mention a cap, and overtime is always paid at double rate.", "ungrounded"),
+    ("I cannot find a cap in the policy, which means managers may approve any amount of overtime.", "ungrounded"),
+    # A paraphrase is neither clearly grounded nor clearly invented
+    ("Based on the policy, Texas employees working remotely should generally have a reliable 50Mbps connection.", "uncertain"),
+])
+def test_prescreen_decisions(answer, decision):
+    assert prescreen(QUERY, answer, CONTEXTS)[0] == decision
+
+
+def test_settled_answers_never_reach_the_judges():
+    before = tier_stats()
+    # judge/llm/embeddings are None: any judge call would raise
+    audit = asyncio.run(run_guardrails(
+        QUERY, "Employees must maintain a 50Mbps internet connection for all Remote Work activities.", CONTEXTS, None, None, None, use_prescreen=True
+    ))
+    assert audit["tier"] == "prescreen_grounded" and audit["security_status"] == "🛡️ SECURE"
+    assert audit["answer_relevancy"] is None
+    assert tier_stats()["prescreen_grounded"] == before["prescreen_grounded"] + 1
@@ -0,0 +1,30 @@
+import pytest
+from src.query_constructor import extract_metadata_filter
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What is the Tennessee 2024 PTO policy?",
+     {"$and": [{"state": {"$eq": "Tennessee"}}, {"year": {"$eq": 2024}}]}),
+    ("internet speed rules in new york", {"state": {"$eq": "New York"}}),
+    ("TX travel reimbursement", {"state": {"$eq": "Texas"}}),
+    ("What changed in the 2023 health benefits?", {"year": {"$eq": 2023}}),
+    ("What is the minimum internet speed for remote work?", None),
+])
+def test_unambiguous_queries_take_the_fast_path(query, expected):
+    where, ambiguous = extract_metadata_filter(query)
+    assert not ambiguous
+    assert where == expected
+
+
+@pytest.mark.parametrize("query", [
+    "Compare Texas and California remote work rules",
+    "PTO policy for Washington in 2022 or 2023",
+    "What was the Tennessee policy last year?",
+    "Show the latest New York travel policy",
+    "Texas rules before 2024",
+    "Remote work policy for 2025",
+])
+def test_ambiguous_queries_fall_back_to_the_llm(query):
+    where, ambiguous = extract_metadata_filter(query)
+    assert ambiguous
+    assert where is None
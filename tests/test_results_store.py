@@ -0,0 +1,67 @@
+import pyarrow.parquet as pq
+from src import results_store
+
+QUESTIONS = ["Texas internet speed?", "Ohio PTO notice?", "Florida travel rules?"]
+
+
+def record(run_id, scores, monkeypatch, source="run_evaluation"):
+    monkeypatch.setenv("EVAL_RUN_ID", run_id)
+    results_store.record_results(
+        source, [{"question": q, "answer": "a", "ground_truth": "gt", "faithfulness": f, "answer_relevancy": r}
+                 for q, (f, r) in zip(QUESTIONS, scores)],
+        latency_ms=120.0, stage_ms={"ragas_evaluate": 100.0}, judge_model="gpt-4o-mini"
+    )
+
+
+def test_rows_land_in_date_and_run_partitions(tmp_path, monkeypatch):
+    results_store.set_run_config(chunk_size=1000)
+    record("run-a", [(0.9, 0.8), (float("nan"), 0.7), (0.5, None)], monkeypatch)
+    assert results_store.flush(str(tmp_path)) == 3 and results_store.flush(str(tmp_path)) == 0
+
+    (date_dir,) = tmp_path.iterdir()
+    assert date_dir.name.startswith("date=") and [p.name for p in date_dir.iterdir()] == ["run_id=run-a"]
+    (part,) = (date_dir / "run_id=run-a").iterdir()
+    assert part.name.startswith("part-") and part.suffix == ".parquet"
+    table = pq.read_table(part)
+    # A failed (NaN) or missing score is stored as null; run settings ride along on every row
+    assert table.column("faithfulness").to_pylist() == [0.9, None, 0.5]
+    assert table.column("judge_model").to_pylist() == ["gpt-4o-mini"] * 3
+    assert '"chunk_size": 1000' in table.column("config")[0].as_py()
+    assert table.column("stage_ms")[0].as_py() == [("ragas_evaluate", 100.0)]
+    assert table.column("sample_id")[0].as_py() == results_store.sample_key(QUESTIONS[0], "gt")
+
+
+def test_aggregates_merge_across_scan_batches(tmp_path, monkeypatch):
+    record("run-a", [(0.9, 0.8), (0.7, 0.6), (0.2, None)], monkeypatch)
+    record("run-a", [(0.5, 0.4)], monkeypatch, source="guardrails")
+    record("run-b", [(1.0, 1.0)], monkeypatch)
+    results_store.flush(str(tmp_path))
+    # Two rows per batch: every group's totals are combined from several partial aggregates
+    monkeypatch.setattr(results_store, "SCAN_BATCH_ROWS", 2)
+
+    report = results_store.aggregate(("faithfulness", "answer_relevancy"), root=str(tmp_path))
+    a = report.set_index("run_id").loc["run-a"]
+    assert a["rows"] == 4 and a["faithfulness_n"] == 4 and a["answer_relevancy_n"] == 3
+    assert round(a["faithfulness_mean"], 6) == round((0.9 + 0.7 + 0.2 + 0.5) / 4, 6)
+    assert (a["faithfulness_min"], a["faithfulness_max"]) == (0.2, 0.9)
+
+    only_eval = results_store.aggregate(("faithfulness",), where={"source": "run_evaluation"}, root=str(tmp_path))
+    assert only_eval.set_index("run_id").loc["run-a", "rows"] == 3
+    runs = results_store.list_runs(root=str(tmp_path))
+    assert sorted(zip(runs["run_id"], runs["source"], runs["rows"])) == [
+        ("run-a", "guardrails", 1), ("run-a", "run_evaluation", 3), ("run-b", "run_evaluation", 1)]
+    assert results_store.aggregate(root=str(tmp_path / "missing")).empty
+
+
+def test_compare_runs_flags_per_question_regressions(tmp_path, monkeypatch):
+    record("base", [(0.9, 0.8), (0.7, 0.6), (0.5, 0.5)], monkeypatch)
+    record("candidate", [(0.92, 0.8), (0.4, 0.65), (0.5, 0.5)], monkeypatch)
+    record("unrelated", [(0.0, 0.0)], monkeypatch)
+    results_store.flush(str(tmp_path))
+
+    diff = results_store.compare_runs("base", "candidate", metrics=("faithfulness", "answer_relevancy"),
+                                      threshold=0.05, root=str(tmp_path)).set_index("question")
+    assert round(diff.loc["Ohio PTO notice?", "faithfulness_delta"], 6) == -0.3
+    assert round(diff.loc["Texas internet speed?", "faithfulness_delta"], 6) == 0.02
+    assert diff["regressed"].to_dict() == {"Florida travel rules?": False, "Ohio PTO notice?": True,
+                                           "Texas internet speed?": False}
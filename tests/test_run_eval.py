@@ -0,0 +1,36 @@
+import json
+import run_eval
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+
+
+def test_dataset_ids_are_stable_and_shards_partition_them(tmp_path):
+    rows = [{"question": f"Q{i}?", "ground_truth": f"A{i}"} for i in range(50)]
+    write_jsonl(tmp_path / "golden.jsonl", rows + rows[:5])  # duplicates collapse
+    (tmp_path / "golden.json").write_text(json.dumps(rows), encoding="utf-8")
+
+    samples = run_eval.load_dataset(str(tmp_path / "golden.jsonl"))
+    assert [s["id"] for s in samples] == [s["id"] for s in run_eval.load_dataset(str(tmp_path / "golden.json"))]
+    assert len(samples) == 50
+    shards = [{s["id"] for s in samples if run_eval.shard_of(s["id"], 4) == i} for i in range(4)]
+    assert set.union(*shards) == {s["id"] for s in samples} and sum(map(len, shards)) == 50
+
+
+def test_checkpoints_survive_a_torn_line_and_merge_in_dataset_order(tmp_path):
+    rows = [{"id": str(i), "question": f"Q{i}?", "ground_truth": "A"} for i in range(3)]
+    write_jsonl(tmp_path / "golden.jsonl", rows)
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    shard = run_eval.shard_path(str(run_dir), 0, 2)
+    run_eval.append_results(shard, [{"id": "2", "faithfulness": 1.0}])
+    with open(shard, "a", encoding="utf-8") as f:
+        f.write('{"id": "1", "faith')  # worker died mid-write
+    run_eval.append_results(run_eval.shard_path(str(run_dir), 1, 2), [{"id": "0", "faithfulness": 0.5}])
+    run_eval.append_results(shard, [{"id": "1", "faithfulness": 0.0}])
+
+    assert set(run_eval.read_results(str(run_dir))) == {"0", "1", "2"}
+    report = run_eval.merge_results(str(tmp_path / "golden.jsonl"), str(run_dir))
+    assert list(report["id"]) == ["0", "1", "2"]
+    assert (run_dir / "results.jsonl").read_text(encoding="utf-8").count("\n") == 3
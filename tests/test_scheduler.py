@@ -0,0 +1,67 @@
+import time
+import asyncio
+import httpx
+from src.scheduler import (
+    RequestScheduler, ScheduledTransport, AsyncScheduledTransport, request_cost, request_priority,
+    INTERACTIVE, EVALUATION, INGEST,
+)
+
+
+def chat_request(content="hi", max_tokens=10):
+    body = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": content}], "max_tokens": max_tokens}
+    return httpx.Request("POST", "https://api.openai.com/v1/chat/completions", json=body)
+
+
+def test_request_cost_for_chat_and_embeddings():
+    assert request_cost(chat_request("x" * 400, max_tokens=50)) == ("gpt-4o-mini", 100 + 50 + 2 // 4)
+    embed = httpx.Request("POST", "https://api.openai.com/v1/embeddings",
+                          json={"model": "text-embedding-ada-002", "input": [[1, 2, 3], [4, 5]]})
+    assert request_cost(embed) == ("text-embedding-ada-002", 5)
+
+
+def test_background_classes_leave_headroom_for_interactive():
+    scheduler = RequestScheduler({"gpt-4o-mini": (10, 1_000_000)})
+    for _ in range(7):
+        assert scheduler._try_acquire("gpt-4o-mini", 10, INGEST) == 0.0
+    # Ingest may not touch the last 30% of the request bucket ...
+    assert scheduler._try_acquire("gpt-4o-mini", 10, INGEST) > 0
+    # ... evaluation may use all but the last 10% ...
+    for _ in range(2):
+        assert scheduler._try_acquire("gpt-4o-mini", 10, EVALUATION) == 0.0
+    assert scheduler._try_acquire("gpt-4o-mini", 10, EVALUATION) > 0
+    # ... and chat gets the rest
+    assert scheduler._try_acquire("gpt-4o-mini", 10, INTERACTIVE) == 0.0
+    stats = scheduler.stats()["gpt-4o-mini"]
+    assert stats["by_priority"] == {INTERACTIVE: 1, EVALUATION: 2, INGEST: 7}
+
+
+def test_429_blocks_the_model_for_the_retry_hint():
+    calls = []
+
+    def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"retry-after-ms": "200"}, json={"error": "rate limited"})
+        return httpx.Response(200, json={"ok": True})
+
+    scheduler = RequestScheduler({"gpt-4o-mini": (600, 1_000_000)})
+    client = httpx.Client(transport=ScheduledTransport(scheduler, INTERACTIVE, wrapped=httpx.MockTransport(handler)))
+    assert client.send(chat_request()).status_code == 429
+    assert client.send(chat_request()).status_code == 200
+    assert calls[1] - calls[0] >= 0.19
+    stats = scheduler.stats()["gpt-4o-mini"]
+    assert stats["throttled_429"] == 1 and stats["rate_factor"] < 1.0
+
+
+def test_async_transport_uses_the_context_priority():
+    scheduler = RequestScheduler({"gpt-4o-mini": (600, 1_000_000)})
+    mock = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+
+    async def run():
+        async with httpx.AsyncClient(transport=AsyncScheduledTransport(scheduler, wrapped=mock)) as client:
+            with request_priority(EVALUATION):
+                await client.send(chat_request())
+            await client.send(chat_request())
+
+    asyncio.run(run())
+    assert scheduler.stats()["gpt-4o-mini"]["by_priority"] == {INTERACTIVE: 1, EVALUATION: 1, INGEST: 0}
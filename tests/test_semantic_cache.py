@@ -0,0 +1,54 @@
+from langchain_core.embeddings import Embeddings
+from src.semantic_cache import SemanticAnswerCache
+
+
+class TopicEmbeddings(Embeddings):
+    # Paraphrases of the same topic land on the same direction
+    topics = [("internet", "mbps", "bandwidth"), ("pto", "vacation", "leave"), ("travel", "reimbursement")]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        text = text.lower()
+        return [float(any(w in text for w in words)) + 0.01 for words in self.topics]
+
+
+def make_cache(**kwargs):
+    return SemanticAnswerCache(TopicEmbeddings(), threshold=0.95, fingerprint_interval=0, **kwargs)
+
+
+def test_paraphrase_hits_within_the_same_scope_only():
+    cache = make_cache()
+    cache.add("Texas 2024 internet speed requirement", "answer-tx")
+
+    assert cache.lookup("minimum Mbps for remote work in Texas in 2024") == "answer-tx"
+    assert cache.lookup("Tennessee 2024 internet speed requirement") is None
+    assert cache.lookup("Texas 2024 vacation rules") is None
+    # Ambiguous queries never touch the cache
+    assert cache.lookup("Texas internet rules last year") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "bypassed": 1, "hit_rate": 0.333,
+                             "entries": 1, "evictions": 0, "invalidations": 0}
+
+
+def test_lru_eviction():
+    cache = make_cache(max_entries=2)
+    cache.add("internet speed", "a")
+    cache.add("pto rules", "b")
+    cache.lookup("bandwidth requirement")  # touch "a"
+    cache.add("travel reimbursement", "c")
+
+    assert cache.lookup("pto rules") is None
+    assert cache.lookup("internet speed") == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_reingest_invalidates_entries():
+    fingerprint = {"value": "v1"}
+    cache = make_cache(fingerprint_fn=lambda: fingerprint["value"])
+    cache.add("internet speed", "old answer")
+    assert cache.lookup("internet speed") == "old answer"
+
+    fingerprint["value"] = "v2"
+    assert cache.lookup("internet speed") is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.numpy_store import NumpyVectorStore
+from src.partitions import PartitionedVectorStore
+from src.serving import (BatchingEmbeddings, BatchingVectorStore, ServingController, Overloaded,
+                         DeadlineExceeded)
+from tests.test_numpy_store import KeywordEmbeddings
+from tests.test_partitions import MORE_DOCS
+
+QUERIES = ["internet speed", "travel compliance", "health", "pto"]
+
+
+class CountingEmbeddings(KeywordEmbeddings):
+    def __init__(self):
+        self.requests = []
+
+    def embed_queries(self, texts):
+        self.requests.append(list(texts))
+        return [self.embed_query(t) for t in texts]
+
+
+def concurrently(fn, args):
+    with ThreadPoolExecutor(max_workers=len(args)) as pool:
+        return list(pool.map(fn, args))
+
+
+def test_concurrent_query_embeddings_share_one_request():
+    underlying = CountingEmbeddings()
+    embeddings = BatchingEmbeddings(underlying, window=0.2)
+    vectors = concurrently(embeddings.embed_query, QUERIES)
+    assert vectors == [underlying.embed_query(q) for q in QUERIES]
+    assert len(underlying.requests) == 1 and sorted(underlying.requests[0]) == sorted(QUERIES)
+    assert embeddings.batcher.report()["largest_batch"] == 4
+
+    # wait_if=False (nothing else in flight): a lone query is sent without waiting out the window
+    lone = BatchingEmbeddings(CountingEmbeddings(), window=30.0, wait_if=lambda: False)
+    assert lone.embed_query("pto") == underlying.embed_query("pto")
+
+
+@pytest.mark.parametrize("backend", ["numpy", "partitioned"])
+def test_batched_searches_match_one_by_one(backend, tmp_path):
+    texts, metadatas = zip(*MORE_DOCS)
+    if backend == "numpy":
+        store = NumpyVectorStore.from_texts(list(texts), KeywordEmbeddings(), metadatas=list(metadatas))
+    else:
+        store = PartitionedVectorStore.from_texts(list(texts), KeywordEmbeddings(), metadatas=list(metadatas),
+                                                  persist_directory=str(tmp_path / "parts"))
+    batching = BatchingVectorStore(store, window=0.2)
+    search = {"k": 2, "fetch_k": 5, "lambda_mult": 0.5, "filter": {"year": {"$eq": 2024}}}
+
+    batched = concurrently(lambda q: batching.max_marginal_relevance_search(q, **search), QUERIES)
+    expected = [store.max_marginal_relevance_search(q, **search) for q in QUERIES]
+    assert [[d.page_content for d in docs] for docs in batched] == [[d.page_content for d in docs] for docs in expected]
+    # Same search parameters -> one store call for all four queries
+    assert batching.batcher.report() == {"calls": 4, "batches": 1, "largest_batch": 4, "avg_batch": 4.0}
+
+
+def test_queue_depth_deadlines_and_shedding():
+    controller = ServingController(workers=1, max_queue=1, deadline=60.0, shed_depth=1)
+
+    async def scenario():
+        async with controller.admit() as ticket:
+            assert not ticket.shed_ragas()
+            # The only worker is busy, so the next request queues; a full queue sheds RAGAS
+            waiter = asyncio.create_task(controller.admit(deadline=0.05).__aenter__())
+            await asyncio.sleep(0)
+            assert controller.queued == 1 and ticket.shed_ragas()
+            with pytest.raises(Overloaded):
+                async with controller.admit():
+                    pass
+            with pytest.raises(DeadlineExceeded):
+                await waiter
+            assert not ticket.shed_ragas()
+            # Too little time left for the RAGAS judges also sheds them
+            ticket.deadline -= 55.0
+            assert ticket.shed_ragas()
+
+    asyncio.run(scenario())
+    stats = controller.stats()
+    assert (stats["completed"], stats["rejected"], stats["deadline_exceeded"]) == (1, 1, 1)
+    assert stats["max_queue_depth"] == 1 and stats["queue_depth"] == 0 and stats["in_flight"] == 0
@@ -0,0 +1,17 @@
+from src.streaming import FinalAnswerStream, split_final_answer
+
+
+def test_answer_starts_once_the_delimiter_is_complete():
+    stream = FinalAnswerStream()
+    assert stream.feed("Topic is PTO. ") == ("Topic is PTO.", "")
+    # A half-streamed delimiter is held back from the reasoning box
+    assert stream.feed("### Final") == ("Topic is PTO.", "")
+    assert stream.feed(" Answer: 30") == ("Topic is PTO.", "30")
+    assert stream.feed(" days.") == ("Topic is PTO.", "30 days.")
+    assert stream.result() == split_final_answer("Topic is PTO. ### Final Answer: 30 days.")
+
+
+def test_response_without_delimiter():
+    stream = FinalAnswerStream()
+    stream.feed("I can only assist with official policy queries.")
+    assert stream.result() == ("Direct response provided.", "I can only assist with official policy queries.")
@@ -0,0 +1,76 @@
+import pytest
+from langchain_core.documents import Document
+import sweep_chunking
+from src.embedding_cache import CachedEmbeddings
+from tests.test_numpy_store import KeywordEmbeddings
+
+META = {"state": "Texas", "year": 2024, "source": "tx.pdf"}
+
+
+class CountingEmbeddings(KeywordEmbeddings):
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def chunks_of(*texts):
+    return [Document(page_content=t, metadata=dict(META)) for t in texts], [f"id-{i}" for i in range(len(texts))]
+
+
+def test_grid_skips_overlaps_that_swallow_the_chunk():
+    grid = sweep_chunking.build_grid([100, 500], [0, 100], ["default", "sentence"])
+    assert [sweep_chunking.config_id(c) for c in grid] == [
+        "size100_overlap0_default", "size100_overlap0_sentence",
+        "size500_overlap0_default", "size500_overlap0_sentence",
+        "size500_overlap100_default", "size500_overlap100_sentence",
+    ]
+
+
+def test_configs_only_pay_for_chunks_never_embedded_before(tmp_path):
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, model="keywords", path=str(tmp_path / "cache.sqlite"))
+    small, large = sweep_chunking.build_grid([200, 400], [0])
+
+    _, first = sweep_chunking.build_index(small, *chunks_of("Texas internet 50 Mbps", "Texas PTO 30 days",
+                                                            "Texas internet 50 Mbps"),
+                                          embeddings, str(tmp_path / "sweeps"))
+    assert (first["chunks"], first["distinct_chunks"], first["new_embeddings"]) == (3, 2, 2)
+    _, second = sweep_chunking.build_index(large, *chunks_of("Texas PTO 30 days", "Texas travel compliance"),
+                                           embeddings, str(tmp_path / "sweeps"))
+    # Only the chunk text the first config never produced reaches the model
+    assert (second["new_embeddings"], second["reused_embeddings"]) == (1, 1)
+    assert underlying.embedded == ["Texas internet 50 Mbps", "Texas PTO 30 days", "Texas travel compliance"]
+    assert 0 < second["embed_tokens"] < first["embed_tokens"]
+    # Candidate indexes sit side by side under the sweep directory
+    assert sorted(p.name for p in (tmp_path / "sweeps").iterdir()) == ["size200_overlap0_default",
+                                                                       "size400_overlap0_default"]
+
+
+def test_retrieval_is_scored_against_the_ground_truth(tmp_path):
+    embeddings = CachedEmbeddings(KeywordEmbeddings(), model="keywords", path=str(tmp_path / "cache.sqlite"))
+    config = sweep_chunking.build_grid([200], [0])[0]
+    store, _ = sweep_chunking.build_index(
+        config, *chunks_of("Texas internet must be 50 Mbps", "Texas PTO requests need 30 days"),
+        embeddings, str(tmp_path / "sweeps")
+    )
+    samples = [{"question": "Texas 2024 internet speed?", "ground_truth": "Internet must be 50 Mbps."},
+               {"question": "Texas 2024 pto notice?", "ground_truth": "PTO needs 45 days notice."}]
+    scores = sweep_chunking.evaluate_config(store, samples, embeddings.embed_queries([s["question"] for s in samples]))
+    # Sample 1: every term found in the top chunk; sample 2: only "pto" and "days" of 5 terms
+    assert scores["context_recall"] == round((1.0 + 2 / 5) / 2, 4)
+    assert scores["hit_rate"] == 0.5 and scores["mrr"] == 0.5
+    assert sweep_chunking.score_retrieval([], "PTO needs 45 days") == (0.0, 0.0)
+
+
+def test_golden_set_must_match_the_swept_documents(tmp_path):
+    (tmp_path / "Policy_Texas_2024_0.pdf").write_bytes(b"")
+    # The default golden set is only valid for the PDF it was written about
+    assert sweep_chunking.resolve_inputs(sweep_chunking.PDF_PATH) == ([sweep_chunking.PDF_PATH],
+                                                                      sweep_chunking.DATASET_PATH)
+    with pytest.raises(ValueError, match="--dataset is required"):
+        sweep_chunking.resolve_inputs(str(tmp_path))
+    assert sweep_chunking.resolve_inputs(str(tmp_path), "states.jsonl") == (
+        [str(tmp_path / "Policy_Texas_2024_0.pdf")], "states.jsonl")
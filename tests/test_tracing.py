@@ -0,0 +1,44 @@
+import asyncio
+from langchain_core.language_models import FakeListChatModel
+from src import tracing
+from src.tracing import trace, stage, load_traces, stage_summary
+
+
+def test_stages_and_llm_calls_are_attributed(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_LOG_PATH", str(tmp_path / "traces.jsonl"))
+    llm = FakeListChatModel(responses=["ok"])
+
+    async def judge(name):
+        with stage(name):
+            await llm.ainvoke("judge this")
+
+    async def request():
+        with trace("secure_policy_search") as t:
+            with stage("generation"):
+                llm.invoke("answer this")
+            t.set(context_chunks=5)
+            # Concurrent stages each keep their own attribution
+            await asyncio.gather(judge("hallucination_judge"), judge("ragas_judges"))
+        llm.invoke("outside any trace")
+
+    asyncio.run(request())
+    [record] = load_traces()
+    assert record["fields"] == {"context_chunks": 5}
+    assert {name: s["llm_calls"] for name, s in record["stages"].items()} == {
+        "generation": 1, "hallucination_judge": 1, "ragas_judges": 1
+    }
+    assert record["totals"]["llm_calls"] == 3
+
+    summary = stage_summary("secure_policy_search")
+    assert list(summary["stage"]) == ["generation", "hallucination_judge", "ragas_judges", "total"]
+
+
+def test_log_rolls_over(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_LOG_PATH", str(path))
+    monkeypatch.setattr(tracing, "TRACE_LOG_MAX_BYTES", 400)
+    for _ in range(10):
+        with trace("initialize_rag"):
+            pass
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert 0 < len(load_traces()) < 10